@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Page-cache footprint: runs a copy with and without cache hints (posix_fadvise) and
+reports how much of the source and destination trees is still resident in the page
+cache afterwards (mincore), next to the run time. Linux only.
+
+    python -m benchmarks.bench_cache [--scale 10k] [--mode copy]
+"""
+import os
+import sys
+import time
+import mmap
+import shutil
+import ctypes
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import corpus
+from src.utils.page_cache import PageCache
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+_MAP_FAILED = ctypes.c_void_p(-1).value
+
+
+def resident_bytes(path):
+    """Bytes of `path` currently in the page cache."""
+    size = os.path.getsize(path)
+    if size == 0: return 0
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, _MAP_FAILED): return 0
+        try:
+            pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+            vec = ctypes.create_string_buffer(pages)
+            if _libc.mincore(addr, size, vec) != 0: return 0
+            return sum(b & 1 for b in vec.raw) * mmap.PAGESIZE
+        finally:
+            _libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+
+def tree_bytes(root):
+    total = cached = 0
+    for r, _, files in os.walk(root):
+        for name in files:
+            p = os.path.join(r, name)
+            total += os.path.getsize(p)
+            cached += resident_bytes(p)
+    return total, cached
+
+
+def evict(root):
+    """Start cold: drop the tree's clean pages regardless of the hint setting under test."""
+    PageCache.configure(True)
+    for r, _, files in os.walk(root):
+        for name in files:
+            PageCache.drop(os.path.join(r, name))
+
+
+def run(src, dst, mode, hints):
+    from src.core.processor import Processor
+    shutil.rmtree(dst, ignore_errors=True)
+    os.makedirs(dst)
+    evict(src)
+    config = {
+        'mode': mode, 'clean_empty': False, 'rename_enabled': False, 'gps_enabled': False,
+        'gps_online': False, 'resume_enabled': False, 'blur_check_enabled': False,
+        'skip_existing': False, 'dry_run': False, 'cache_hints': hints,
+        'src_root': src, 'dst_root': dst,
+    }
+    t0 = time.perf_counter()
+    Processor(config).start()
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Page-cache footprint benchmark")
+    parser.add_argument('--scale', default='10k', help="|".join(corpus.SCALES))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--mode', default='copy', choices=['copy', 'link'])
+    parser.add_argument('--work-dir', default=os.path.join(REPO_ROOT, ".bench"))
+    args = parser.parse_args(argv)
+    if not PageCache.SUPPORTED:
+        print("posix_fadvise not available on this platform")
+        return 0
+
+    from src.utils.logger import Logger
+    Logger.get_instance().set_callback(lambda msg, level: None)
+    src = os.path.join(args.work_dir, f"corpus-{args.scale}-{args.seed}")
+    corpus.generate(src, corpus.CorpusSpec.for_scale(args.scale, seed=args.seed))
+    dst = os.path.join(args.work_dir, "cache-dst")
+    run_dir = os.path.join(args.work_dir, "cache-cwd")
+    os.makedirs(run_dir, exist_ok=True)
+    os.chdir(run_dir) # history / cache files land here
+
+    mb = 1024 * 1024
+    print(f"{'hints':<7}{'seconds':>9}{'src MB':>9}{'cached':>9}{'dst MB':>9}{'cached':>9}")
+    for hints in (False, True):
+        elapsed = run(src, dst, args.mode, hints)
+        src_total, src_cached = tree_bytes(src)
+        dst_total, dst_cached = tree_bytes(dst)
+        print(f"{'on' if hints else 'off':<7}{elapsed:>9.2f}{src_total / mb:>9.0f}{src_cached / mb:>9.1f}"
+              f"{dst_total / mb:>9.0f}{dst_cached / mb:>9.1f}")
+    shutil.rmtree(dst, ignore_errors=True)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
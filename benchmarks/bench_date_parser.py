@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+DateParser microbenchmark: filename and EXIF string parses per second,
+current implementation vs. the previous regex / strptime one.
+
+    python -m benchmarks.bench_date_parser [--n 200000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.utils.logger import Logger
+from src.core.date_parser import DateParser
+
+
+class LegacyDateParser:
+    """The implementation before the compiled pattern set (kept for comparison)."""
+
+    def _try_parse_exif(self, dt_str):
+        if not dt_str: return None
+        try:
+            return datetime.datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
+        except:
+            return None
+
+    def _parse_filename_date(self, filename):
+        match = re.search(r'(20\d{2}|19\d{2})[-_]?(\d{2})[-_]?(\d{2})', filename)
+        if match:
+            try:
+                y, m, d = match.groups()
+                return datetime.datetime(int(y), int(m), int(d))
+            except:
+                pass
+        match_ts = re.search(r'(\d{13})', filename)
+        if match_ts:
+            try:
+                return datetime.datetime.fromtimestamp(int(match_ts.group(1)) / 1000)
+            except:
+                pass
+        return None
+
+    def _is_valid_date(self, date_obj, src_info=""):
+        if not date_obj: return False
+        if date_obj.year < 1900: return False
+        return date_obj <= datetime.datetime.now() + datetime.timedelta(days=30)
+
+
+def make_names(n, seed=7):
+    rng = random.Random(seed)
+    styles = [
+        lambda d, i: f"IMG_{d:%Y%m%d_%H%M%S}.jpg",
+        lambda d, i: f"PXL_{d:%Y%m%d_%H%M%S}{i % 1000:03d}.jpg",
+        lambda d, i: f"IMG-{d:%Y%m%d}-WA{i % 10000:04d}.jpg",
+        lambda d, i: f"VID_{d:%Y%m%d_%H%M%S}.mp4",
+        lambda d, i: f"Screenshot_{d:%Y-%m-%d-%H-%M-%S}.png",
+        lambda d, i: f"FB_IMG_{int(d.timestamp() * 1000)}.jpg",
+        lambda d, i: f"{int(d.timestamp())}.jpg",
+        lambda d, i: f"DSC{i:05d}.JPG",
+        lambda d, i: f"IMG_{i % 10000:04d}.HEIC",
+    ]
+    start = datetime.datetime(2005, 1, 1)
+    names = []
+    for i in range(n):
+        d = start + datetime.timedelta(seconds=rng.randrange(18 * 365 * 86400))
+        names.append(styles[i % len(styles)](d, i))
+    return names
+
+
+def make_exif_strings(n, seed=11):
+    rng = random.Random(seed)
+    start = datetime.datetime(2005, 1, 1)
+    return [(start + datetime.timedelta(seconds=rng.randrange(18 * 365 * 86400))).strftime("%Y:%m:%d %H:%M:%S")
+            for _ in range(n)]
+
+
+def bench(fn, items, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for x in items:
+            fn(x)
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return len(items) / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="DateParser microbenchmark")
+    parser.add_argument('--n', type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    Logger.get_instance().set_callback(lambda msg, level: None)
+    new, old = DateParser(), LegacyDateParser()
+    names = make_names(args.n)
+    exif = make_exif_strings(args.n)
+
+    def old_name(n):
+        d = old._parse_filename_date(n)
+        return d if d and old._is_valid_date(d) else None
+
+    def new_name(n):
+        d = new._parse_filename_date(n)
+        return d if d and new._is_valid_date(d) else None
+
+    found_old = sum(1 for n in names if old_name(n))
+    found_new = sum(1 for n in names if new_name(n))
+
+    rows = [
+        ("filename", bench(old_name, names), bench(new_name, names)),
+        ("exif", bench(old._try_parse_exif, exif), bench(new._try_parse_exif, exif)),
+    ]
+    print(f"{'case':<10}{'legacy /s':>14}{'current /s':>14}{'speedup':>10}")
+    for case, o, n in rows:
+        print(f"{case:<10}{o:>14,.0f}{n:>14,.0f}{n / o:>9.2f}x")
+    print(f"filenames with a date: legacy {found_old}/{len(names)}, current {found_new}/{len(names)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Estimate mode vs. the real run: runs the sampling estimate, then a full copy into
+a fresh destination, and checks each extrapolated figure against what actually
+happened (95% interval hit or miss) plus how long each took.
+
+    python -m benchmarks.bench_estimate [--scale 10k] [--sample 400] [--blur]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import corpus
+
+
+def tree_stats(root, undated="No_Date"):
+    files, size, undated_files = 0, 0, 0
+    for r, _, names in os.walk(root):
+        in_undated = os.path.relpath(r, root).split(os.sep)[0] == undated
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(r, name))
+            undated_files += in_undated
+    return files, size, undated_files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sampling estimate accuracy benchmark")
+    parser.add_argument('--scale', default='10k', help="|".join(corpus.SCALES))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--sample', type=int, default=400)
+    parser.add_argument('--sample-seed', type=int, default=None)
+    parser.add_argument('--blur', action='store_true')
+    parser.add_argument('--work-dir', default=os.path.join(REPO_ROOT, ".bench"))
+    args = parser.parse_args(argv)
+
+    from src.utils.logger import Logger
+    from src.core.processor import Processor
+    Logger.get_instance().set_callback(lambda msg, level: None)
+
+    src = os.path.join(args.work_dir, f"corpus-{args.scale}-{args.seed}")
+    corpus.generate(src, corpus.CorpusSpec.for_scale(args.scale, seed=args.seed))
+    run_dir = os.path.join(args.work_dir, "run-estimate")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    dst = os.path.join(run_dir, "dst")
+    os.makedirs(dst)
+    os.chdir(run_dir) # Cache DB / history land here
+
+    config = {'mode': 'copy', 'clean_empty': False, 'rename_enabled': False, 'gps_enabled': False,
+              'resume_enabled': False, 'blur_check_enabled': args.blur, 'skip_existing': False,
+              'src_root': src, 'dst_root': dst}
+
+    t0 = time.perf_counter()
+    report = Processor(dict(config, estimate=True, estimate_sample=args.sample,
+                            estimate_seed=args.sample_seed)).start()['estimate']
+    estimate_s = time.perf_counter() - t0
+    for line in report['summary']:
+        print(line)
+
+    t0 = time.perf_counter()
+    stats = Processor(config).start()
+    run_s = time.perf_counter() - t0
+    _, out_bytes, undated = tree_stats(dst)
+
+    rows = [("source dupes", report['src_dupe']['count'], report['src_dupe']['low'], report['src_dupe']['high'], stats['skipped']),
+            ("undated", report['undated']['count'], report['undated']['low'], report['undated']['high'], undated),
+            ("output MB", *(report['output_bytes'][k] / 2**20 for k in ('bytes', 'low', 'high')), out_bytes / 2**20),
+            ("duration s", report['duration']['seconds'], report['duration']['low'], report['duration']['high'], run_s)]
+    print()
+    print(f"{'quantity':<14}{'estimate':>10}{'95% interval':>22}{'actual':>10}  hit")
+    for name, est, lo, hi, actual in rows:
+        print(f"{name:<14}{est:>10.1f}{f'{lo:.1f} - {hi:.1f}':>22}{actual:>10.1f}  {'yes' if lo <= actual <= hi else 'NO'}")
+    print(f"\nestimate took {estimate_s:.2f} s, the real run {run_s:.2f} s ({run_s / estimate_s:.1f}x)")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
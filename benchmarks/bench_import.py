@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time budget: imports each application module in a fresh interpreter with
+`-X importtime` and reports its cumulative cost, the heaviest dependencies it pulls
+in, and whether any optional heavy backend was loaded eagerly.
+
+    python -m benchmarks.bench_import [--budget-ms 150] [--modules src.core.processor,...]
+
+Exit status 1 when a module exceeds the budget or loads a backend at import time.
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    'src.core.processor',
+    'src.core.date_parser',
+    'src.core.image_ops',
+    'src.core.blur',
+    'src.core.phash',
+    'src.core.geocode',
+    'src.core.dedup',
+    'src.ui.main_window',
+]
+# Must only be imported when the feature that needs them runs
+HEAVY_BACKENDS = ('cv2', 'numpy', 'PIL', 'pillow_heif', 'scipy', 'geopy', 'reverse_geocoder')
+
+
+def measure(module, repeat=3):
+    """Best of `repeat` runs: (cumulative us, {package: cumulative us} of top-level imports)."""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=REPO_ROOT, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+        total, packages = 0, {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line: continue
+            try:
+                _, cumulative, name = line[len("import time:"):].split("|")
+                cumulative = int(cumulative)
+            except ValueError:
+                continue # Header row
+            stripped = name.strip()
+            if stripped == module:
+                total = cumulative
+            top = stripped.split(".")[0]
+            packages[top] = max(packages.get(top, 0), cumulative)
+        if best is None or total < best[0]:
+            best = (total, packages)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument('--budget-ms', type=float, default=150.0)
+    parser.add_argument('--modules', default=",".join(DEFAULT_MODULES))
+    parser.add_argument('--top', type=int, default=3, help="Heaviest dependencies to list per module")
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'module':<26}{'ms':>8}  heaviest imports")
+    for module in args.modules.split(","):
+        total, packages = measure(module)
+        own = module.split(".")[0]
+        deps = sorted(((us, name) for name, us in packages.items() if name != own), reverse=True)[:args.top]
+        eager = [name for name in HEAVY_BACKENDS if name in packages]
+        over = total / 1000 > args.budget_ms
+        failed |= over or bool(eager)
+        flags = (" OVER BUDGET" if over else "") + (f" EAGER: {','.join(eager)}" if eager else "")
+        print(f"{module:<26}{total / 1000:>8.1f}  "
+              + ", ".join(f"{name} {us / 1000:.1f}" for us, name in deps) + flags)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Memory of the dedup / destination indexes: legacy dict trees vs. array-backed indexes.
+
+    python -m benchmarks.bench_index_memory [--n 500000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src.core.dedup_index import SourceDedupIndex, DestinationIndex, digest_to_int, partial_to_int
+
+
+def make_records(n, seed=3):
+    """(size, partial 'SIZE_hex', full hex, (dir, name)) like Dedup produces with xxh64."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(n):
+        size = rng.randint(20_000, 8_000_000)
+        partial = f"{size}_{rng.getrandbits(64):016x}"
+        full = f"{rng.getrandbits(64):016x}"
+        folder = os.path.join("/media/backup/Takeout/Google 相簿", f"Album {i // 200:05d}")
+        records.append((size, partial, full, (folder, f"IMG_{i:08d}.JPG")))
+    return records
+
+
+def measure(build):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    obj = build()
+    elapsed = time.perf_counter() - t0
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current, elapsed
+
+
+def build_legacy_seen(records):
+    seen = {}
+    for size, partial, full, path in records:
+        seen.setdefault(size, {}).setdefault(partial, {})[full] = path
+    return seen
+
+
+def build_compact_seen(records):
+    index = SourceDedupIndex()
+    for size, partial, full, path in records:
+        index.check_and_add(size, partial_to_int(partial), digest_to_int(full), path)
+    return index
+
+
+def build_legacy_dst(records):
+    # Paths are joined here as in _index_destination: the index is their only owner
+    dst = {}
+    for size, _, _, (folder, name) in records:
+        dst.setdefault(size, []).append(os.path.join(folder, name))
+    return dst
+
+
+def build_compact_dst(records):
+    index = DestinationIndex()
+    for size, _, _, (folder, name) in records:
+        index.add(os.path.join(folder, name), size)
+    index.freeze()
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dedup index memory benchmark")
+    parser.add_argument('--n', type=int, default=500_000)
+    args = parser.parse_args(argv)
+
+    records = make_records(args.n)
+    # Source paths already exist in the scanned file list, so they are built up-front
+    sources = [(s, p, f, os.path.join(*path)) for s, p, f, path in records]
+
+    print(f"{'index':<12}{'legacy MB':>12}{'compact MB':>12}{'ratio':>8}{'legacy s':>10}{'compact s':>11}")
+    for label, legacy, compact, data in (("seen_files", build_legacy_seen, build_compact_seen, sources),
+                                         ("dst_index", build_legacy_dst, build_compact_dst, records)):
+        _, old_mem, old_t = measure(lambda: legacy(data))
+        _, new_mem, new_t = measure(lambda: compact(data))
+        print(f"{label:<12}{old_mem / 2**20:>12.1f}{new_mem / 2**20:>12.1f}{old_mem / max(new_mem, 1):>7.1f}x"
+              f"{old_t:>10.2f}{new_t:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Thumbnail stage: per-photo cost of a full decode vs. the reduced paths the stage
+uses (EXIF preview, JPEG DCT draft), then the extra time thumbnails add to a real
+copy run and how many are reused when the same photos land again.
+
+The benchmark corpus only holds tiny JPEGs, so camera-sized photos are generated
+here: a third with an EXIF preview large enough to use, a third with a classic
+160x120 preview, a third without one.
+
+    python -m benchmarks.bench_thumbs [--count 60] [--megapixels 12] [--size 256] [--layout mirror]
+"""
+import io
+import os
+import sys
+import time
+import shutil
+import struct
+import argparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def exif_with_preview(preview: bytes, orientation: int = 1) -> bytes:
+    """Minimal EXIF block: IFD0 (orientation) -> IFD1 (JPEG preview)."""
+    ifd0_off = 8
+    ifd1_off = ifd0_off + 2 + 12 + 4
+    preview_off = ifd1_off + 2 + 24 + 4
+    ifd0 = struct.pack('<H', 1) + struct.pack('<HHII', 0x0112, 3, 1, orientation) + struct.pack('<I', ifd1_off)
+    ifd1 = (struct.pack('<H', 2) + struct.pack('<HHII', 0x0201, 4, 1, preview_off)
+            + struct.pack('<HHII', 0x0202, 4, 1, len(preview)) + struct.pack('<I', 0))
+    return b'Exif\x00\x00II*\x00' + struct.pack('<I', ifd0_off) + ifd0 + ifd1 + preview
+
+
+def generate(root: str, count: int, megapixels: float, big_preview):
+    from PIL import Image
+    if os.path.isdir(root) and len(os.listdir(root)) == count:
+        return
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = w * 3 // 4
+    gradient = Image.linear_gradient('L').resize((w, h))
+    for i in range(count):
+        noise = Image.effect_noise((w, h), 20 + i % 30) # Sensor-like detail: realistic file size / decode cost
+        img = Image.merge('RGB', (gradient, noise, gradient.rotate(180)))
+        preview = (None, (160, 120), big_preview)[i % 3]
+        kwargs = {}
+        if preview:
+            buf = io.BytesIO()
+            img.resize(preview).save(buf, 'JPEG', quality=80)
+            kwargs['exif'] = exif_with_preview(buf.getvalue())
+        img.save(os.path.join(root, f"IMG_{i:04d}.jpg"), 'JPEG', quality=90, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thumbnail stage benchmark")
+    parser.add_argument('--count', type=int, default=60)
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--layout', default='mirror', choices=['mirror', 'packed'])
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--work-dir', default=os.path.join(REPO_ROOT, ".bench"))
+    args = parser.parse_args(argv)
+
+    from PIL import Image
+    from src.utils.logger import Logger
+    from src.core.processor import Processor
+    from src.core.thumbs import render_thumbnail
+    Logger.get_instance().set_callback(lambda msg, level: None)
+
+    src = os.path.join(args.work_dir, f"photos-{args.count}-{args.megapixels:g}mp")
+    big = (max(320, args.size * 5 // 4), max(240, args.size * 15 // 16))
+    print(f"generating {args.count} photos of {args.megapixels:g} MP ...")
+    generate(src, args.count, args.megapixels, big)
+    photos = sorted(os.path.join(src, n) for n in os.listdir(src))
+    mb = sum(os.path.getsize(p) for p in photos) / 2**20
+
+    t0 = time.perf_counter()
+    for path in photos:
+        with Image.open(path) as img:
+            img = img.convert('RGB')
+            img.thumbnail((args.size, args.size), Image.LANCZOS)
+    full_ms = (time.perf_counter() - t0) * 1000 / len(photos)
+
+    paths = {}
+    t0 = time.perf_counter()
+    for path in photos:
+        result = render_thumbnail(path, args.size, 85)
+        how = result[3] if result else 'failed'
+        paths[how] = paths.get(how, 0) + 1
+    stage_ms = (time.perf_counter() - t0) * 1000 / len(photos)
+    print(f"\n{len(photos)} photos, {mb:.1f} MB, thumbnails {args.size} px")
+    print(f"  full decode + resize   {full_ms:8.1f} ms/photo")
+    print(f"  thumbnail stage        {stage_ms:8.1f} ms/photo  ({full_ms / stage_ms:.1f}x)  paths: {paths}")
+
+    run_dir = os.path.join(args.work_dir, "run-thumbs")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    os.chdir(run_dir) # Cache DB (thumbnail index) lands here
+    config = {'mode': 'copy', 'clean_empty': False, 'rename_enabled': False, 'gps_enabled': False,
+              'resume_enabled': False, 'blur_check_enabled': False, 'skip_existing': False, 'src_root': src,
+              'thumbs_layout': args.layout, 'thumbs_size': args.size, 'thumbs_workers': args.workers}
+
+    def run(label, dst, thumbs):
+        t0 = time.perf_counter()
+        stats = Processor(dict(config, dst_root=os.path.join(run_dir, dst), thumbs_enabled=thumbs)).start()
+        seconds = time.perf_counter() - t0
+        note = stats['thumbnails'] if thumbs else ""
+        print(f"  {label:<24}{seconds:8.2f} s  {note}")
+        return seconds
+
+    print("\ncopy runs")
+    run("no thumbnails", "plain", False)
+    run("with thumbnails", "lib", True)
+    run("again (lands as _1)", "lib", True) # Same content: reused, not decoded
+    os.chdir(REPO_ROOT)
+    shutil.rmtree(run_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Tree walking: legacy os.walk + os.path.getsize vs. ParallelWalker, on a generated
+corpus. --latency-ms adds a sleep to every readdir and stat to mimic a network share
+(NFS / SMB round trips), where the parallel walker matters most.
+
+    python -m benchmarks.bench_walk [--scale 10k] [--latency-ms 1] [--workers 1,4,8,16]
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import corpus
+from src.utils.walker import ParallelWalker
+
+
+def legacy_walk(root):
+    files, total = 0, 0
+    for r, _, f in os.walk(root):
+        for name in f:
+            files += 1
+            try: total += os.path.getsize(os.path.join(r, name))
+            except OSError: pass
+    return files, total
+
+
+def parallel_walk(root, workers):
+    files, total = 0, 0
+    for _, size in ParallelWalker(workers).files(root):
+        files += 1
+        if size is not None: total += size
+    return files, total
+
+
+class _SlowEntry:
+    """DirEntry whose stat() pays the simulated round trip (type comes with readdir)."""
+    __slots__ = ('_entry', '_delay')
+
+    def __init__(self, entry, delay):
+        self._entry = entry
+        self._delay = delay
+
+    name = property(lambda self: self._entry.name)
+    path = property(lambda self: self._entry.path)
+
+    def is_dir(self, **kw): return self._entry.is_dir(**kw)
+    def is_file(self, **kw): return self._entry.is_file(**kw)
+    def is_symlink(self): return self._entry.is_symlink()
+
+    def stat(self, **kw):
+        time.sleep(self._delay)
+        return self._entry.stat(**kw)
+
+
+@contextlib.contextmanager
+def simulated_latency(seconds):
+    if seconds <= 0:
+        yield
+        return
+    real_scandir, real_stat = os.scandir, os.stat
+
+    class slow_scandir:
+        """Iterator + context manager, like the real scandir (os.walk uses both)."""
+        def __init__(self, path='.'):
+            time.sleep(seconds)
+            self._it = real_scandir(path)
+        def __iter__(self): return self
+        def __next__(self): return _SlowEntry(next(self._it), seconds)
+        def __enter__(self): return self
+        def __exit__(self, *exc): self._it.close()
+        def close(self): self._it.close()
+
+    def slow_stat(path, *args, **kw):
+        time.sleep(seconds)
+        return real_stat(path, *args, **kw)
+
+    os.scandir, os.stat = slow_scandir, slow_stat
+    try:
+        yield
+    finally:
+        os.scandir, os.stat = real_scandir, real_stat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Directory walk benchmark")
+    parser.add_argument('--scale', default='10k', help="|".join(corpus.SCALES))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--work-dir', default=os.path.join(REPO_ROOT, ".bench"))
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Simulated per readdir / stat latency")
+    parser.add_argument('--workers', default="1,4,8,16")
+    args = parser.parse_args(argv)
+
+    root = os.path.join(args.work_dir, f"corpus-{args.scale}-{args.seed}")
+    corpus.generate(root, corpus.CorpusSpec.for_scale(args.scale, seed=args.seed))
+
+    with simulated_latency(args.latency_ms / 1000):
+        t0 = time.perf_counter()
+        expected = legacy_walk(root)
+        base = time.perf_counter() - t0
+        print(f"{'walker':<20}{'files':>8}{'seconds':>10}{'speedup':>9}")
+        print(f"{'os.walk + getsize':<20}{expected[0]:>8}{base:>10.2f}{1.0:>8.1f}x")
+        for workers in (int(w) for w in args.workers.split(",")):
+            t0 = time.perf_counter()
+            result = parallel_walk(root, workers)
+            elapsed = time.perf_counter() - t0
+            assert result == expected, (result, expected)
+            print(f"{f'parallel x{workers}':<20}{result[0]:>8}{elapsed:>10.2f}{base / elapsed:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
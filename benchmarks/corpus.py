@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic Google-Takeout-like corpus generator.
+
+Everything is produced from a seeded RNG with hand-built file formats
+(JPEG/EXIF, PNG, MP4/MOV, HEIC), so the corpus is byte-for-byte reproducible
+and needs no imaging libraries.
+"""
+import os
+import json
+import random
+import struct
+import zlib
+import datetime
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+SCALES: Dict[str, int] = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+PARTIAL_HASH_MIN = 20480  # Dedup.get_partial_hash switches to head/middle/tail above this size
+
+
+@dataclass
+class CorpusSpec:
+    files: int = 10_000
+    seed: int = 1234
+    # Mix of generated items (fractions of `files`); JPEGs and their sidecars fill the rest
+    screenshot_ratio: float = 0.08
+    video_ratio: float = 0.10
+    live_pair_ratio: float = 0.05      # Each pair counts as 2 files
+    exact_dupe_ratio: float = 0.08
+    same_size_ratio: float = 0.04      # Same size, same head/middle/tail, different content
+    sidecar_ratio: float = 0.35        # Share of JPEGs that get a Takeout .json sidecar
+    gps_ratio: float = 0.40            # Share of JPEGs with GPS tags
+    colliding_name_ratio: float = 0.25 # Share of JPEGs re-using a common IMG_xxxx name
+    files_per_album: int = 200
+
+    @classmethod
+    def for_scale(cls, scale: str, seed: int = 1234) -> "CorpusSpec":
+        key = scale.lower()
+        if key not in SCALES:
+            raise ValueError(f"Unknown scale '{scale}' (choose from {', '.join(SCALES)})")
+        return cls(files=SCALES[key], seed=seed)
+
+
+# Small, well known GPS spots (lat, lon) so geocoding has realistic cache behaviour
+_GPS_SPOTS: List[Tuple[float, float]] = [
+    (25.0330, 121.5654),   # Taipei
+    (22.6273, 120.3014),   # Kaohsiung
+    (23.5711, 119.5793),   # Penghu
+    (35.6762, 139.6503),   # Tokyo
+    (34.6937, 135.5023),   # Osaka
+    (37.5665, 126.9780),   # Seoul
+    (22.3193, 114.1694),   # Hong Kong
+    (48.8566, 2.3522),     # Paris
+]
+
+
+class JpegBuilder:
+    """Builds minimal but valid baseline JPEGs (8x8 gray) with optional EXIF."""
+
+    # 8x8 grayscale, all-ones quantisation, one-code Huffman tables (DC=0, AC=EOB)
+    _SOI = b'\xff\xd8'
+    _EOI = b'\xff\xd9'
+    _DQT = b'\xff\xdb' + struct.pack('>H', 67) + b'\x00' + b'\x01' * 64
+    _SOF0 = b'\xff\xc0' + struct.pack('>HBHHB', 11, 8, 8, 8, 1) + b'\x01\x11\x00'
+    _DHT = (b'\xff\xc4' + struct.pack('>H', 20) + b'\x00' + b'\x01' + b'\x00' * 15 + b'\x00'
+            + b'\xff\xc4' + struct.pack('>H', 20) + b'\x10' + b'\x01' + b'\x00' * 15 + b'\x00')
+    _SOS = b'\xff\xda' + struct.pack('>HB', 8, 1) + b'\x01\x00' + b'\x00\x3f\x00' + b'\x3f'
+
+    @staticmethod
+    def build(date: Optional[datetime.datetime], gps: Optional[Tuple[float, float]],
+              padding: bytes) -> bytes:
+        parts = [JpegBuilder._SOI]
+        if date is not None:
+            parts.append(JpegBuilder._app1_exif(date, gps))
+        parts.append(JpegBuilder._DQT)
+        parts.append(JpegBuilder._SOF0)
+        parts.append(JpegBuilder._DHT)
+        # Pad with COM segments (max 65533 payload bytes each)
+        for i in range(0, len(padding), 65533):
+            chunk = padding[i:i + 65533]
+            parts.append(b'\xff\xfe' + struct.pack('>H', len(chunk) + 2) + chunk)
+        parts.append(JpegBuilder._SOS)
+        parts.append(JpegBuilder._EOI)
+        return b''.join(parts)
+
+    @staticmethod
+    def _app1_exif(date: datetime.datetime, gps: Optional[Tuple[float, float]]) -> bytes:
+        tiff = JpegBuilder._tiff(date, gps)
+        payload = b'Exif\x00\x00' + tiff
+        return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+    @staticmethod
+    def _tiff(date: datetime.datetime, gps: Optional[Tuple[float, float]]) -> bytes:
+        # Little-endian TIFF. Layout: header | IFD0 | ExifIFD | GPSIFD | data area
+        dt = date.strftime("%Y:%m:%d %H:%M:%S").encode('ascii') + b'\x00'  # 20 bytes
+
+        ifd0_tags = 3 if gps else 2
+        ifd0_off = 8
+        ifd0_len = 2 + 12 * ifd0_tags + 4
+        exif_off = ifd0_off + ifd0_len
+        exif_len = 2 + 12 * 1 + 4
+        gps_off = exif_off + exif_len
+        gps_len = (2 + 12 * 4 + 4) if gps else 0
+        data_off = gps_off + gps_len
+
+        data = bytearray()
+
+        def put(blob: bytes) -> int:
+            off = data_off + len(data)
+            data.extend(blob)
+            return off
+
+        dt_ifd0 = put(dt)
+        dt_exif = put(dt)
+
+        def entry(tag, typ, count, value_or_off):
+            return struct.pack('<HHII', tag, typ, count, value_or_off)
+
+        ifd0 = struct.pack('<H', ifd0_tags)
+        ifd0 += entry(306, 2, 20, dt_ifd0)                 # DateTime
+        ifd0 += entry(34665, 4, 1, exif_off)               # ExifIFD pointer
+        if gps:
+            ifd0 += entry(34853, 4, 1, gps_off)            # GPSInfo pointer
+        ifd0 += struct.pack('<I', 0)
+
+        exif = struct.pack('<H', 1) + entry(36867, 2, 20, dt_exif) + struct.pack('<I', 0)
+
+        gps_ifd = b''
+        if gps:
+            lat, lon = gps
+            lat_off = put(JpegBuilder._rationals(abs(lat)))
+            lon_off = put(JpegBuilder._rationals(abs(lon)))
+            lat_ref = (b'N' if lat >= 0 else b'S') + b'\x00\x00\x00'
+            lon_ref = (b'E' if lon >= 0 else b'W') + b'\x00\x00\x00'
+            gps_ifd = struct.pack('<H', 4)
+            gps_ifd += struct.pack('<HHI', 1, 2, 2) + lat_ref
+            gps_ifd += entry(2, 5, 3, lat_off)
+            gps_ifd += struct.pack('<HHI', 3, 2, 2) + lon_ref
+            gps_ifd += entry(4, 5, 3, lon_off)
+            gps_ifd += struct.pack('<I', 0)
+
+        return b'II*\x00' + struct.pack('<I', ifd0_off) + ifd0 + exif + gps_ifd + bytes(data)
+
+    @staticmethod
+    def _rationals(deg: float) -> bytes:
+        d = int(deg)
+        m_full = (deg - d) * 60
+        m = int(m_full)
+        s = int(round((m_full - m) * 60 * 100))
+        return struct.pack('<IIIIII', d, 1, m, 1, s, 100)
+
+
+class PngBuilder:
+    @staticmethod
+    def build(padding: bytes) -> bytes:
+        def chunk(kind: bytes, body: bytes) -> bytes:
+            return struct.pack('>I', len(body)) + kind + body + struct.pack('>I', zlib.crc32(kind + body) & 0xffffffff)
+
+        ihdr = struct.pack('>IIBBBBB', 1, 1, 8, 0, 0, 0, 0)
+        idat = zlib.compress(b'\x00\x80')
+        return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr)
+                + chunk(b'tEXt', b'Comment\x00' + padding.hex().encode('ascii')[:len(padding)])
+                + chunk(b'IDAT', idat) + chunk(b'IEND', b''))
+
+
+class IsoBmffBuilder:
+    """ftyp + mdat container, enough for MP4 / MOV / HEIC sniffing."""
+
+    @staticmethod
+    def build(brand: bytes, payload: bytes) -> bytes:
+        ftyp_body = brand + struct.pack('>I', 0) + brand + b'isom'
+        ftyp = struct.pack('>I', 8 + len(ftyp_body)) + b'ftyp' + ftyp_body
+        mdat = struct.pack('>I', 8 + len(payload)) + b'mdat' + payload
+        return ftyp + mdat
+
+
+class CorpusGenerator:
+    """
+    Writes a reproducible Takeout-style tree under `root`:
+
+        root/Takeout/Google 相簿/<album>/...   JPEGs (+ .json sidecars), videos
+        root/Takeout/Google 相簿/Photos from YYYY/...  colliding IMG_xxxx names
+        root/Screenshots/...                   PNG screenshots
+        root/Live/...                          HEIC + MOV Live Photo pairs
+
+    Returns a manifest with counts per category and total bytes.
+    """
+
+    def __init__(self, spec: CorpusSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.manifest: Dict[str, int] = {
+            'jpeg': 0, 'screenshot': 0, 'video': 0, 'live_pair': 0,
+            'sidecar': 0, 'exact_dupe': 0, 'same_size': 0, 'colliding_name': 0,
+            'files': 0, 'bytes': 0,
+        }
+        self._written: List[str] = []
+
+    def generate(self, root: str) -> Dict[str, int]:
+        spec = self.spec
+        base = os.path.join(root, "Takeout", "Google 相簿")
+        n = spec.files
+
+        n_live = int(n * spec.live_pair_ratio) // 2
+        n_dupe = int(n * spec.exact_dupe_ratio)
+        n_same = int(n * spec.same_size_ratio) // 2
+        n_shot = int(n * spec.screenshot_ratio)
+        n_video = int(n * spec.video_ratio)
+        rest = max(1, n - (n_live * 2 + n_dupe + n_same * 2 + n_shot + n_video))
+        n_jpeg = max(1, int(rest / (1 + spec.sidecar_ratio)))
+        n_sidecar = rest - n_jpeg
+
+        albums = max(1, (n_jpeg + n_video) // spec.files_per_album)
+
+        for i in range(n_jpeg):
+            album = self._album_dir(base, i % albums)
+            date = self._random_date()
+            gps = self.rng.choice(_GPS_SPOTS) if self.rng.random() < spec.gps_ratio else None
+            if self.rng.random() < spec.colliding_name_ratio:
+                name = f"IMG_{self.rng.randint(1, 300):04d}.JPG"
+                album = os.path.join(base, f"Photos from {date.year}")
+                self.manifest['colliding_name'] += 1
+            else:
+                name = self._photo_name(date, i)
+            has_date = self.rng.random() > 0.05
+            data = JpegBuilder.build(date if has_date else None, gps, self._padding(2_000, 60_000))
+            path = self._write(os.path.join(album, name), data)
+            self.manifest['jpeg'] += 1
+            if n_sidecar > 0:
+                n_sidecar -= 1
+                self._write_sidecar(path, date)
+
+        for i in range(n_shot):
+            date = self._random_date()
+            name = f"Screenshot_{date.strftime('%Y-%m-%d-%H-%M-%S')}_{i}.png"
+            self._write(os.path.join(root, "Screenshots", name), PngBuilder.build(self._padding(1_000, 30_000)))
+            self.manifest['screenshot'] += 1
+
+        for i in range(n_video):
+            album = self._album_dir(base, i % albums)
+            date = self._random_date()
+            name = f"VID_{date.strftime('%Y%m%d_%H%M%S')}_{i}.mp4"
+            self._write(os.path.join(album, name), IsoBmffBuilder.build(b'mp42', self._padding(50_000, 400_000)))
+            self.manifest['video'] += 1
+
+        for i in range(n_live):
+            stem = os.path.join(root, "Live", f"IMG_L{i:05d}")
+            self._write(stem + ".HEIC", IsoBmffBuilder.build(b'heic', self._padding(20_000, 80_000)))
+            self._write(stem + ".MOV", IsoBmffBuilder.build(b'qt  ', self._padding(40_000, 200_000)))
+            self.manifest['live_pair'] += 1
+
+        # Exact duplicates of already written media, under a different album
+        media = [p for p in self._written if not p.endswith('.json')]
+        for i in range(n_dupe):
+            if not media: break
+            src = media[self.rng.randrange(len(media))]
+            with open(src, 'rb') as f:
+                data = f.read()
+            dup_dir = os.path.join(base, f"Dupes {i % 16:02d}")
+            self._write(os.path.join(dup_dir, f"{i:06d}_" + os.path.basename(src)), data)
+            self.manifest['exact_dupe'] += 1
+
+        # Same size, identical head/middle/tail: only the full hash can tell them apart
+        for i in range(n_same):
+            date = self._random_date()
+            data = bytearray(JpegBuilder.build(date, None, self._padding(PARTIAL_HASH_MIN * 3, PARTIAL_HASH_MIN * 4)))
+            twin = bytearray(data)
+            flip = len(data) // 4  # Outside the 4 KB head/middle/tail windows
+            twin[flip] ^= 0xff
+            d = os.path.join(base, "Same Size")
+            self._write(os.path.join(d, f"SAME_{i:05d}_a.jpg"), bytes(data))
+            self._write(os.path.join(d, f"SAME_{i:05d}_b.jpg"), bytes(twin))
+            self.manifest['same_size'] += 1
+
+        return self.manifest
+
+    # --- Helpers ---
+    def _album_dir(self, base, idx):
+        return os.path.join(base, f"Album {idx:04d}")
+
+    def _random_date(self) -> datetime.datetime:
+        start = datetime.datetime(2005, 1, 1)
+        return start + datetime.timedelta(seconds=self.rng.randrange(20 * 365 * 86400))
+
+    def _photo_name(self, date: datetime.datetime, i: int) -> str:
+        style = self.rng.randrange(4)
+        if style == 0:
+            return f"IMG_{date.strftime('%Y%m%d_%H%M%S')}_{i}.jpg"
+        if style == 1:
+            return f"PXL_{date.strftime('%Y%m%d_%H%M%S')}{i % 1000:03d}.jpg"
+        if style == 2:
+            return f"IMG-{date.strftime('%Y%m%d')}-WA{i % 10000:04d}.jpg"
+        return f"DSC{i:07d}.JPG"
+
+    def _padding(self, lo: int, hi: int) -> bytes:
+        return self.rng.randbytes(self.rng.randint(lo, hi))
+
+    def _write_sidecar(self, media_path: str, date: datetime.datetime):
+        ts = int(date.replace(tzinfo=datetime.timezone.utc).timestamp())
+        body = json.dumps({
+            "title": os.path.basename(media_path),
+            "photoTakenTime": {"timestamp": str(ts), "formatted": date.isoformat()},
+        }).encode('utf-8')
+        self._write(media_path + ".json", body)
+        self.manifest['sidecar'] += 1
+
+    def _write(self, path: str, data: bytes) -> str:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            stem, ext = os.path.splitext(path)
+            k = 1
+            while os.path.exists(f"{stem}~{k}{ext}"):
+                k += 1
+            path = f"{stem}~{k}{ext}"
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._written.append(path)
+        self.manifest['files'] += 1
+        self.manifest['bytes'] += len(data)
+        return path
+
+
+def generate(root: str, spec: CorpusSpec) -> Dict[str, int]:
+    """Generate the corpus once; a marker file makes repeated calls free."""
+    marker = os.path.join(root, ".corpus.json")
+    if os.path.exists(marker):
+        try:
+            with open(marker, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('files_requested') == spec.files and meta.get('seed') == spec.seed:
+                return meta['manifest']
+        except Exception:
+            pass
+
+    manifest = CorpusGenerator(spec).generate(root)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump({'files_requested': spec.files, 'seed': spec.seed, 'manifest': manifest}, f, indent=2)
+    return manifest
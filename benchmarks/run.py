@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Processor throughput benchmark (headless).
+
+    python -m benchmarks.run --scale 10k --modes copy,move,dry_run
+    python -m benchmarks.run --scale 10k --compare          # vs baselines.json
+    python -m benchmarks.run --scale 10k --save-baseline    # record new baselines
+
+Each mode runs in its own child process so peak RSS and I/O syscall counts
+are measured per mode.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks import corpus
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+MODES = ('copy', 'move', 'link', 'dry_run')
+# Higher is better for throughput, lower is better for resource usage
+METRICS = {
+    'files_per_s': 'higher',
+    'mb_per_s': 'higher',
+    'syscalls': 'lower',
+    'peak_rss_mb': 'lower',
+}
+
+
+def _read_proc_io():
+    """Read/write syscall counters of this process (Linux only)."""
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                k, v = line.split(':', 1)
+                counters[k.strip()] = int(v)
+    except OSError:
+        pass
+    return counters
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    except ImportError:
+        return 0.0
+
+
+def _clone_tree(src, dst):
+    """Hardlink clone so move mode never consumes the pristine corpus."""
+    for r, dirs, files in os.walk(src):
+        rel = os.path.relpath(r, src)
+        target = os.path.join(dst, rel) if rel != '.' else dst
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            s = os.path.join(r, name)
+            t = os.path.join(target, name)
+            try:
+                os.link(s, t)
+            except OSError:
+                shutil.copy2(s, t)
+
+
+def run_child(args):
+    """Runs a single Processor pass and prints a JSON result line."""
+    from src.utils.logger import Logger
+    from src.core.processor import Processor
+
+    Logger.get_instance().set_callback(lambda msg, level: None)
+
+    run_dir = args.run_dir
+    os.makedirs(run_dir, exist_ok=True)
+    os.chdir(run_dir)  # history_log.json / preview_report.csv land here
+
+    mode = args.child_mode
+    config = {
+        'mode': mode if mode in ('move', 'link') else 'copy',
+        'clean_empty': False,
+        'rename_enabled': args.rename,
+        'gps_enabled': args.gps,
+        'gps_online': False,  # Benchmarks never touch the network
+        'resume_enabled': False,
+        'blur_check_enabled': args.blur,
+        'skip_existing': args.skip_existing,
+        'dedup_mode': 'external' if args.external_dedup else 'memory',
+        'processes': args.processes,
+        'durability': args.durability,
+        'io_order': args.io_order,
+        'dry_run': mode == 'dry_run',
+        'src_root': args.src,
+        'dst_root': args.dst,
+    }
+
+    io_before = _read_proc_io()
+    t0 = time.perf_counter()
+    stats = Processor(config).start()
+    elapsed = max(time.perf_counter() - t0, 1e-6)
+    io_after = _read_proc_io()
+
+    syscalls = ((io_after.get('syscr', 0) - io_before.get('syscr', 0))
+                + (io_after.get('syscw', 0) - io_before.get('syscw', 0)))
+    files = args.files
+    result = {
+        'mode': mode,
+        'files': files,
+        'bytes': args.bytes,
+        'elapsed_s': round(elapsed, 3),
+        'files_per_s': round(files / elapsed, 1),
+        'mb_per_s': round(args.bytes / elapsed / (1024 * 1024), 2),
+        'syscalls': syscalls,
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+        'processed': stats.get('processed', 0),
+        'skipped': stats.get('skipped', 0),
+        'errors': stats.get('errors', 0),
+    }
+    print("RESULT " + json.dumps(result))
+
+
+def run_mode(mode, corpus_dir, manifest, work_dir, args):
+    mode_dir = os.path.join(work_dir, f"run-{mode}")
+    if os.path.exists(mode_dir):
+        shutil.rmtree(mode_dir)
+    os.makedirs(mode_dir)
+
+    src = corpus_dir
+    if mode == 'move':
+        src = os.path.join(mode_dir, "src")
+        _clone_tree(corpus_dir, src)
+    dst = os.path.join(mode_dir, "dst")
+    os.makedirs(dst)
+
+    cmd = [sys.executable, "-m", "benchmarks.run", "--child",
+           "--child-mode", mode, "--src", src, "--dst", dst,
+           "--run-dir", os.path.join(mode_dir, "cwd"),
+           "--files", str(manifest['files']), "--bytes", str(manifest['bytes'])]
+    for flag in ('rename', 'gps', 'blur', 'skip_existing', 'external_dedup'):
+        if getattr(args, flag):
+            cmd.append("--" + flag.replace('_', '-'))
+    cmd += ["--processes", str(args.processes), "--durability", args.durability, "--io-order", args.io_order]
+
+    proc = subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark child failed ({mode}):\n{proc.stderr}")
+
+    result = None
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            result = json.loads(line[len("RESULT "):])
+    if result is None:
+        raise RuntimeError(f"Benchmark child produced no result ({mode}):\n{proc.stdout}\n{proc.stderr}")
+
+    if not args.keep:
+        shutil.rmtree(mode_dir, ignore_errors=True)
+    return result
+
+
+def load_baselines():
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {}
+
+
+def save_baselines(data):
+    with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def compare(result, baseline, tolerance):
+    """Returns a list of (metric, baseline, current, delta_pct, regressed)."""
+    rows = []
+    for metric, better in METRICS.items():
+        base = baseline.get(metric)
+        cur = result.get(metric)
+        if not base or cur is None:
+            continue
+        delta = (cur - base) / base * 100.0
+        regressed = delta < -tolerance if better == 'higher' else delta > tolerance
+        rows.append((metric, base, cur, delta, regressed))
+    return rows
+
+
+def _baseline_key(scale, mode, args):
+    opts = [o for o in ('rename', 'gps', 'blur', 'skip_existing', 'external_dedup') if getattr(args, o)]
+    if args.processes > 1:
+        opts.append(f"p{args.processes}")
+    if args.durability != 'batch':
+        opts.append(f"sync-{args.durability}")
+    if args.io_order != 'walk':
+        opts.append(f"order-{args.io_order}")
+    return f"{scale}/{mode}" + (("+" + "+".join(opts)) if opts else "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Photo Organizer benchmark")
+    parser.add_argument('--scale', default='10k', help="|".join(corpus.SCALES))
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--modes', default=",".join(MODES))
+    parser.add_argument('--work-dir', default=os.path.join(REPO_ROOT, ".bench"))
+    parser.add_argument('--rename', action='store_true')
+    parser.add_argument('--gps', action='store_true')
+    parser.add_argument('--blur', action='store_true')
+    parser.add_argument('--skip-existing', dest='skip_existing', action='store_true')
+    parser.add_argument('--external-dedup', dest='external_dedup', action='store_true',
+                        help="Use the on-disk sort/merge dedup (dedup_mode='external')")
+    parser.add_argument('--processes', type=int, default=1, help="Shard across N worker processes")
+    parser.add_argument('--durability', default='batch', choices=['none', 'batch', 'file'],
+                        help="fsync policy for transfers")
+    parser.add_argument('--io-order', dest='io_order', default='walk', choices=['walk', 'inode', 'extent'],
+                        help="Source read order (physical locality for rotational disks)")
+    parser.add_argument('--compare', action='store_true', help="Compare against stored baselines")
+    parser.add_argument('--tolerance', type=float, default=15.0, help="Allowed regression in percent")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--keep', action='store_true', help="Keep per-mode output trees")
+    # Internal (child process)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--child-mode', help=argparse.SUPPRESS)
+    parser.add_argument('--src', help=argparse.SUPPRESS)
+    parser.add_argument('--dst', help=argparse.SUPPRESS)
+    parser.add_argument('--run-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--files', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--bytes', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        run_child(args)
+        return 0
+
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    for m in modes:
+        if m not in MODES:
+            parser.error(f"unknown mode '{m}'")
+
+    spec = corpus.CorpusSpec.for_scale(args.scale, seed=args.seed)
+    corpus_dir = os.path.join(args.work_dir, f"corpus-{args.scale}-{args.seed}")
+    print(f"[bench] 產生語料庫 {args.scale} ({spec.files} files) -> {corpus_dir}")
+    t0 = time.perf_counter()
+    manifest = corpus.generate(corpus_dir, spec)
+    print(f"[bench] 語料庫就緒 ({time.perf_counter() - t0:.1f}s): "
+          + ", ".join(f"{k}={v}" for k, v in manifest.items()))
+
+    baselines = load_baselines()
+    regressions = 0
+    for mode in modes:
+        result = run_mode(mode, corpus_dir, manifest, args.work_dir, args)
+        key = _baseline_key(args.scale, mode, args)
+        print(f"[bench] {key:<28} {result['files_per_s']:>10.1f} files/s "
+              f"{result['mb_per_s']:>8.2f} MB/s  syscalls={result['syscalls']:<10} "
+              f"peak_rss={result['peak_rss_mb']:.1f} MB  errors={result['errors']}")
+
+        if args.compare and key in baselines:
+            for metric, base, cur, delta, regressed in compare(result, baselines[key], args.tolerance):
+                flag = "REGRESSION" if regressed else "ok"
+                print(f"           {metric:<12} base={base:<12} now={cur:<12} {delta:+6.1f}%  {flag}")
+                regressions += int(regressed)
+        elif args.compare:
+            print(f"           (no baseline for {key})")
+
+        if args.save_baseline:
+            entry = {m: result[m] for m in METRICS}
+            entry['machine'] = f"{platform.system()} {platform.machine()} / py{platform.python_version()} / {os.cpu_count()} cpu"
+            baselines[key] = entry
+
+    if args.save_baseline:
+        save_baselines(baselines)
+        print(f"[bench] 已更新基準: {BASELINE_FILE}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
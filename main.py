@@ -1,8 +1,10 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
 import tkinter as tk
 from src.ui.main_window import MainWindow
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support() # Shard worker processes (processes > 1)
     root = tk.Tk()
     # Optional: Set icon if available
     # try: root.iconbitmap("assets/icon.ico")
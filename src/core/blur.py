@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import os
+from typing import Optional, Tuple
+
+from src.utils.fs_utils import FSUtils
+from src.utils.lazy_import import LazyModule, register_heif_opener
+
+# Imported on first use (blur detection is optional)
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image', on_load=register_heif_opener)
+ExifTags = LazyModule('PIL.ExifTags')
+pillow_heif = LazyModule('pillow_heif')
+
+
+class BlurDetector:
+    """
+    Laplacian-variance blur detection on reduced-resolution decodes.
+
+    Every image is scored at the same reference size (long side = REFERENCE_SIZE),
+    whatever path produced the pixels, so one threshold fits 2 MP and 48 MP alike:
+      1. Embedded preview (EXIF IFD1 JPEG / HEIC thumbnail) if it is at least REFERENCE_SIZE.
+      2. JPEG DCT-domain downscaling (PIL draft mode, or cv2 IMREAD_REDUCED_GRAYSCALE_*).
+      3. Full decode, then area downscaling (other formats, HEIC without a usable thumbnail).
+    Images smaller than the reference are upscaled to it (bicubic) rather than scored
+    natively: Laplacian variance grows as detail gets denser per pixel, so a small
+    image would otherwise pass a threshold that the same photo at full size fails.
+    Below MIN_SIZE (icons, stickers) there is too little detail to upscale: no score.
+    Scores are stored in an optional persistent cache keyed by file identity.
+    """
+    REFERENCE_SIZE = 1024
+    MIN_SIZE = REFERENCE_SIZE // 8 # Beyond 8x, upscaling only invents pixels
+    CACHE_VERSION = 2 # 2: sub-reference images upscaled before scoring
+    JPEG_EXTS = {'.jpg', '.jpeg'}
+    HEIF_EXTS = {'.heic', '.heif'}
+
+    def __init__(self, cache=None):
+        """cache: optional CacheTable (see src.utils.cache_db)."""
+        self.cache = cache
+
+    @staticmethod
+    def is_available() -> bool:
+        return bool(cv2)
+
+    def is_blurry(self, path: str, threshold: float = 100.0) -> Tuple[bool, float]:
+        score = self.score(path)
+        if score is None:
+            return False, 0.0
+        return score < threshold, score
+
+    def score(self, path: str) -> Optional[float]:
+        if not cv2:
+            return None
+
+        key = None
+        if self.cache is not None:
+            try:
+                key = f"v{self.CACHE_VERSION}|{FSUtils.file_identity(path)}"
+                cached = self.cache.get(key)
+                if cached is not None:
+                    return float(cached)
+            except OSError:
+                key = None
+
+        try:
+            gray = self._load_reduced_gray(path)
+        except Exception:
+            gray = None
+        if gray is None or max(gray.shape[:2]) < self.MIN_SIZE:
+            return None
+
+        score = float(cv2.Laplacian(self._normalise(gray), cv2.CV_64F).var())
+        if key is not None:
+            self.cache.set(key, round(score, 3))
+        return score
+
+    # --- Decoding ---
+    def _load_reduced_gray(self, path: str):
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext in self.HEIF_EXTS:
+            return self._load_heif(path)
+
+        if Image:
+            with Image.open(path) as img:
+                thumb = self._exif_preview(img) if ext in self.JPEG_EXTS else None
+                if thumb is not None:
+                    return thumb
+                if img.format == 'JPEG':
+                    # DCT scaling: decoder outputs >= requested size at 1/2, 1/4 or 1/8 scale
+                    img.draft('L', (self.REFERENCE_SIZE, self.REFERENCE_SIZE))
+                return np.asarray(img.convert('L'))
+
+        # No PIL: OpenCV reduced decode. imdecode keeps non-ascii Windows paths working.
+        img_array = np.fromfile(path, np.uint8)
+        flag = self._cv2_reduce_flag(os.path.getsize(path))
+        return cv2.imdecode(img_array, flag)
+
+    @staticmethod
+    def exif_jpeg(img) -> Optional[bytes]:
+        """The EXIF IFD1 JPEG preview of an open PIL image (undecoded), or None."""
+        try:
+            raw = img.info.get('exif')
+            if not raw:
+                return None
+            ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+            offset = ifd1.get(0x0201)  # JPEGInterchangeFormat
+            length = ifd1.get(0x0202)  # JPEGInterchangeFormatLength
+            if not offset or not length:
+                return None
+            base = 6 if raw.startswith(b'Exif\x00\x00') else 0
+            return raw[base + offset: base + offset + length] or None
+        except Exception:
+            return None
+
+    @staticmethod
+    def heif_thumbnail(heif, min_size: int):
+        """Smallest embedded HEIF thumbnail whose long side is at least min_size, or None."""
+        best = None
+        for thumb in getattr(heif, 'thumbnails', []) or []:
+            if max(thumb.size) >= min_size and (best is None or max(thumb.size) < max(best.size)):
+                best = thumb
+        return best
+
+    def _exif_preview(self, img):
+        """Decode the EXIF IFD1 JPEG preview if it is large enough to score on its own."""
+        try:
+            blob = self.exif_jpeg(img)
+            if blob is None:
+                return None
+            thumb = cv2.imdecode(np.frombuffer(blob, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if thumb is None or max(thumb.shape[:2]) < self.REFERENCE_SIZE:
+                return None
+            return thumb
+        except Exception:
+            return None
+
+    def _load_heif(self, path: str):
+        if not pillow_heif:
+            return None
+        heif = pillow_heif.open_heif(path, convert_hdr_to_8bit=True)
+        # Cheap path: smallest embedded thumbnail that still covers the reference size
+        best = self.heif_thumbnail(heif, self.REFERENCE_SIZE)
+        source = best if best is not None else heif
+        pil_img = Image.frombytes(source.mode, source.size, bytes(source.data), "raw", source.mode, source.stride)
+        return np.asarray(pil_img.convert('L'))
+
+    def _cv2_reduce_flag(self, file_size: int) -> int:
+        # Without header parsing, pick the DCT scale from the compressed size
+        if file_size > 4 * 1024 * 1024:
+            return cv2.IMREAD_REDUCED_GRAYSCALE_8
+        if file_size > 1024 * 1024:
+            return cv2.IMREAD_REDUCED_GRAYSCALE_4
+        return cv2.IMREAD_REDUCED_GRAYSCALE_2
+
+    def _normalise(self, gray):
+        h, w = gray.shape[:2]
+        long_side = max(h, w)
+        if long_side != self.REFERENCE_SIZE:
+            scale = self.REFERENCE_SIZE / long_side
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+        return gray
@@ -5,18 +5,37 @@ import json
 import re
 from typing import Optional
 from src.utils.logger import Logger
+from src.utils.lazy_import import LazyModule, register_heif_opener
+
+# Pillow is imported on first EXIF read (HEIF support registered if pillow_heif is installed)
+Image = LazyModule('PIL.Image', on_load=register_heif_opener)
+
+_DATE_SEPS = ':-/.'
+_DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+# Filename patterns, in priority order:
+#  1. Calendar date, not inside a longer digit run (optional time):
+#     PXL_20230101_123456789, IMG_20200101_093000, VID_20190704..., IMG-20200101-WA0001,
+#     Screenshot_2021-05-06-10-11-12, 2019-07-04 18.30.00, DSC20190101
+#  2. Unix epoch milliseconds (13 digits) or seconds (10 digits)
+_RE_CALENDAR = re.compile(
+    r'(?<!\d)(19\d{2}|20\d{2})[-_.]?(0[1-9]|1[0-2])[-_.]?(0[1-9]|[12]\d|3[01])'
+    r'(?:[-_ T.]?([01]\d|2[0-3])[-_.:h]?([0-5]\d)[-_.:m]?([0-5]\d))?'
+)
+_RE_EPOCH = re.compile(r'(?<!\d)(\d{13}|1\d{9})(?!\d)')
+_TS_MIN = 946684800  # 2000-01-01: smaller 10/13-digit numbers are counters, not dates
+
+
+def _is_valid_ymd(y: int, m: int, d: int) -> bool:
+    if y < 1900 or m < 1 or m > 12 or d < 1 or d > _DAYS_IN_MONTH[m]: return False
+    if m == 2 and d == 29 and not (y % 4 == 0 and (y % 100 != 0 or y % 400 == 0)): return False
+    return True
 
-# Try importing Pillow
-try:
-    from PIL import Image, ExifTags
-    import pillow_heif
-    pillow_heif.register_heif_opener()
-except ImportError:
-    Image = None
 
 class DateParser:
     def __init__(self):
         self.logger = Logger.get_instance()
+        self._refresh_max_date()
 
     def get_date(self, path: str, is_photo: bool) -> Optional[datetime.datetime]:
         # 1. JSON Sidecar
@@ -95,11 +114,27 @@ class DateParser:
         return None
 
     def _try_parse_exif(self, dt_str) -> Optional[datetime.datetime]:
+        """
+        Hand-written parser for the fixed EXIF layout 'YYYY:MM:DD HH:MM:SS'
+        (also accepts '-' / '/' separators, a missing time and trailing NULs).
+        """
         if not dt_str: return None
+        if isinstance(dt_str, bytes):
+            dt_str = dt_str.decode('ascii', 'ignore')
+        if not isinstance(dt_str, str): return None
+
+        s = dt_str.strip().rstrip('\x00')
+        n = len(s)
+        if n < 10 or s[4] not in _DATE_SEPS or s[7] not in _DATE_SEPS: return None
         try:
-            return datetime.datetime.strptime(dt_str, "%Y:%m:%d %H:%M:%S")
-        except:
+            y = int(s[0:4]); mo = int(s[5:7]); d = int(s[8:10])
+            h = mi = sec = 0
+            if n >= 19 and s[13] == ':' and s[16] == ':':
+                h = int(s[11:13]); mi = int(s[14:16]); sec = int(s[17:19])
+        except ValueError:
             return None
+        if not _is_valid_ymd(y, mo, d) or h > 23 or mi > 59 or sec > 59: return None
+        return datetime.datetime(y, mo, d, h, mi, sec)
 
     def _parse_json_date(self, json_path) -> Optional[datetime.datetime]:
         try:
@@ -114,33 +149,49 @@ class DateParser:
         return None
 
     def _parse_filename_date(self, filename) -> Optional[datetime.datetime]:
-        # YYYYMMDD
-        match = re.search(r'(20\d{2}|19\d{2})[-_]?(\d{2})[-_]?(\d{2})', filename)
-        if match:
-            try:
-                y, m, d = match.groups()
-                return datetime.datetime(int(y), int(m), int(d))
-            except:
-                pass
-        
-        # Timestamp (13 digits)
-        match_ts = re.search(r'(\d{13})', filename)
-        if match_ts:
-            try:
-                ts = int(match_ts.group(1)) / 1000
-                return datetime.datetime.fromtimestamp(ts)
-            except:
-                pass
+        """
+        Tries the precompiled patterns in priority order:
+        calendar dates (PXL_/IMG_/VID_/Screenshot_/IMG-...-WA, with optional time),
+        then 13-digit Unix milliseconds, then 10-digit Unix seconds.
+        """
+        match = _RE_CALENDAR.search(filename)
+        while match is not None:
+            y, mo, d, h, mi, sec = match.groups()
+            y = int(y); mo = int(mo); d = int(d)
+            if _is_valid_ymd(y, mo, d):
+                if h is not None:
+                    return datetime.datetime(y, mo, d, int(h), int(mi), int(sec))
+                return datetime.datetime(y, mo, d)
+            match = _RE_CALENDAR.search(filename, match.start() + 1)
+
+        match = _RE_EPOCH.search(filename)
+        while match is not None:
+            digits = match.group(1)
+            ts = int(digits) / 1000 if len(digits) == 13 else int(digits)
+            if ts > self._max_ts:
+                self._refresh_max_date()
+            if _TS_MIN <= ts <= self._max_ts:
+                try:
+                    return datetime.datetime.fromtimestamp(ts)
+                except (OverflowError, OSError, ValueError):
+                    pass
+            match = _RE_EPOCH.search(filename, match.end())
         return None
 
+    def _refresh_max_date(self):
+        """Upper bound for plausible dates: now + 30 days."""
+        self._max_date = datetime.datetime.now() + datetime.timedelta(days=30)
+        self._max_ts = self._max_date.timestamp()
+
     def _is_valid_date(self, date_obj, src_info="") -> bool:
         if not date_obj: return False
         if date_obj.year < 1900: return False
         
-        now = datetime.datetime.now()
-        max_date = now + datetime.timedelta(days=30)
-        
-        if date_obj > max_date:
-            self.logger.warn(f"日期異常(未來): {date_obj} ({src_info}) -> 將歸類至 No_Date")
-            return False
+        # The cached bound only grows stale in the safe direction (too early),
+        # so the clock is read again only for dates that look like the future.
+        if date_obj > self._max_date:
+            self._refresh_max_date()
+            if date_obj > self._max_date:
+                self.logger.warn(f"日期異常(未來): {date_obj} ({src_info}) -> 將歸類至 No_Date")
+                return False
         return True
@@ -1,30 +1,190 @@
 import hashlib
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.utils.page_cache import PageCache
+from src.utils.cancel import TransferCancelled
 try:
     import xxhash
     HAS_XXHASH = True
 except ImportError:
     HAS_XXHASH = False
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
+# name -> hasher factory, in 'auto' preference order (fast non-cryptographic first)
+_BACKENDS = {}
+if HAS_XXHASH and hasattr(xxhash, 'xxh3_128'):
+    _BACKENDS['xxh3_128'] = xxhash.xxh3_128
+if blake3 is not None:
+    _BACKENDS['blake3'] = blake3.blake3
+_BACKENDS['blake2b'] = lambda: hashlib.blake2b(digest_size=16)
+_BACKENDS['md5'] = hashlib.md5
+
+_READ_BUFFER = 1 << 20 # Reused per thread, so hashing does not allocate per chunk
+_local = threading.local()
 
-from src.utils.config import ConfigConstants
 
 class Dedup:
+    """
+    Content digests for duplicate detection.
+
+    Full digests are self-describing: '<backend>:<hex>' when streamed, and
+    '<backend>/t<chunk MiB>:<hex>' for the tree hash of large files (each chunk hashed
+    on its own, in parallel, then the chunk digests hashed together). The tag changes
+    whenever the computation does, so a stored digest is only ever compared with one
+    computed the same way. Call configure() before hashing to change the defaults.
+
+    With a CancelToken configured, every read loop checks it between buffers: a stop
+    raises TransferCancelled (never reported as an unreadable file), a pause blocks.
+    With a Throttle configured, reads are charged to its read budget.
+    """
+    algorithm = next(iter(_BACKENDS))
+    tree_threshold = 256 << 20 # Files at least this large use the parallel tree hash
+    tree_chunk = 32 << 20
+    PARTIAL_SMALL = 20480 # Smaller files are hashed whole by the partial hash
+    hash_threads = min(8, os.cpu_count() or 1)
+    _pool = None
+    _pool_threads = 0
+    _pool_lock = threading.Lock()
+    cancel = None # CancelToken, checked between reads
+    throttle = None # Throttle, read bandwidth limit
+
     @staticmethod
-    def get_hash(path: str) -> str:
-        """Calculate full file hash using xxHash (if available) or MD5."""
-        if HAS_XXHASH:
-            hasher = xxhash.xxh64()
+    def available_algorithms():
+        return list(_BACKENDS)
+
+    @classmethod
+    def configure(cls, algorithm: str = 'auto', tree_threshold_mb: int = 256, threads: int = 0,
+                  cancel=None, throttle=None):
+        """algorithm: 'auto' or one of available_algorithms(); threads 0 = min(8, cpu count)."""
+        if algorithm != 'auto':
+            if algorithm not in _BACKENDS:
+                raise ValueError(f"Hash backend unavailable: {algorithm} (available: {', '.join(_BACKENDS)})")
+            cls.algorithm = algorithm
         else:
-            hasher = hashlib.md5()
-            
+            cls.algorithm = next(iter(_BACKENDS))
+        cls.tree_threshold = max(tree_threshold_mb, 1) << 20
+        cls.hash_threads = threads or min(8, os.cpu_count() or 1)
+        cls.cancel = cancel
+        cls.throttle = throttle if throttle is not None and throttle.enabled else None
+
+    @staticmethod
+    def _buffer() -> memoryview:
+        buf = getattr(_local, 'buf', None)
+        if buf is None:
+            buf = _local.buf = memoryview(bytearray(_READ_BUFFER))
+        return buf
+
+    @staticmethod
+    def _read_into(f, buf: memoryview, limit: int) -> int:
+        """One paced, cancellable, throttled read of at most `limit` bytes into `buf`."""
+        cancel, throttle = Dedup.cancel, Dedup.throttle
+        if cancel is None and throttle is None:
+            return f.readinto(buf[:limit])
+        if throttle is not None:
+            limit = min(limit, throttle.chunk_limit())
+        if cancel is not None:
+            cancel.check()
+            limit = min(limit, cancel.chunk)
+        t0 = time.monotonic()
+        n = f.readinto(buf[:limit])
+        if cancel is not None:
+            cancel.observe(n or 0, time.monotonic() - t0) # Raw I/O time, before any throttle wait
+        if throttle is not None and n:
+            throttle.read(n, cancel)
+        return n
+
+    @staticmethod
+    def _update_range(hasher, f, offset: int, length: int):
+        """Feed `length` bytes from `offset` through the reusable buffer (readinto, no copies)."""
+        buf = Dedup._buffer()
+        f.seek(offset)
+        while length > 0:
+            n = Dedup._read_into(f, buf, min(length, len(buf)))
+            if not n: break
+            hasher.update(buf[:n])
+            length -= n
+
+    @classmethod
+    def _executor(cls) -> ThreadPoolExecutor:
+        with cls._pool_lock:
+            if cls._pool is None or cls._pool_threads != cls.hash_threads:
+                if cls._pool is not None: cls._pool.shutdown(wait=False)
+                cls._pool = ThreadPoolExecutor(max_workers=cls.hash_threads, thread_name_prefix="hash")
+                cls._pool_threads = cls.hash_threads
+            return cls._pool
+
+    @classmethod
+    def _chunk_digest(cls, path: str, index: int, size: int) -> bytes:
+        hasher = _BACKENDS[cls.algorithm]()
+        offset = index * cls.tree_chunk
+        with open(path, 'rb', buffering=0) as f:
+            PageCache.sequential(f.fileno())
+            cls._update_range(hasher, f, offset, min(cls.tree_chunk, size - offset))
+        return hasher.digest()
+
+    @classmethod
+    def _tree_hash(cls, path: str, size: int) -> str:
+        chunks = (size + cls.tree_chunk - 1) // cls.tree_chunk
+        executor = cls._executor()
+        digests = list(executor.map(lambda i: cls._chunk_digest(path, i, size), range(chunks)))
+        root = _BACKENDS[cls.algorithm]()
+        root.update(size.to_bytes(8, 'little'))
+        for d in digests:
+            root.update(d)
+        return f"{cls.algorithm}/t{cls.tree_chunk >> 20}:{root.hexdigest()}"
+
+    @staticmethod
+    def get_hash(path: str, release: bool = False) -> str:
+        """
+        Full file digest (see class docstring for the format); "" if unreadable.
+        release: drop the file from the page cache afterwards (it will not be read again).
+        """
+        algorithm = Dedup.algorithm
         try:
-            with open(path, 'rb') as f:
-                while chunk := f.read(ConfigConstants.BLOCK_SIZE * 4): # Read bigger chunks
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            size = os.path.getsize(path)
+            if size >= Dedup.tree_threshold:
+                digest = Dedup._tree_hash(path, size)
+                if release: PageCache.drop(path)
+                return digest
+            hasher = _BACKENDS[algorithm]()
+            buf = Dedup._buffer()
+            with open(path, 'rb', buffering=0) as f:
+                PageCache.sequential(f.fileno())
+                while n := Dedup._read_into(f, buf, len(buf)):
+                    hasher.update(buf[:n])
+                if release: PageCache.release(f.fileno())
+            return f"{algorithm}:{hasher.hexdigest()}"
+        except TransferCancelled:
+            raise
         except:
             return ""
 
+    @staticmethod
+    def partial_ranges(size: int):
+        """(offset, length) pairs the partial hash reads: head, middle, tail - or all of a small file."""
+        if size < Dedup.PARTIAL_SMALL:
+            return [(0, size)] if size else []
+        return [(0, 4096), (size // 2, 4096), (size - 4096, 4096)]
+
+    @staticmethod
+    def partial_from_reads(size: int, read) -> str:
+        """get_partial_hash() of data fetched with read(offset, length) -> bytes (e.g. ranged GETs)."""
+        hasher = _BACKENDS[Dedup.algorithm]()
+        for offset, length in Dedup.partial_ranges(size):
+            hasher.update(read(offset, length))
+        return f"{size}_{hasher.hexdigest()}"
+
+    @classmethod
+    def digest_tag(cls, size: int) -> str:
+        """Prefix get_hash() gives a file of `size` bytes with the current settings."""
+        return f"{cls.algorithm}/t{cls.tree_chunk >> 20}" if size >= cls.tree_threshold else cls.algorithm
+
     @staticmethod
     def get_partial_hash(path: str) -> str:
         """
@@ -33,26 +193,17 @@ class Dedup:
         """
         try:
             size = os.path.getsize(path)
-            if size < 20480: # Small file (<20KB), just full hash
-                return f"{size}_{Dedup.get_hash(path)}"
-            
-            if HAS_XXHASH:
-                hasher = xxhash.xxh64()
-            else:
-                hasher = hashlib.md5()
-                
-            with open(path, 'rb') as f:
-                # Head
-                hasher.update(f.read(4096))
-                
-                # Middle
-                f.seek(size // 2)
-                hasher.update(f.read(4096))
-                
-                # Tail
-                f.seek(-4096, 2)
-                hasher.update(f.read(4096))
-                
+            if size < Dedup.PARTIAL_SMALL: # Small file (<20KB), just full hash
+                return f"{size}_{Dedup.get_hash(path).rsplit(':', 1)[-1]}"
+
+            hasher = _BACKENDS[Dedup.algorithm]()
+            with open(path, 'rb', buffering=0) as f:
+                PageCache.random(f.fileno()) # 3 x 4 KiB: no read-ahead around each seek
+                for offset, length in Dedup.partial_ranges(size):
+                    Dedup._update_range(hasher, f, offset, length)
+
             return f"{size}_{hasher.hexdigest()}"
+        except TransferCancelled:
+            raise
         except:
             return ""
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+import os
+import bisect
+import threading
+from array import array
+from typing import Iterator, Optional, Tuple
+
+_MASK64 = (1 << 64) - 1
+
+
+def digest_to_int(digest: str) -> Optional[int]:
+    """
+    Hex digest (optionally prefixed, e.g. 'SIZE_hex' or 'algo:hex') -> int.
+    Returns None for empty / unreadable digests so failed reads never match.
+    """
+    if not digest: return None
+    hex_part = digest.rsplit(':', 1)[-1].rsplit('_', 1)[-1]
+    try:
+        return int(hex_part, 16)
+    except ValueError:
+        return None
+
+
+def partial_to_int(digest: str) -> Optional[int]:
+    """Partial ('SIZE_hex') digest folded to 64 bits; it is only a pre-filter."""
+    value = digest_to_int(digest)
+    if value is None: return None
+    return (value ^ (value >> 64)) & _MASK64
+
+
+class PathTable:
+    """
+    Paths stored as (interned directory id, UTF-8 name in a shared byte blob).
+    Roughly 12 bytes + the name's bytes per path instead of a full str object.
+    """
+
+    def __init__(self):
+        self._dir_ids = {}
+        self._dirs = []
+        self._dir_of = array('I')
+        self._name_end = array('I')
+        self._blob = bytearray()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._dir_of)
+
+    def add(self, path: str) -> int:
+        d, name = os.path.split(path)
+        raw = name.encode('utf-8', 'surrogateescape')
+        with self._lock:
+            dir_id = self._dir_ids.get(d)
+            if dir_id is None:
+                dir_id = len(self._dirs)
+                self._dir_ids[d] = dir_id
+                self._dirs.append(d)
+            self._dir_of.append(dir_id)
+            self._blob.extend(raw)
+            self._name_end.append(len(self._blob))
+            return len(self._dir_of) - 1
+
+    def get(self, pid: int) -> str:
+        start = self._name_end[pid - 1] if pid > 0 else 0
+        name = bytes(self._blob[start:self._name_end[pid]]).decode('utf-8', 'surrogateescape')
+        return os.path.join(self._dirs[self._dir_of[pid]], name)
+
+
+class SourceDedupIndex:
+    """
+    Replaces the {size: {partial: {full: path}}} dict tree for source-side dedup.
+
+    Rows live in typed columns (size, partial, full hi/lo, path id); an open-addressing
+    table of row numbers (linear probing, load <= 0.5) maps (size, partial, full) to the
+    first path seen with that content.
+    """
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.paths = PathTable()
+        self._size = array('Q')
+        self._partial = array('Q')
+        self._full_hi = array('Q')
+        self._full_lo = array('Q')
+        self._pid = array('I')
+        cap = 1
+        while cap < capacity: cap <<= 1
+        self._slots = array('i', [-1]) * cap
+        self._mask = cap - 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._size)
+
+    @staticmethod
+    def _slot_hash(size: int, partial: int, full_lo: int) -> int:
+        return (full_lo ^ (size * 0x9E3779B97F4A7C15) ^ (partial >> 7)) & _MASK64
+
+    def check_and_add(self, size: int, partial: int, full: int, path: str) -> Optional[str]:
+        """
+        Returns the path of an earlier file with identical (size, partial, full) digests,
+        or None after recording `path` as the first occurrence.
+        """
+        hi, lo = (full >> 64) & _MASK64, full & _MASK64
+        with self._lock:
+            slots, mask = self._slots, self._mask
+            i = self._slot_hash(size, partial, lo) & mask
+            while True:
+                row = slots[i]
+                if row < 0: break
+                if (self._full_lo[row] == lo and self._size[row] == size
+                        and self._partial[row] == partial and self._full_hi[row] == hi):
+                    return self.paths.get(self._pid[row])
+                i = (i + 1) & mask
+
+            row = len(self._size)
+            self._size.append(size)
+            self._partial.append(partial)
+            self._full_hi.append(hi)
+            self._full_lo.append(lo)
+            self._pid.append(self.paths.add(path))
+            slots[i] = row
+            if (row + 1) * 2 > len(slots):
+                self._grow()
+            return None
+
+    def _grow(self):
+        cap = len(self._slots) * 2
+        slots = array('i', [-1]) * cap
+        mask = cap - 1
+        for row in range(len(self._size)):
+            i = self._slot_hash(self._size[row], self._partial[row], self._full_lo[row]) & mask
+            while slots[i] >= 0:
+                i = (i + 1) & mask
+            slots[i] = row
+        self._slots, self._mask = slots, mask
+
+
+class DestinationIndex:
+    """
+    Replaces {size: [path, ...]} for the destination tree.
+
+    Filled once while indexing, then frozen: rows are sorted by size so candidates are
+    found by binary search. Digests are only ever computed for the few rows whose size
+    matches a source file, so they are memoised sparsely per row.
+    """
+    _UNREADABLE = -1
+
+    def __init__(self):
+        self.paths = PathTable()
+        self._sizes = array('Q')
+        self._pids = array('I')
+        self._partial = {}
+        self._full = {}
+        self._lock = threading.Lock()
+        self._frozen = False
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def add(self, path: str, size: int):
+        if self._frozen:
+            raise RuntimeError("DestinationIndex is frozen")
+        self._sizes.append(size)
+        self._pids.append(self.paths.add(path))
+
+    def freeze(self):
+        """Sort rows by size; must be called once indexing is complete."""
+        order = sorted(range(len(self._sizes)), key=self._sizes.__getitem__)
+        self._sizes = array('Q', (self._sizes[i] for i in order))
+        self._pids = array('I', (self._pids[i] for i in order))
+        self._frozen = True
+
+    def has_size(self, size: int) -> bool:
+        i = bisect.bisect_left(self._sizes, size)
+        return i < len(self._sizes) and self._sizes[i] == size
+
+    def candidates(self, size: int) -> Iterator[Tuple[int, str]]:
+        """(row, path) for every destination file of exactly `size` bytes."""
+        i = bisect.bisect_left(self._sizes, size)
+        n = len(self._sizes)
+        while i < n and self._sizes[i] == size:
+            yield i, self.paths.get(self._pids[i])
+            i += 1
+
+    def _memo(self, memo: dict, row: int, compute, convert) -> Optional[int]:
+        with self._lock:
+            value = memo.get(row)
+        if value is None:
+            value = convert(compute())
+            if value is None: value = self._UNREADABLE
+            with self._lock:
+                memo[row] = value
+        return None if value == self._UNREADABLE else value
+
+    def partial(self, row: int, compute) -> Optional[int]:
+        """Memoised partial digest of a destination row; `compute()` returns the hex digest."""
+        return self._memo(self._partial, row, compute, partial_to_int)
+
+    def full(self, row: int, compute) -> Optional[int]:
+        return self._memo(self._full, row, compute, digest_to_int)
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+import os
+import math
+import time
+import bisect
+import random
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.config import ConfigConstants
+from src.core.dedup import Dedup
+from src.core.dedup_index import digest_to_int, partial_to_int
+from src.core.image_ops import ImageOps
+from src.core.transfer import FileTransfer
+
+
+class SampleEstimate:
+    """
+    Estimate mode: predict a run from a stratified random sample instead of a full dry run.
+
+    Only the scan touches every file, and it reads metadata (path, size). Files are
+    grouped by (extension, size bucket) and every group is sampled in proportion to
+    its file count, at least MIN_PER_STRATUM per group. Each sampled file goes through
+    the real stages - rules, partial / full hash, destination dedup, blur, near-duplicate
+    hash, date, GPS - and a byte-budgeted subset is transferred into the system temp dir
+    when it sits on the destination device (otherwise only read from the source; nothing
+    is ever written under the destination), timing every stage. Outcomes and costs are extrapolated
+    group by group (stratified estimator with finite population correction) with 95%
+    confidence intervals.
+
+    Source duplicates depend on the rest of the library, so a sampled file is compared
+    with the scanned files of the same size (at most MAX_COPIES_CHECKED of them and
+    COPIES_CHECK_BYTES of reading, so large videos are compared with a few): with
+    m identical copies it counts as m / (m + 1) of a duplicate, since each group of k
+    identical files keeps one.
+    """
+    SIZE_BUCKETS = (100 << 10, 1 << 20, 10 << 20, 100 << 20) # <100 KB, <1 MB, <10 MB, <100 MB, larger
+    MIN_PER_STRATUM = 2
+    MAX_COPIES_CHECKED = 16
+    COPIES_CHECK_BYTES = 256 << 20 # Full-hash budget per sampled file
+    Z = 1.96 # 95% normal interval
+
+    def __init__(self, processor, sample_size: int = 400, seed: Optional[int] = None, transfer_mb: float = 256):
+        self.proc = processor
+        self.sample_size = max(1, sample_size)
+        self.rng = random.Random(seed)
+        self.transfer_budget = int(transfer_mb * (1 << 20))
+        self.transfer_probe = None # 'write' (timed into scratch space on the destination device) or 'read'
+        self.workers = min(32, (os.cpu_count() or 1) + 4) # Same pool size as the real run
+
+    # --- Sampling ---
+    @classmethod
+    def stratum(cls, path: str, size: Optional[int]) -> Tuple[str, int]:
+        bucket = -1 if size is None else bisect.bisect_right(cls.SIZE_BUCKETS, size)
+        return os.path.splitext(path)[1].lower(), bucket
+
+    @classmethod
+    def allocate(cls, population: Dict[tuple, int], n: int) -> Dict[tuple, int]:
+        """Proportional allocation, at least MIN_PER_STRATUM (or the whole group if smaller)."""
+        total = sum(population.values())
+        return {key: min(count, max(cls.MIN_PER_STRATUM, round(n * count / total)))
+                for key, count in population.items()}
+
+    def draw(self, files: Sequence[str], sizes: Sequence[Optional[int]]):
+        """Returns ({stratum: population count}, {stratum: sampled file ids})."""
+        groups: Dict[tuple, List[int]] = {}
+        for i, path in enumerate(files):
+            groups.setdefault(self.stratum(path, sizes[i]), []).append(i)
+        population = {key: len(ids) for key, ids in groups.items()}
+        quota = self.allocate(population, self.sample_size)
+        return population, {key: sorted(self.rng.sample(ids, quota[key])) for key, ids in groups.items()}
+
+    # --- Measurement ---
+    def run(self, files: Sequence[str], sizes: Sequence[Optional[int]], dst_root: str, scan_seconds: float) -> dict:
+        proc = self.proc
+        population, sample = self.draw(files, sizes)
+        ids = [i for key in sample for i in sample[key]]
+        if proc.status_callback: proc.status_callback(f"快速估算：分析 {len(ids)} 個樣本檔案...")
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            records = dict(zip(ids, executor.map(lambda i: self._analyse(files[i], sizes[i]), ids)))
+        analyse_wall = time.perf_counter() - started
+        analyse_speedup = sum(r['measured'] for r in records.values()) / max(analyse_wall, 1e-9)
+
+        if proc.status_callback: proc.status_callback("快速估算：比對來源重複檔案...")
+        self._source_copies(files, sizes, records)
+        for r in records.values():
+            self._settle(r)
+
+        if proc.status_callback: proc.status_callback("快速估算：量測傳輸速度...")
+        per_file, per_byte, transfer_speedup, measured = self._measure_transfers(files, records, dst_root)
+        for r in records.values():
+            r['transfer'] = r['moved'] * (per_file + per_byte * r['size']) if r['moved'] else 0.0
+
+        total_files = len(files)
+        n = len(ids)
+        def interval(field, cap=None):
+            est, se = self._total(population, sample, records, field, bounded=cap is not None)
+            lo, hi = max(0.0, est - self.Z * se), est + self.Z * se
+            if cap is not None:
+                if est == 0: # Nothing seen in the sample: rule of three for the upper bound
+                    hi = min(1.0, 3.0 / n) * cap
+                hi = min(hi, cap)
+            return est, se, lo, hi
+
+        report = {'files': total_files, 'bytes': sum(s for s in sizes if s), 'sample': n,
+                  'strata': len(population), 'scan_seconds': scan_seconds}
+        enabled = {'src_dupe': True, 'undated': True, 'dest_dupe': proc.config.get('skip_existing', False),
+                   'blurry': proc.config['blur_check_enabled']}
+        for field in ('src_dupe', 'dest_dupe', 'undated', 'blurry'):
+            est, _, lo, hi = interval(field, cap=total_files if enabled[field] else None)
+            report[field] = {'count': est, 'low': lo, 'high': hi}
+        est, _, lo, hi = interval('out_bytes')
+        report['output_bytes'] = {'bytes': est, 'low': lo, 'high': hi}
+
+        analyse, analyse_se, _, _ = interval('cost')
+        transfer, transfer_se, _, _ = interval('transfer')
+        analyse /= analyse_speedup
+        analyse_se /= analyse_speedup
+        if transfer_speedup:
+            transfer /= transfer_speedup
+            transfer_se /= transfer_speedup
+        se = math.hypot(analyse_se, transfer_se)
+        duration = scan_seconds + analyse + transfer
+        report['duration'] = {'seconds': duration, 'low': max(scan_seconds, duration - self.Z * se),
+                              'high': duration + self.Z * se, 'scan': scan_seconds,
+                              'analyse': analyse, 'transfer': transfer}
+        report['stage_ms'] = {stage: 1000 * sum(r['stages'].get(stage, 0.0) for r in records.values()) / n
+                              for stage in ('rules', 'hash', 'blur', 'near_dup', 'date', 'gps')}
+        report['transfer_mbps'] = (sum(r['size'] for r in measured) / sum(r['seconds'] for r in measured) / (1 << 20)
+                                   if measured and sum(r['seconds'] for r in measured) > 0 else None)
+        report['transfer_measured'] = len(measured)
+        report['transfer_probe'] = self.transfer_probe
+        report['summary'] = self.summary(report)
+        return report
+
+    def _analyse(self, path: str, size: Optional[int]) -> dict:
+        """Run the per-file stages of Processor._process_single_file on one sampled file, timing each."""
+        proc, config = self.proc, self.proc.config
+        r = {'path': path, 'size': size or 0, 'outcome': 'organize', 'stages': {}, 'digests': None,
+             'dest_dupe': 0.0, 'src_copies': 0.0, 'blurry': 0.0, 'undated': 0.0}
+        stages = r['stages']
+        proc.cancel.check()
+        started = time.perf_counter()
+
+        def lap(stage):
+            nonlocal started
+            now = time.perf_counter()
+            stages[stage] = stages.get(stage, 0.0) + now - started
+            started = now
+
+        try:
+            if config['resume_enabled'] and proc._is_already_processed(path, r['size']):
+                r['outcome'] = 'resumed'
+                return r
+            rule = proc.rules.match(path, r['size'], lambda: ImageOps.get_camera_model(path))
+            lap('rules')
+            if rule is None or rule.action == 'skip':
+                r['outcome'] = 'skip'
+                return r
+            if rule.action == 'route':
+                r['outcome'] = 'route'
+                return r
+
+            partial = partial_to_int(Dedup.get_partial_hash(path))
+            full = digest_to_int(Dedup.get_hash(path)) if partial is not None else None
+            if partial is not None and full is not None:
+                r['digests'] = (partial, full)
+                r['dest_dupe'] = float(proc.dedup.in_destination(path, r['size'], partial, full))
+            lap('hash')
+
+            is_photo = os.path.splitext(path)[1].lower() not in ConfigConstants.EXT_VIDEOS
+            if config['blur_check_enabled'] and is_photo:
+                r['blurry'] = float(proc.blur_detector.is_blurry(path, config.get('blur_threshold', 100.0))[0])
+                lap('blur')
+            if proc.near_dup_index is not None and is_photo:
+                proc._check_near_duplicate(path)
+                lap('near_dup')
+            r['undated'] = float(proc.date_parser.get_date(path, is_photo) is None)
+            lap('date')
+            if config['gps_enabled'] and os.path.splitext(path)[1].lower() in ConfigConstants.EXT_PHOTOS:
+                ImageOps.get_lat_lon(path)
+                lap('gps')
+        except OSError:
+            r['outcome'] = 'error'
+        finally:
+            r['measured'] = sum(stages.values())
+        return r
+
+    def _source_copies(self, files, sizes, records):
+        """Count identical copies of each sampled file among the other scanned files of its size."""
+        wanted = {r['size'] for r in records.values() if r['digests'] and not r['dest_dupe']}
+        by_size: Dict[int, List[int]] = {}
+        for i, size in enumerate(sizes):
+            if size in wanted:
+                by_size.setdefault(size, []).append(i)
+
+        def copies(item):
+            file_id, r = item
+            others = [j for j in by_size.get(r['size'], ()) if j != file_id]
+            limit = min(self.MAX_COPIES_CHECKED, max(1, self.COPIES_CHECK_BYTES // max(r['size'], 1)))
+            checked = others if len(others) <= limit else self.rng.sample(others, limit)
+            partial, full = r['digests']
+            found = 0
+            for j in checked:
+                if self.proc._dedup_candidate_size(files[j]) is None: continue # Skipped / routed: never deduplicated
+                if partial_to_int(Dedup.get_partial_hash(files[j])) != partial: continue
+                if digest_to_int(Dedup.get_hash(files[j])) == full:
+                    found += 1
+            return file_id, found * len(others) / len(checked) if checked else 0.0
+
+        todo = [(i, r) for i, r in records.items() if r['digests'] and not r['dest_dupe']]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for file_id, m in executor.map(copies, todo):
+                records[file_id]['src_copies'] = m
+
+    def _settle(self, r):
+        """Expected outcome weights and serial cost, following the pipeline order."""
+        stages = r['stages']
+        dest = r['dest_dupe']
+        src = 0.0 if dest else r['src_copies'] / (r['src_copies'] + 1)
+        r['src_dupe'] = src
+        kept = 1.0 - dest - src # Reaches blur / date
+        r['blurry'] *= kept
+        sorted_share = kept - r['blurry'] # Reaches the date stage
+        r['undated'] *= sorted_share
+
+        outcome = r['outcome']
+        if outcome in ('resumed', 'skip', 'error'):
+            r['moved'] = 0.0
+        elif outcome == 'route':
+            r['moved'] = 1.0
+        else: # Duplicates are filed under _Duplicates in move mode, skipped otherwise
+            r['moved'] = 1.0 - dest - (0.0 if self.proc.config['mode'] == 'move' else src)
+        r['out_bytes'] = r['moved'] * r['size']
+        late = stages.get('near_dup', 0.0) + stages.get('date', 0.0) + stages.get('gps', 0.0)
+        r['cost'] = (stages.get('rules', 0.0) + stages.get('hash', 0.0)
+                     + kept * stages.get('blur', 0.0) + sorted_share * late)
+
+    def _measure_transfers(self, files, records, dst_root):
+        """
+        Copy / link a random byte-budgeted subset of the sample into a scratch folder on the
+        destination device (see _probe_dir), then fit seconds = per_file + per_byte * size.
+        Without one - object storage, a read-only destination, a temp dir on another
+        device - the subset is only read from the source, a lower bound on the transfer.
+        Returns (per_file, per_byte, parallel speedup, measured rows).
+        """
+        config = self.proc.config
+        mode = config['mode']
+        storage = self.proc.storage
+        candidates = [r for r in records.values() if r['moved'] > 0 and r['size'] > 0]
+        if not candidates:
+            return 0.0, 0.0, 1.0, []
+
+        probe = self._probe_dir(dst_root) if storage.local else None
+        if probe is not None:
+            base, temp_parent = probe
+            if mode == 'move':
+                try:
+                    if os.stat(candidates[0]['path']).st_dev == os.stat(base).st_dev:
+                        return 0.0, 0.0, 1.0, [] # Same device: a rename, no data moves
+                except OSError:
+                    pass
+            transfer = FileTransfer(config.get('durability', 'batch'), config.get('durability_batch', 200),
+                                    cancel=self.proc.cancel, throttle=self.proc.throttle)
+            temp_dir = tempfile.mkdtemp(prefix=".spo-estimate-", dir=temp_parent)
+            if mode == 'link':
+                put = lambda src, dst: transfer.link(src, dst, config.get('link_method', 'auto'))
+            else:
+                put = transfer.copy
+            finish, cleanup = transfer.flush, lambda: shutil.rmtree(temp_dir, ignore_errors=True)
+        else: # No scratch space on the destination device (object storage, read-only): time source reads only
+            temp_dir = ""
+            put, finish, cleanup = lambda src, dst: self._read_through(src), (lambda: None), (lambda: None)
+        self.transfer_probe = 'write' if probe is not None else 'read'
+
+        self.rng.shuffle(candidates)
+        chosen, budget = [], self.transfer_budget
+        for r in candidates:
+            if r['size'] <= budget:
+                chosen.append(r)
+                budget -= r['size']
+
+        def send(item):
+            n, r = item
+            dst = os.path.join(temp_dir, f"{n}{os.path.splitext(r['path'])[1]}")
+            t0 = time.perf_counter()
+            try:
+                put(r['path'], dst)
+            except OSError:
+                return None
+            return {'size': r['size'], 'seconds': time.perf_counter() - t0}
+
+        measured = []
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                measured = [m for m in executor.map(send, enumerate(chosen)) if m is not None]
+            finish() # Batched fsyncs belong to the transfer cost
+            wall = time.perf_counter() - started
+        finally:
+            cleanup()
+        if not measured:
+            return 0.0, 0.0, 1.0, []
+
+        per_file, per_byte = self._fit([m['size'] for m in measured], [m['seconds'] for m in measured])
+        return per_file, per_byte, sum(m['seconds'] for m in measured) / max(wall, 1e-9), measured
+
+    @staticmethod
+    def _probe_dir(dst_root: str) -> Optional[Tuple[str, str]]:
+        """
+        (existing destination ancestor, writable scratch folder on the same device) or None.
+        The scratch folder is the system temp dir, never the destination tree itself.
+        """
+        base = dst_root
+        while base and not os.path.isdir(base):
+            base = os.path.dirname(base)
+        if not base:
+            return None
+        try:
+            device = os.stat(base).st_dev
+            if hasattr(os, 'statvfs') and os.statvfs(base).f_flag & os.ST_RDONLY:
+                return None
+            temp_parent = tempfile.gettempdir()
+            if os.stat(temp_parent).st_dev != device or not os.access(temp_parent, os.W_OK):
+                return None
+        except OSError:
+            return None
+        return base, temp_parent
+
+    @staticmethod
+    def _read_through(path: str):
+        """Read a file end to end through Dedup's paced, cancellable, throttled reads."""
+        buf = Dedup._buffer()
+        with open(path, 'rb') as f:
+            while Dedup._read_into(f, buf, len(buf)):
+                pass
+
+    @staticmethod
+    def _fit(xs: Sequence[float], ys: Sequence[float]) -> Tuple[float, float]:
+        """Least squares y = a + b x; falls back to the mean rate through the origin."""
+        n = len(xs)
+        mx, my = sum(xs) / n, sum(ys) / n
+        var = sum((x - mx) ** 2 for x in xs)
+        if n >= 3 and var > 0:
+            b = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var
+            a = my - b * mx
+            if a >= 0 and b >= 0:
+                return a, b
+        return 0.0, sum(ys) / sum(xs) if sum(xs) else 0.0
+
+    # --- Extrapolation ---
+    @staticmethod
+    def _total(population, sample, records, field, bounded: bool = False) -> Tuple[float, float]:
+        """
+        Stratified estimate of the population total of `field` and its standard error.
+        bounded: `field` is a 0..1 outcome. Rare outcomes often never show up in a
+        group's sample, which would claim zero variance there; the group variance is
+        floored with the Agresti-Coull proportion (x + 2) / (n + 4) wherever the
+        stages ran, so a handful of misses still widens the interval.
+        """
+        est, var = 0.0, 0.0
+        for key, ids in sample.items():
+            count, n = population[key], len(ids)
+            if n == 0: continue
+            values = [records[i][field] for i in ids]
+            mean = sum(values) / n
+            est += count * mean
+            if n < count:
+                s2 = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+                if bounded and any(records[i]['outcome'] == 'organize' for i in ids):
+                    adjusted = (sum(values) + 2) / (n + 4)
+                    s2 = max(s2, adjusted * (1 - adjusted))
+                var += count * count * (1 - n / count) * s2 / n
+        return est, math.sqrt(var)
+
+    # --- Report ---
+    @staticmethod
+    def format_seconds(seconds: float) -> str:
+        seconds = int(round(seconds))
+        h, rest = divmod(seconds, 3600)
+        m, s = divmod(rest, 60)
+        if h: return f"{h} 小時 {m} 分"
+        if m: return f"{m} 分 {s} 秒"
+        return f"{s} 秒"
+
+    def summary(self, report: dict) -> List[str]:
+        fmt_bytes, fmt_time = self.proc._format_bytes, self.format_seconds
+        total = max(report['files'], 1)
+
+        def share(label, entry):
+            return (f"{label}: 約 {entry['count']:.0f} 個 ({100 * entry['count'] / total:.1f}%，"
+                    f"95% 區間 {100 * entry['low'] / total:.1f}% – {100 * entry['high'] / total:.1f}%)")
+
+        out, duration = report['output_bytes'], report['duration']
+        lines = [f"=== 快速估算: 抽樣 {report['sample']} / {report['files']} 個檔案 ({report['strata']} 組) ===",
+                 share("來源重複", report['src_dupe'])]
+        if self.proc.config.get('skip_existing', False):
+            lines.append(share("目標已存在", report['dest_dupe']))
+        lines.append(share("無日期 (No_Date)", report['undated']))
+        if self.proc.config['blur_check_enabled']:
+            lines.append(share("模糊", report['blurry']))
+        lines.append(f"輸出大小: 約 {fmt_bytes(out['bytes'])} (95% 區間 {fmt_bytes(out['low'])} – {fmt_bytes(out['high'])})")
+        lines.append(f"預估耗時: 約 {fmt_time(duration['seconds'])} (95% 區間 {fmt_time(duration['low'])} – "
+                     f"{fmt_time(duration['high'])})；掃描 {fmt_time(duration['scan'])}、分析 {fmt_time(duration['analyse'])}、"
+                     f"傳輸 {fmt_time(duration['transfer'])}")
+        stages = "、".join(f"{name} {report['stage_ms'][key]:.1f} ms" for key, name in
+                           (('hash', "雜湊"), ('date', "日期"), ('blur', "模糊"), ('near_dup', "近似"), ('gps', "GPS"))
+                           if report['stage_ms'][key])
+        if stages:
+            lines.append(f"每檔平均: {stages}")
+        if report['transfer_mbps'] and report['transfer_probe'] == 'read':
+            lines.append(f"來源讀取實測: {report['transfer_mbps']:.1f} MB/s ({report['transfer_measured']} 個樣本檔案；"
+                         f"目標裝置無可用暫存空間，傳輸時間以讀取速度估計，實際寫入可能更慢)")
+        elif report['transfer_mbps']:
+            lines.append(f"傳輸實測: {report['transfer_mbps']:.1f} MB/s ({report['transfer_measured']} 個樣本檔案)")
+        return lines
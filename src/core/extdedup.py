@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+import os
+import heapq
+import pickle
+import shutil
+import tempfile
+import threading
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional
+
+from src.core.dedup import Dedup
+from src.core.dedup_index import digest_to_int, partial_to_int
+
+SIDE_DEST = 0
+SIDE_SOURCE = 1
+
+
+class ExternalSorter:
+    """
+    Sorts more tuples than fit in memory.
+
+    Records are buffered until their estimated size reaches `memory_bytes`, then sorted
+    and spilled to `work_dir` as a run of pickled chunks. sorted() k-way merges the runs
+    (in several passes when there are more than FAN_IN of them).
+    """
+    FAN_IN = 64
+
+    def __init__(self, work_dir: str, memory_bytes: int, name: str = "run"):
+        self.work_dir = work_dir
+        self.memory_bytes = max(memory_bytes, 1 << 20)
+        self.name = name
+        self.count = 0
+        self._buffer = []
+        self._buffered = 0
+        self._runs = []
+        self._run_seq = 0
+        self._chunk = 4096
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def _estimate(record) -> int:
+        # tuple header + boxed ints + str payload (worst case 2 bytes/char)
+        return 56 + 40 * len(record) + sum(2 * len(x) for x in record if isinstance(x, str))
+
+    def add(self, record):
+        self._buffer.append(record)
+        self._buffered += self._estimate(record)
+        self.count += 1
+        if self._buffered >= self.memory_bytes:
+            self._spill()
+
+    def _spill(self):
+        if not self._buffer: return
+        self._buffer.sort()
+        # Merge readers hold one chunk per run: size chunks so FAN_IN of them fit the budget
+        avg = max(1, self._buffered // len(self._buffer))
+        self._chunk = max(64, min(4096, self.memory_bytes // (2 * self.FAN_IN * avg)))
+        self._runs.append(self._write_run(self._buffer))
+        self._buffer = []
+        self._buffered = 0
+
+    def _write_run(self, records) -> str:
+        path = os.path.join(self.work_dir, f"{self.name}-{self._run_seq:05d}.bin")
+        self._run_seq += 1
+        with open(path, 'wb') as f:
+            chunk = []
+            for r in records:
+                chunk.append(r)
+                if len(chunk) >= self._chunk:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return path
+
+    @staticmethod
+    def _read_run(path) -> Iterator[tuple]:
+        with open(path, 'rb') as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+    def sorted(self) -> Iterator[tuple]:
+        """Yield every record in order. Consumes the sorter."""
+        if not self._runs:
+            self._buffer.sort()
+            records, self._buffer = self._buffer, []
+            yield from records
+            return
+
+        self._spill()
+        runs = self._runs
+        while len(runs) > self.FAN_IN:
+            merged = []
+            for i in range(0, len(runs), self.FAN_IN):
+                group = runs[i:i + self.FAN_IN]
+                merged.append(self._write_run(heapq.merge(*(self._read_run(p) for p in group))))
+                for p in group: os.remove(p)
+            runs = merged
+        self._runs = []
+        try:
+            yield from heapq.merge(*(self._read_run(p) for p in runs))
+        finally:
+            for p in runs:
+                try: os.remove(p)
+                except OSError: pass
+
+
+class ExternalDedup:
+    """
+    Out-of-core replacement for SourceDedupIndex + DestinationIndex (dedup_mode='external').
+
+    Every candidate file is spilled as (size, side, id, path) to sorted runs. Merging the
+    runs yields same-size groups; only groups with a source file and at least two members
+    are hashed (partial, then full), as in the in-memory tiers. Size groups too large for
+    the budget are hashed member by member and re-sorted on disk by (size, partial, full).
+
+    Decisions are kept as one byte per source file and read back with status(file_id).
+    Within a group of identical files the first source in scan order is the original.
+    """
+    NONE, SRC_DUPE, DEST_DUPE = 0, 1, 2
+    _STATUS = {NONE: None, SRC_DUPE: "SRC_DUPE", DEST_DUPE: "DEST_DUPE"}
+
+    def __init__(self, source_count: int, memory_mb: int = 256, temp_dir: Optional[str] = None,
+                 max_workers: int = 8, stop_event: Optional[threading.Event] = None, storage=None):
+        """storage: destination backend hashing destination files (default: read them locally)."""
+        self.decisions = bytearray(source_count)
+        self.storage = storage
+        self.max_workers = max_workers
+        self.stop_event = stop_event or threading.Event()
+        budget = max(memory_mb * (1 << 20) - source_count, 8 << 20)
+        self._budget = budget
+        self._work_dir = tempfile.mkdtemp(prefix="spo-dedup-", dir=temp_dir)
+        self._by_size = ExternalSorter(self._work_dir, budget // 2, "size")
+        # Largest size group resolved in memory (rough per-record cost incl. hashes)
+        self._group_limit = max(1024, budget // 4 // 512)
+        self._dest_ids = 0
+        self.stats = {'sources': 0, 'destinations': 0, 'src_dupes': 0, 'dest_dupes': 0}
+
+    def add_destination(self, path: str, size: int):
+        self._by_size.add((size, SIDE_DEST, self._dest_ids, path))
+        self._dest_ids += 1
+        self.stats['destinations'] += 1
+
+    def add_source(self, file_id: int, path: str, size: int):
+        self._by_size.add((size, SIDE_SOURCE, file_id, path))
+        self.stats['sources'] += 1
+
+    def status(self, file_id: int) -> Optional[str]:
+        """None, "SRC_DUPE" or "DEST_DUPE" (same contract as Processor._check_duplicate)."""
+        return self._STATUS[self.decisions[file_id]]
+
+    def resolve(self):
+        """Merge the runs and decide every duplicate. Temporary files are removed afterwards."""
+        try:
+            by_digest = ExternalSorter(self._work_dir, self._budget // 4, "digest")
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                # Groups resolved in memory are batched for the pool, but the batch plus the
+                # group being read never hold more than _group_limit records (budget / 4)
+                pending, buffered = [], 0
+                def flush():
+                    nonlocal pending, buffered
+                    list(executor.map(self._resolve_group, pending))
+                    pending, buffered = [], 0
+
+                for _, group in groupby(self._by_size.sorted(), key=itemgetter(0)):
+                    if self.stop_event.is_set(): return
+                    head = list(islice(group, self._group_limit - buffered))
+                    if len(head) == self._group_limit - buffered and pending:
+                        flush() # Might be a large group: read on with the memory released
+                        head.extend(islice(group, self._group_limit - len(head)))
+                    if len(head) < self._group_limit:
+                        if len(head) > 1 and head[-1][1] == SIDE_SOURCE:
+                            pending.append(head)
+                            buffered += len(head)
+                    else:
+                        self._spill_group(chain(head, group), by_digest, executor)
+                flush()
+
+            for _, group in groupby(by_digest.sorted(), key=itemgetter(0, 1, 2)):
+                if self.stop_event.is_set(): return
+                self._decide(group)
+        finally:
+            self.stats['src_dupes'] = self.decisions.count(self.SRC_DUPE)
+            self.stats['dest_dupes'] = self.decisions.count(self.DEST_DUPE)
+            shutil.rmtree(self._work_dir, ignore_errors=True)
+
+    # --- Internal ---
+    def _hash(self, record, full: bool) -> Optional[int]:
+        path = record[-1]
+        if record[1] == SIDE_DEST and self.storage is not None:
+            return digest_to_int(self.storage.full_hash(path, release=True)) if full else partial_to_int(self.storage.partial_hash(path))
+        if full: # Destination files are never read again; sources are, by the transfer
+            return digest_to_int(Dedup.get_hash(path, release=record[1] != SIDE_SOURCE))
+        return partial_to_int(Dedup.get_partial_hash(path))
+
+    def _buckets(self, members: List[tuple], full: bool) -> List[List[tuple]]:
+        """Split by digest, keeping buckets that still hold a duplicate candidate."""
+        buckets = {}
+        for m in members:
+            h = self._hash(m, full)
+            if h is not None: # Unreadable files are never duplicates
+                buckets.setdefault(h, []).append(m)
+        return [b for b in buckets.values() if len(b) > 1 and b[-1][1] == SIDE_SOURCE]
+
+    def _resolve_group(self, members: List[tuple]):
+        """Same-size group that fits in memory. Members are sorted: destinations, then sources by id."""
+        for bucket in self._buckets(members, full=False):
+            for same in self._buckets(bucket, full=True):
+                self._decide(same)
+
+    def _spill_group(self, members, by_digest: ExternalSorter, executor):
+        """Oversized size group: hash every member and sort by digest on disk."""
+        def digests(m):
+            partial = self._hash(m, False)
+            full = self._hash(m, True) if partial is not None else None
+            return partial, full
+
+        while True:
+            batch = list(islice(members, 1024))
+            if not batch or self.stop_event.is_set(): return
+            for m, (partial, full) in zip(batch, executor.map(digests, batch)):
+                if full is not None:
+                    by_digest.add((m[0], partial, full) + m[1:])
+
+    def _decide(self, members):
+        """
+        `members` share identical content and are ordered destinations first, then
+        sources in scan order. Sources matching a destination file (other than
+        themselves) are DEST_DUPE; of the rest, all but the first are SRC_DUPE.
+        """
+        dests = [] # Two distinct destination paths are enough to decide
+        original_seen = False
+        for m in members:
+            side, file_id, path = m[-3:]
+            if side == SIDE_DEST:
+                if len(dests) < 2:
+                    ap = os.path.abspath(path)
+                    if ap not in dests: dests.append(ap)
+                continue
+            if dests and (len(dests) > 1 or dests[0] != os.path.abspath(path)):
+                self.decisions[file_id] = self.DEST_DUPE
+            elif original_seen:
+                self.decisions[file_id] = self.SRC_DUPE
+            else:
+                original_seen = True
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Offline zh-TW names for reverse_geocoder (GeoNames) results, chosen to match what
+Nominatim returns with language='zh-TW' so offline folders equal online ones.
+Entries can be extended / overridden with ConfigConstants.GEO_NAMES_FILE:
+    {"countries": {"TW": "臺灣"}, "cities": {"TW": {"Penghu": "澎湖縣"}}}
+"""
+import os
+import json
+
+from src.utils.config import ConfigConstants
+
+COUNTRY_ZH = {
+    'TW': '臺灣', 'JP': '日本', 'KR': '南韓', 'KP': '北韓', 'CN': '中國', 'HK': '香港', 'MO': '澳門',
+    'SG': '新加坡', 'MY': '馬來西亞', 'TH': '泰國', 'VN': '越南', 'PH': '菲律賓', 'ID': '印尼',
+    'KH': '柬埔寨', 'LA': '寮國', 'MM': '緬甸', 'IN': '印度', 'NP': '尼泊爾', 'LK': '斯里蘭卡',
+    'MV': '馬爾地夫', 'AE': '阿拉伯聯合大公國', 'TR': '土耳其', 'EG': '埃及', 'IL': '以色列',
+    'US': '美國', 'CA': '加拿大', 'MX': '墨西哥', 'BR': '巴西', 'AR': '阿根廷', 'PE': '秘魯', 'CL': '智利',
+    'GB': '英國', 'IE': '愛爾蘭', 'FR': '法國', 'DE': '德國', 'IT': '義大利', 'ES': '西班牙', 'PT': '葡萄牙',
+    'NL': '荷蘭', 'BE': '比利時', 'LU': '盧森堡', 'CH': '瑞士', 'AT': '奧地利', 'CZ': '捷克', 'PL': '波蘭',
+    'HU': '匈牙利', 'GR': '希臘', 'HR': '克羅埃西亞', 'SI': '斯洛維尼亞', 'DK': '丹麥', 'SE': '瑞典',
+    'NO': '挪威', 'FI': '芬蘭', 'IS': '冰島', 'RU': '俄羅斯', 'AU': '澳大利亞', 'NZ': '紐西蘭',
+    'PW': '帛琉', 'GU': '關島', 'MP': '北馬利安納群島', 'ZA': '南非',
+}
+
+# cc -> {GeoNames name / admin2 / admin1: zh-TW}
+CITY_ZH = {
+    'TW': {
+        'Taipei': '臺北市', 'New Taipei': '新北市', 'Taoyuan': '桃園市', 'Taichung': '臺中市',
+        'Tainan': '臺南市', 'Kaohsiung': '高雄市', 'Keelung': '基隆市', 'Hsinchu': '新竹市',
+        'Hsinchu County': '新竹縣', 'Miaoli': '苗栗縣', 'Changhua': '彰化縣', 'Nantou': '南投縣',
+        'Yunlin': '雲林縣', 'Chiayi': '嘉義市', 'Chiayi County': '嘉義縣', 'Pingtung': '屏東縣',
+        'Yilan': '宜蘭縣', 'Hualien': '花蓮縣', 'Taitung': '臺東縣', 'Penghu': '澎湖縣',
+        'Kinmen': '金門縣', 'Lienchiang': '連江縣', 'Fukien': '金門縣',
+    },
+    'JP': {
+        'Tokyo': '東京都', 'Osaka': '大阪市', 'Kyoto': '京都市', 'Nara': '奈良市', 'Kobe': '神戶市',
+        'Yokohama': '橫濱市', 'Nagoya': '名古屋市', 'Sapporo': '札幌市', 'Fukuoka': '福岡市',
+        'Hiroshima': '廣島市', 'Okinawa': '沖繩縣', 'Naha': '那霸市', 'Hokkaido': '北海道',
+        'Kanagawa': '神奈川縣', 'Chiba': '千葉縣', 'Kumamoto': '熊本市', 'Kanazawa': '金澤市',
+    },
+    'KR': {
+        'Seoul': '首爾', 'Busan': '釜山', 'Incheon': '仁川', 'Daegu': '大邱', 'Jeju City': '濟州市',
+        'Jeju-do': '濟州特別自治道',
+    },
+    'HK': {'Hong Kong': '香港島', 'Kowloon': '九龍', 'Kowloon City': '九龍城區', 'Central and Western': '中西區'},
+    'MO': {'Macau': '澳門'},
+    'CN': {
+        'Shanghai': '上海市', 'Beijing': '北京市', 'Shenzhen': '深圳市', 'Guangzhou': '廣州市',
+        'Xiamen': '廈門市', 'Hangzhou': '杭州市', 'Suzhou': '蘇州市',
+    },
+    'SG': {'Singapore': '新加坡'},
+    'TH': {'Bangkok': '曼谷', 'Chiang Mai': '清邁', 'Phuket': '普吉'},
+    'VN': {'Hanoi': '河內', 'Ho Chi Minh City': '胡志明市', 'Da Nang': '峴港'},
+    'US': {'New York City': '紐約', 'Los Angeles': '洛杉磯', 'San Francisco': '舊金山', 'Seattle': '西雅圖', 'Honolulu': '檀香山'},
+    'GB': {'London': '倫敦'},
+    'FR': {'Paris': '巴黎'},
+    'IT': {'Rome': '羅馬', 'Venice': '威尼斯', 'Milan': '米蘭', 'Florence': '佛羅倫斯'},
+    'DE': {'Berlin': '柏林', 'Munich': '慕尼黑', 'Frankfurt am Main': '法蘭克福'},
+    'AU': {'Sydney': '雪梨', 'Melbourne': '墨爾本', 'Brisbane': '布里斯本'},
+}
+
+
+def load_overrides(path: str = ConfigConstants.GEO_NAMES_FILE):
+    """Merge user-supplied names (optional JSON file) into the built-in tables."""
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        COUNTRY_ZH.update(data.get('countries', {}))
+        for cc, names in data.get('cities', {}).items():
+            CITY_ZH.setdefault(cc, {}).update(names)
+    except Exception:
+        pass
+
+
+def localize(record: dict) -> str:
+    """GeoNames record {'cc', 'name', 'admin1', 'admin2'} -> 'Country_City' folder name."""
+    cc = record.get('cc', '')
+    table = CITY_ZH.get(cc, {})
+    city = None
+    for field in ('name', 'admin2', 'admin1'):
+        value = record.get(field, '')
+        if value and value in table:
+            city = table[value]
+            break
+    if city is None:
+        city = record.get('name') or record.get('admin1') or ''
+    country = COUNTRY_ZH.get(cc, cc)
+
+    safe_country = "".join([c for c in country if c.isalnum() or c in (' ', '_')]).strip()
+    safe_city = "".join([c for c in city if c.isalnum() or c in (' ', '_')]).strip()
+    if not safe_country: safe_country = "未知國家"
+    if not safe_city: safe_city = "未知城市"
+    return f"{safe_country}_{safe_city}"
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+import abc
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.logger import Logger
+from src.utils.lazy_import import LazyModule
+from src.core import geo_names_zh
+
+# Both pull in large trees (scipy / requests stacks): imported only when GPS is used
+rg = LazyModule('reverse_geocoder')
+geocoders = LazyModule('geopy.geocoders')
+
+LatLon = Tuple[float, float]
+
+
+class Geocoder(abc.ABC):
+    """
+    Reverse geocoder interface used by GeoCache.
+    reverse() returns "Country_City", or None when the point has no usable address.
+    Transient failures (timeouts, HTTP errors) must raise so they are not cached.
+    """
+    name = "base"
+
+    @abc.abstractmethod
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        ...
+
+
+class NominatimGeocoder(Geocoder):
+    """OpenStreetMap Nominatim (zh-TW). Requests are spaced by `min_interval` seconds."""
+    name = "nominatim"
+
+    def __init__(self, timeout: float = 3, min_interval: float = 1.0):
+        # User agent is required by Nominatim
+        self._geolocator = geocoders.Nominatim(user_agent="smart_photo_organizer_v2", timeout=timeout)
+        self._min_interval = min_interval
+        self._last_request = 0.0
+        self._rate_lock = threading.Lock()
+
+    @staticmethod
+    def is_available() -> bool:
+        return bool(geocoders)
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        with self._rate_lock:
+            wait = self._last_request + self._min_interval - time.monotonic()
+            if wait > 0: time.sleep(wait)
+            self._last_request = time.monotonic()
+
+        location = self._geolocator.reverse((lat, lon), language='zh-TW', exactly_one=True)
+        if not location:
+            return None
+        address = location.raw.get('address', {})
+        country = address.get('country', '')
+        # Hierarchy for City: city -> county -> town -> suburb
+        city = address.get('city', address.get('county', address.get('town', address.get('suburb', ''))))
+
+        if not country: country = "未知國家"
+        if not city: city = "未知城市"
+        return f"{country}_{city}"
+
+
+class GeoCache:
+    """
+    Thread-safe reverse-geocode cache in front of any Geocoder.
+
+    - Key: quantised grid cell (lat/lon rounded to `precision` decimals, ~100 m at 3).
+    - Bounded in-memory LRU, backed by an optional persistent CacheTable.
+    - Single-flight: concurrent misses on the same cell wait for one resolution
+      instead of each firing its own request.
+    Negative answers are cached; exceptions (transient failures) are not.
+    """
+    _MISSING = ""  # Stored for "resolved, no address"
+
+    def __init__(self, geocoder: Geocoder, table=None, precision: int = 3, max_entries: int = 4096):
+        self.geocoder = geocoder
+        self.table = table
+        self.precision = precision
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, int], threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'lookups': 0, 'waits': 0, 'failures': 0}
+
+    def cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        scale = 10 ** self.precision
+        return (int(round(lat * scale)), int(round(lon * scale)))
+
+    def _disk_key(self, cell: Tuple[int, int]) -> str:
+        return f"{self.precision}:{cell[0]}:{cell[1]}"
+
+    def lookup(self, lat: float, lon: float) -> Optional[str]:
+        cell = self.cell(lat, lon)
+        with self._lock:
+            if cell in self._lru:
+                self._lru.move_to_end(cell)
+                self.stats['memory_hits'] += 1
+                return self._lru[cell] or None
+            flight = self._inflight.get(cell)
+            leader = flight is None
+            if leader:
+                flight = threading.Event()
+                self._inflight[cell] = flight
+            else:
+                self.stats['waits'] += 1
+
+        if not leader:
+            flight.wait()
+            with self._lock:
+                if cell in self._lru:
+                    self._lru.move_to_end(cell)
+                    return self._lru[cell] or None
+            # Leader failed: don't retry in a storm, let the caller fall back
+            return None
+
+        try:
+            return self._resolve(cell)
+        finally:
+            with self._lock:
+                self._inflight.pop(cell, None)
+            flight.set()
+
+    def _resolve(self, cell) -> Optional[str]:
+        key = self._disk_key(cell)
+        if self.table is not None:
+            stored = self.table.get(key)
+            if stored is not None:
+                self._remember(cell, stored)
+                with self._lock: self.stats['disk_hits'] += 1
+                return stored or None
+
+        with self._lock: self.stats['lookups'] += 1
+        try:
+            # Resolve the cell centre so every photo in the cell gets the same answer
+            scale = 10 ** self.precision
+            result = self.geocoder.reverse(cell[0] / scale, cell[1] / scale)
+        except Exception:
+            with self._lock: self.stats['failures'] += 1
+            return None
+
+        value = result or self._MISSING
+        self._remember(cell, value)
+        if self.table is not None:
+            self.table.set(key, value)
+        return result
+
+    def _remember(self, cell, value):
+        with self._lock:
+            self._lru[cell] = value
+            self._lru.move_to_end(cell)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+
+class OfflineGeocoder(Geocoder):
+    """
+    Batched offline reverse geocoding on top of reverse_geocoder's GeoNames KD-tree.
+
+    rg.search() rebuilds its query state per call (and mode=2 fans out to worker
+    processes), so per-photo calls are expensive. Here the tree is built once,
+    optionally in a background thread at start-up, and many coordinates are
+    resolved with a single vectorised query. Results are mapped to zh-TW names.
+    """
+    name = "offline"
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.logger = Logger.get_instance()
+        self._geocoder = None
+        self._ready = threading.Event()
+        self._load_lock = threading.Lock()
+        self._loader = None
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @staticmethod
+    def is_available() -> bool:
+        return rg.installed()
+
+    def preload(self):
+        """Start loading the GeoNames dataset in the background (no-op if loaded/loading)."""
+        if not rg.installed() or self._ready.is_set():
+            return
+        with self._load_lock:
+            if self._loader is None:
+                self._loader = threading.Thread(target=self._load, name="geo-preload", daemon=True)
+                self._loader.start()
+
+    def _load(self):
+        try:
+            geo_names_zh.load_overrides()
+            # First use of rg: the import itself runs here, off the calling thread
+            # mode=1: single-process cKDTree; batched queries are already vectorised
+            self._geocoder = rg.RGeocoder(mode=1, verbose=False)
+        except Exception as e:
+            self.logger.error(f"離線地理資料載入失敗: {e}")
+        finally:
+            self._ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        if not rg.installed():
+            return False
+        self.preload()
+        self._ready.wait(timeout)
+        return self._geocoder is not None
+
+    def resolve_many(self, coords: Sequence[LatLon]) -> List[Optional[str]]:
+        """Resolve all coordinates with one KD-tree query. Returns 'Country_City' per input."""
+        if not coords or not self.wait_ready():
+            return [None] * len(coords)
+        try:
+            records = self._geocoder.query([(float(lat), float(lon)) for lat, lon in coords])
+        except Exception as e:
+            self.logger.error(f"離線地理查詢失敗: {e}")
+            return [None] * len(coords)
+        return [geo_names_zh.localize(r) for r in records]
+
+    def resolve(self, lat: float, lon: float) -> Optional[str]:
+        return self.resolve_many([(lat, lon)])[0]
+
+    def reverse(self, lat: float, lon: float) -> Optional[str]:
+        return self.resolve(lat, lon)
+
+    def resolve_paths(self, coords_by_path: Dict[str, LatLon]) -> Dict[str, str]:
+        """Batch helper: {path: (lat, lon)} -> {path: 'Country_City'}."""
+        paths = list(coords_by_path.keys())
+        names = self.resolve_many([coords_by_path[p] for p in paths])
+        return {p: n for p, n in zip(paths, names) if n}
@@ -1,119 +1,98 @@
 # -*- coding: utf-8 -*-
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    cv2 = None
+import threading
 
-try:
-    from geopy.geocoders import Nominatim
-    from geopy.exc import GeocoderTimedOut, GeocoderServiceError
-except ImportError:
-    Nominatim = None
+from src.core.blur import BlurDetector
+from src.core.geocode import OfflineGeocoder, NominatimGeocoder, GeoCache, Geocoder
+from src.utils.cache_db import CacheDB
+from src.utils.lazy_import import LazyModule, register_heif_opener
 
-try:
-    import reverse_geocoder as rg
-except ImportError:
-    rg = None
-
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
+Image = LazyModule('PIL.Image', on_load=register_heif_opener) # Imported on first GPS read
 
 class ImageOps:
-    _geolocator = None
-    _geo_cache = {} # {(lat_rounded, lon_rounded): "Country_City"}
+    _geo_cache = None # GeoCache in front of the online geocoder
+    _geo_lock = threading.Lock()
+    _blur_detector = BlurDetector()
     
     @staticmethod
-    def _init_geolocator():
-        if ImageOps._geolocator is None and Nominatim:
-            # User agent is required by Nominatim
-            ImageOps._geolocator = Nominatim(user_agent="smart_photo_organizer_v2", timeout=3)
+    def set_geocoder(geocoder: Geocoder, persistent: bool = True):
+        """Plug in the online geocoder (e.g. a local fake in tests). None disables online lookups."""
+        with ImageOps._geo_lock:
+            if geocoder is None:
+                ImageOps._geo_cache = False
+                return
+            table = CacheDB.get_instance().table(f"geocode_{geocoder.name}") if persistent else None
+            ImageOps._geo_cache = GeoCache(geocoder, table=table)
+
+    @staticmethod
+    def _get_geo_cache():
+        if ImageOps._geo_cache is None:
+            with ImageOps._geo_lock:
+                if ImageOps._geo_cache is None:
+                    if NominatimGeocoder.is_available():
+                        geocoder = NominatimGeocoder()
+                        ImageOps._geo_cache = GeoCache(geocoder, table=CacheDB.get_instance().table(f"geocode_{geocoder.name}"))
+                    else:
+                        ImageOps._geo_cache = False
+        return ImageOps._geo_cache or None
 
     @staticmethod
     def is_blurry(path: str, threshold: float = 100.0) -> (bool, float):
         """
-        Returns (is_blurry, score) using Laplacian Variance.
+        Returns (is_blurry, score) using Laplacian Variance on a reduced decode.
+        See BlurDetector for the cached, reference-size scoring.
         """
-        if cv2 is None:
-            return False, 0.0
-            
-        try:
-            # OpenCV doesn't natively support non-ascii paths on Windows, use fromfile -> imdecode
-            img_array = np.fromfile(path, np.uint8)
-            img = cv2.imdecode(img_array, cv2.IMREAD_GRAYSCALE)
-            
-            if img is None: return False, 0.0
-
-            score = cv2.Laplacian(img, cv2.CV_64F).var()
-            return score < threshold, score
-        except:
-            return False, 0.0
+        return ImageOps._blur_detector.is_blurry(path, threshold)
 
     @staticmethod
-    def get_location_folder(path: str) -> str:
+    def get_location_folder(path: str, lat_lon=None, offline_name: str = None, online: bool = True) -> str:
         """
         Returns "Country_City" (Chinese preferred) or None.
-        Tries Online (Nominatim) -> Offline (reverse_geocoder).
+        Tries Online (Nominatim) -> Offline (reverse_geocoder, zh-TW mapped).
+        lat_lon / offline_name: results of the batched GPS stage, if already known.
         """
-        if not Image: return None
-        
-        lat_lon = ImageOps._get_lat_lon(path)
+        if lat_lon is None:
+            if not Image: return None
+            lat_lon = ImageOps._get_lat_lon(path)
         if not lat_lon: return None
         
         lat, lon = lat_lon
         
         # 1. Try Online Cache / Request (Chinese)
-        if Nominatim:
-            ImageOps._init_geolocator()
-            if ImageOps._geolocator:
-                # Round to 3 decimals (~100m) to increase cache hits
-                cache_key = (round(lat, 3), round(lon, 3))
-                
-                if cache_key in ImageOps._geo_cache:
-                    return ImageOps._geo_cache[cache_key]
-                
-                try:
-                    location = ImageOps._geolocator.reverse((lat, lon), language='zh-TW', exactly_one=True)
-                    if location:
-                        address = location.raw.get('address', {})
-                        country = address.get('country', '')
-                        # Hierarchy for City: city -> county -> town -> suburb
-                        city = address.get('city', address.get('county', address.get('town', address.get('suburb', ''))))
-                        
-                        if not country: country = "未知國家"
-                        if not city: city = "未知城市"
-                        
-                        final_loc = f"{country}_{city}"
-                        # Save to cache
-                        ImageOps._geo_cache[cache_key] = final_loc
-                        return final_loc
-                except (GeocoderTimedOut, GeocoderServiceError, Exception):
-                    # Fallback to offline if timeout or error
-                    pass
+        if online:
+            loc = ImageOps._lookup_online(lat, lon)
+            if loc: return loc
 
-        # 2. Offline Fallback (reverse_geocoder)
-        if rg:
-            try:
-                # reverse_geocoder takes [(lat, lon)]
-                results = rg.search([lat_lon], mode=2) 
-                if results:
-                    data = results[0]
-                    country = data.get('cc', 'Unknown')
-                    city = data.get('name', 'Unknown')
-                    
-                    safe_country = "".join([c for c in country if c.isalnum() or c in (' ', '_')]).strip()
-                    safe_city = "".join([c for c in city if c.isalnum() or c in (' ', '_')]).strip()
-                    
-                    if not safe_country: safe_country = "Unknown"
-                    if not safe_city: safe_city = "Location"
-                    
-                    return f"{safe_country}_{safe_city}"
-            except Exception:
-                pass
-                
-        return None
+        # 2. Offline Fallback (batched KD-tree, preloaded in background)
+        if offline_name: return offline_name
+        return OfflineGeocoder.get_instance().resolve(lat, lon)
+
+    @staticmethod
+    def get_lat_lon(path):
+        """(lat, lon) from EXIF GPS, or None."""
+        if not Image: return None
+        return ImageOps._get_lat_lon(path)
+
+    @staticmethod
+    def get_camera_model(path) -> str:
+        """'Make Model' from EXIF (e.g. 'Apple iPhone 13'), or ""."""
+        if not Image: return ""
+        try:
+            with Image.open(path) as img:
+                exif = img.getexif()
+                make = str(exif.get(0x010F, "")).strip(' \x00')
+                model = str(exif.get(0x0110, "")).strip(' \x00')
+        except Exception:
+            return ""
+        if make and model.lower().startswith(make.lower()):
+            return model # Many vendors repeat the make in the model tag
+        return f"{make} {model}".strip()
+
+    @staticmethod
+    def _lookup_online(lat, lon):
+        cache = ImageOps._get_geo_cache()
+        if cache is None: return None
+        # Cached per ~100m grid cell; failures return None -> offline fallback
+        return cache.lookup(lat, lon)
 
     @staticmethod
     def _get_lat_lon(path):
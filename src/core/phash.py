@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.utils.lazy_import import LazyModule, register_heif_opener
+
+# Imported on first use (near-duplicate detection is optional)
+Image = LazyModule('PIL.Image', on_load=register_heif_opener)
+
+
+class PerceptualHash:
+    """
+    64-bit dHash (9x8 gradient signs) computed from a reduced-size decode:
+    cheap and robust to re-encoding / resizing.
+    """
+    HASH_BITS = 64
+
+    @staticmethod
+    def is_available() -> bool:
+        return bool(Image)
+
+    @staticmethod
+    def _load_small_gray(path: str, size: Tuple[int, int]):
+        with Image.open(path) as img:
+            if img.format == 'JPEG':
+                # DCT scaling: never decode more than ~8x the target size
+                img.draft('L', (size[0] * 8, size[1] * 8))
+            return img.convert('L').resize(size, Image.BILINEAR)
+
+    @staticmethod
+    def dhash(path: str) -> Optional[int]:
+        if not Image: return None
+        try:
+            small = PerceptualHash._load_small_gray(path, (9, 8))
+        except Exception:
+            return None
+        px = list(small.getdata())
+        h = 0
+        for row in range(8):
+            base = row * 9
+            for col in range(8):
+                h = (h << 1) | (1 if px[base + col] > px[base + col + 1] else 0)
+        return h
+
+
+class NearDupIndex:
+    """
+    Multi-index hashing (Norouzi et al.) over 64-bit hashes for Hamming-radius queries.
+
+    The hash is split into `parts` disjoint substrings, each indexed in its own table.
+    If two hashes are within `max_distance`, at least one substring differs by at most
+    max_distance // parts bits, so a query probes only those nearby buckets and verifies
+    the few entries found there; nothing is scanned linearly.
+    """
+
+    def __init__(self, max_distance: int = 6, bits: int = 64, parts: int = 3):
+        self.max_distance = max(0, min(int(max_distance), bits - 1))
+        self.bits = bits
+        parts = max(1, min(parts, self.max_distance + 1))
+        width, extra = divmod(bits, parts)
+        sub_radius = self.max_distance // parts
+
+        self._ranges: List[Tuple[int, int, List[int]]] = []  # (shift, mask, probe xor-masks)
+        shift = 0
+        for i in range(parts):
+            w = width + (1 if i < extra else 0)
+            self._ranges.append((shift, (1 << w) - 1, self._flip_masks(w, sub_radius)))
+            shift += w
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._ranges]
+        self._hashes: List[int] = []
+        self._payloads: List[str] = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _flip_masks(width: int, radius: int) -> List[int]:
+        masks = [0]
+        frontier = [(0, -1)]
+        for _ in range(radius):
+            nxt = []
+            for m, last in frontier:
+                for b in range(last + 1, width):
+                    nxt.append((m | (1 << b), b))
+            masks.extend(m for m, _ in nxt)
+            frontier = nxt
+        return masks
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def find(self, h: int) -> Optional[Tuple[str, int]]:
+        """Returns (payload, distance) of the closest entry within max_distance, or None."""
+        with self._lock:
+            return self._find_locked(h)
+
+    def add(self, h: int, payload: str):
+        with self._lock:
+            self._add_locked(h, payload)
+
+    def find_or_add(self, h: int, payload: str) -> Optional[Tuple[str, int]]:
+        """Atomic lookup; the hash is only indexed when no near-duplicate exists."""
+        with self._lock:
+            match = self._find_locked(h)
+            if match is None:
+                self._add_locked(h, payload)
+            return match
+
+    def _find_locked(self, h: int) -> Optional[Tuple[str, int]]:
+        best = None
+        seen = set()
+        for (shift, mask, flips), table in zip(self._ranges, self._tables):
+            sub = (h >> shift) & mask
+            for flip in flips:
+                bucket = table.get(sub ^ flip)
+                if not bucket: continue
+                for idx in bucket:
+                    if idx in seen: continue
+                    seen.add(idx)
+                    dist = bin(self._hashes[idx] ^ h).count('1')
+                    if dist <= self.max_distance and (best is None or dist < best[1]):
+                        best = (self._payloads[idx], dist)
+                        if dist == 0:
+                            return best
+        return best
+
+    def _add_locked(self, h: int, payload: str):
+        idx = len(self._hashes)
+        self._hashes.append(h)
+        self._payloads.append(payload)
+        for (shift, mask, _), table in zip(self._ranges, self._tables):
+            table.setdefault((h >> shift) & mask, []).append(idx)
@@ -1,36 +1,108 @@
 # -*- coding: utf-8 -*-
+import contextlib
 import concurrent.futures
 from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Callable, Dict, Any
 import threading
 import os
-import shutil
-import csv
 import time
 
 from src.utils.config import ConfigConstants
 from src.utils.logger import Logger
 from src.utils.fs_utils import FSUtils
+from src.utils.watcher import create_watcher, StabilityTracker
+from src.utils.walker import ParallelWalker
+from src.utils.locality import DiskLocality, DeviceLimiter
+from src.utils.page_cache import PageCache
+from src.utils.cancel import CancelToken, TransferCancelled
+from src.utils.throttle import Throttle, RateMeter, ProcessPriority
+from src.utils.report_writer import ReportWriter
 from src.core.date_parser import DateParser
 from src.core.dedup import Dedup
+from src.core.dedup_index import digest_to_int, partial_to_int
+from src.core.extdedup import ExternalDedup
+from src.core.registry import DedupRegistry, NamingRegistry
+from src.core.sharded import ShardedRunner
+from src.core.estimate import SampleEstimate
+from src.core.transfer import FileTransfer
+from src.core.storage import create_storage
+from src.core.thumbs import create_thumbnailer
+from src.core.rules import RuleSet, Rule, DEFAULT_RULES
 from src.core.image_ops import ImageOps
+from src.core.blur import BlurDetector
+from src.core.phash import PerceptualHash, NearDupIndex
+from src.core.geocode import OfflineGeocoder
+from src.utils.cache_db import CacheDB
 
 class Processor:
+    PLAN_FIELDS = ['src', 'action', 'dst', 'size', 'mtime', 'digest', 'tag']
+
     def __init__(self, config_options: dict, 
                  progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
                  status_callback: Optional[Callable[[str], None]] = None):
         """
         config_options: {
-            'mode': 'copy' | 'move',
+            'mode': 'copy' | 'move' | 'link' (link = reflink / hardlink, copies across devices),
+            'link_method': 'auto' | 'reflink' | 'hardlink' (optional, link mode, default 'auto' - reflink first),
             'clean_empty': bool,
             'rename_enabled': bool,
             'gps_enabled': bool,
+            'gps_online': bool (optional, default True - False = offline zh-TW names only),
             'resume_enabled': bool,
             'blur_check_enabled': bool,
+            'blur_threshold': float (optional, default 100),
+            'near_dup_enabled': bool (optional),
+            'near_dup_distance': int (optional, hamming distance, default 6),
+            'near_dup_action': 'move' | 'report' (optional, default 'move'),
             'skip_existing': bool,
+            'rules_path': str (optional, JSON routing rules, default ./routing_rules.json if present),
+            'dedup_mode': 'memory' | 'external' (optional, default 'memory' - external = on-disk sort/merge),
+            'dedup_memory_mb': int (optional, external dedup memory budget, default 256),
+            'dedup_temp_dir': str (optional, where external dedup spills its sorted runs),
+            'hash_algorithm': 'auto' | 'xxh3_128' | 'blake3' | 'blake2b' | 'md5' (optional, default 'auto'),
+            'hash_tree_threshold_mb': int (optional, files this large are hashed as parallel chunks, default 256),
+            'hash_threads': int (optional, threads per chunked hash, default min(8, cpu count)),
+            'walk_workers': int (optional, threads listing directories in parallel, default 8),
+            'io_order': 'walk' | 'inode' | 'extent' (optional, default 'walk' - read order; inode / extent = physical locality for HDDs),
+            'io_per_device': int (optional, files read at once per source device; default 2 on rotational disks when io_order is set, 0 = no limit),
+            'cache_hints': bool (optional, default True - posix_fadvise read-ahead for upcoming files, page cache release after each file),
+            'stop_latency': float (optional, seconds of I/O per hash / copy chunk, bounds how long stop / pause waits, default 1),
+            'read_mbps': float (optional, read bandwidth limit for hashing / copying, default 0 = unlimited),
+            'write_mbps': float (optional, write bandwidth limit for copying, default 0 = unlimited),
+            'throttle_schedule': list (optional, [{'from': 'HH:MM', 'to': 'HH:MM', 'read_mbps': x, 'write_mbps': y}], overrides the limits inside each window),
+            'io_priority': 'normal' | 'low' | 'idle' (optional, default 'normal' - idle = ionice idle class),
+            'cpu_nice': int (optional, default 0 - nice increment for the worker threads),
+            'processes': int (optional, default 1 - >1 shards the source tree across worker processes),
+            'watch': bool (optional, keep running after the first pass and organise new files until stop(); uses dedup_mode 'memory'),
+            'watch_settle': float (optional, seconds a file must stay unchanged, default 2),
+            'watch_batch': int (optional, max files per watch batch, default 200),
+            'watch_poll_interval': float (optional, polling fallback interval, default 2),
+            'durability': 'none' | 'batch' | 'file' (optional, default 'batch' - when transfers are fsynced),
+            'durability_batch': int (optional, transfers per batched fsync, default 200),
+            's3_endpoint_url': str (optional, S3-compatible endpoint for s3://bucket/prefix destinations, e.g. MinIO),
+            's3_region': str (optional), 's3_profile': str (optional, AWS credentials profile),
+            's3_part_mb': int (optional, multipart part size and threshold, default 16),
+            's3_concurrency': int (optional, upload requests / parts in flight across all files, default 32),
+            's3_connections': int (optional, pooled HTTP connections shared by all workers, default 64),
+            's3_storage_class': str (optional, e.g. 'STANDARD_IA' / 'GLACIER_IR'),
+            'thumbs_enabled': bool (optional, render a thumbnail of every organised photo while it is transferred),
+            'thumbs_layout': 'mirror' | 'packed' (optional, default 'mirror' - JPEG tree mirroring the library / one SQLite file),
+            'thumbs_dir': str (optional, default <dst_root>/.thumbs, ./.thumbs for object storage),
+            'thumbs_size': int (optional, longest side in pixels, default 256),
+            'thumbs_quality': int (optional, JPEG quality, default 85),
+            'thumbs_workers': int (optional, rendering processes, default cpu count),
             'dry_run': bool,
+            'estimate': bool (optional, fast estimate from a stratified sample instead of a run - nothing is organised),
+            'estimate_sample': int (optional, sampled files, default 400),
+            'estimate_seed': int (optional, sampling seed, default random),
+            'estimate_transfer_mb': float (optional, bytes copied to scratch space on the destination device (or only read) to time transfers, default 256),
+            'estimate_path': str (optional, also save the estimate as JSON here),
+            'report_path': str (optional, dry-run report, default ./preview_report.csv),
+            'report_format': 'csv' | 'jsonl' (optional, default by report_path extension),
+            'plan_path': str (optional, dry run also saves an executable JSON-lines plan here),
+            'execute_plan': str (optional, apply a saved plan instead of analysing src_root),
             'src_root': str,
-            'dst_root': str
+            'dst_root': str (local folder, or s3://bucket/prefix - needs boto3)
         }
         """
         self.config = config_options
@@ -39,35 +111,97 @@ class Processor:
         self.stop_event = threading.Event()
         self.pause_event = threading.Event()
         self.pause_event.set()
+        self.cancel = CancelToken(self.stop_event, self.pause_event, self.config.get('stop_latency', 1.0))
+        self._stop_reported = False
         
         self.logger = Logger.get_instance()
+        self.throttle = self._load_throttle()
+        self._rate_meter = RateMeter()
+        Dedup.configure(self.config.get('hash_algorithm', 'auto'),
+                        self.config.get('hash_tree_threshold_mb', 256), self.config.get('hash_threads', 0),
+                        cancel=self.cancel, throttle=self.throttle)
+        PageCache.configure(self.config.get('cache_hints', True))
         self.date_parser = DateParser()
+        self.rules_path = None
+        self.rules = self._load_rules() # Compiled routing rules (user rules + built-in defaults)
+        self.blur_detector = None
+        if self.config.get('blur_check_enabled', False):
+            self.blur_detector = BlurDetector(cache=CacheDB.get_instance().table("blur_scores"))
+        self.near_dup_index = None
+        self.phash_cache = None
+        if self.config.get('near_dup_enabled', False):
+            self.near_dup_index = NearDupIndex(self.config.get('near_dup_distance', 6))
+            self.phash_cache = CacheDB.get_instance().table("dhash")
         
         self.stats = {
             "processed": 0, "processed_size": 0, "total_size": 0,
-            "skipped": 0, "errors": 0, "failed_files": []
+            "skipped": 0, "errors": 0, "failed_files": [],
+            "link_copied": 0, # Link mode: files copied because linking was not possible
+            "thumbnails": {'rendered': 0, 'reused': 0, 'failed': 0},
+            "near_duplicates": [] # [(path, similar_to, distance)]
         }
         
         # Caches
-        self.seen_files = {} # {size: {hash: original_path}} (Source local)
-        self.dst_index = {} # {size: {hash: existing_path}} (Destination global)
-        self.dir_counters = {} # {(dir, prefix): seq}
+        self.transfer = FileTransfer(self.config.get('durability', 'batch'), self.config.get('durability_batch', 200),
+                                     cancel=self.cancel, throttle=self.throttle)
+        self.storage = create_storage(self.config.get('dst_root', ""), self.config, self.transfer) # Destination backend
+        self.dedup = DedupRegistry(self.config.get('skip_existing', False), self.storage) # Source + destination dedup state
+        self.external_dedup = None # ExternalDedup decisions (dedup_mode='external')
+        self.naming = NamingRegistry(self.storage) # Sequence counters + reserved destination names
+        self.thumbnailer = None # Thumbnail stage (thumbs_enabled)
+        if not self.config.get('dry_run', False) and not self.config.get('estimate', False):
+            try:
+                self.thumbnailer = create_thumbnailer(self.config, self.storage.local)
+            except (ImportError, ValueError, OSError) as e:
+                self.logger.error(f"縮圖設定錯誤: {e}，本次不產生縮圖")
+            if self.thumbnailer is not None and self.storage.local:
+                self.storage.hide(self.thumbnailer.store.root) # Not part of the library (dedup index)
+        self.device_limiter = None # DeviceLimiter when reads are throttled per source device
+        if self.config.get('io_order', 'walk') != 'walk' or self.config.get('io_per_device') is not None:
+            self.device_limiter = DeviceLimiter(self.config.get('io_per_device'))
         self.history_db = {}
+        self.gps_coords = {} # {path: (lat, lon)} (Batched GPS stage)
+        self.offline_locations = {} # {path: "Country_City"}
         
         # Dry Run
-        self.dry_run_paths = set() # Set of virtual destination paths
-        self.preview_log = [] # List of [Source, Action, Destination]
+        self.preview_report = None # ReportWriter streaming [Source, Action, Destination, Note]
+        self.plan_writer = None # ReportWriter streaming plan rows (PLAN_FIELDS)
+        self._local = threading.local() # Per-worker scratch (full digest of the current file)
         
         # Thread Locks
         self.stats_lock = threading.Lock()
         self.history_lock = threading.Lock()
-        self.naming_lock = threading.Lock()
-        self.dedup_lock = threading.Lock()
-        self.preview_lock = threading.Lock()
         
+    def _load_rules(self):
+        path = self.config.get('rules_path')
+        if not path and os.path.exists(ConfigConstants.RULES_FILE):
+            path = ConfigConstants.RULES_FILE
+        try:
+            rules = RuleSet.load(path)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"規則檔錯誤 ({path}): {e}，改用預設規則")
+            return RuleSet.load()
+        self.rules_path = path
+        return rules
+
+    def _load_throttle(self):
+        read, write = self.config.get('read_mbps', 0), self.config.get('write_mbps', 0)
+        try:
+            return Throttle(read, write, self.config.get('throttle_schedule'))
+        except ValueError as e:
+            self.logger.error(f"限速時段設定錯誤: {e}，只套用固定限速")
+            return Throttle(read, write)
+
+    def apply_priority(self):
+        """Lower I/O / CPU priority of the calling (worker) thread and every thread started from it."""
+        io_class, nice = self.config.get('io_priority', 'normal'), self.config.get('cpu_nice', 0)
+        if io_class == 'normal' and not nice: return
+        failed = ProcessPriority.apply(io_class, nice)
+        if failed:
+            self.logger.warn(f"此系統無法設定: {', '.join(failed)}")
+
     def stop(self):
-        self.stop_event.set()
-        self.pause_event.set() # Unpause to exit loop
+        self.cancel.stop() # Sets stop_event, unpauses so paused workers can exit
 
     def pause(self):
         self.pause_event.clear()
@@ -77,25 +211,56 @@ class Processor:
         
     def start(self):
         try:
+            self.apply_priority() # Before any pool exists: worker threads inherit it
             self._load_history()
+
+            if self.config.get('execute_plan'):
+                return self._execute_plan(self.config['execute_plan'])
             
             src_root = self.config['src_root']
             dst_root = self.config['dst_root']
             mode_str = self.config['mode'].upper()
+            estimate = self.config.get('estimate', False)
             if self.config.get('dry_run', False):
                 mode_str += " (預覽模式 - 不寫入)"
+            elif estimate:
+                mode_str += " (快速估算 - 抽樣分析，不整理)"
             
             self.logger.info(f"=== 開始任務 ===\n來源: {src_root}\n目標: {dst_root}\n模式: {mode_str}")
+            if self.rules_path:
+                self.logger.info(f"已載入規則檔: {self.rules_path} ({len(self.rules.rules) - len(DEFAULT_RULES)} 條自訂規則)")
+            if self.throttle.enabled:
+                schedule = f"，{len(self.throttle.windows)} 個時段排程" if self.throttle.windows else ""
+                self.logger.info(f"頻寬限制: {self.throttle.describe() or '目前時段不限速'}{schedule}")
+
+            # Load the offline GeoNames tree while indexing / scanning runs
+            if self.config['gps_enabled']:
+                OfflineGeocoder.get_instance().preload()
             
+            external_dedup = self.config.get('dedup_mode', 'memory') == 'external'
+            if external_dedup and self.config.get('watch', False) and not estimate:
+                # Watch batches are checked against everything organised so far: that needs the
+                # in-memory index, external decisions only cover the files of one pass
+                self.logger.warn("監看模式需要常駐記憶體的去重索引，dedup_mode='external' 已改用 'memory'")
+                external_dedup = False
+
             # 0. Index Destination (if enabled)
-            if self.config.get('skip_existing', False):
+            scan_started = time.monotonic() # Estimate mode: indexing + scanning is part of the predicted time
+            if self.config.get('skip_existing', False) and (estimate or not external_dedup):
                 if self.status_callback: self.status_callback("正在建立目標資料夾索引 (去重用)...")
-                self._index_destination(dst_root)
-                self.logger.info(f"目標索引建立完成: {sum(len(v) for v in self.dst_index.values())} 個不重複檔案")
+                self.dedup.index_destination(dst_root, self.stop_event, self.status_callback,
+                                             workers=self.config.get('walk_workers', 8))
+                self.logger.info(f"目標索引建立完成: {len(self.dedup.dst_index)} 個檔案")
+
+            # Watch mode: watch before scanning so files arriving meanwhile are not missed
+            watcher = None
+            if self.config.get('watch', False) and not estimate:
+                watcher = create_watcher(src_root, self.config.get('watch_poll_interval', 2.0), exclude=[dst_root])
 
             # 1. Scan
             if self.status_callback: self.status_callback("正在掃描檔案...")
-            all_files, total_size = self._scan_files(src_root)
+            sizes = [] if estimate else None
+            all_files, total_size = self._scan_files(src_root, sizes)
             total_count = len(all_files)
             
             with self.stats_lock:
@@ -103,59 +268,31 @@ class Processor:
 
             if total_count == 0:
                 self.logger.warn("找不到任何檔案。")
-                return self.stats
+                if watcher is None:
+                    return self.stats
+            ingested = self._file_signatures(all_files) if watcher is not None else None
 
-            self.logger.info(f"共發現 {total_count} 個檔案 ({self._format_bytes(total_size)})。開始並行處理...")
-            
-            # 2. Process (Multi-threading)
+            if estimate:
+                return self._estimate(all_files, sizes, dst_root, time.monotonic() - scan_started)
+
+            # 2. Process (Multi-threading, optionally sharded across processes)
             max_workers = min(32, (os.cpu_count() or 1) + 4)
-            start_time = time.time()
-            
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = {executor.submit(self._process_single_file, f, dst_root): f for f in all_files}
-                
-                completed_count = 0
-                for future in concurrent.futures.as_completed(futures):
-                    if self.stop_event.is_set():
-                        executor.shutdown(wait=False, cancel_futures=True)
-                        break
-                        
-                    self.pause_event.wait()
-                    completed_count += 1
-                    file_path = futures[future]
-                    
-                    # Calculate Metrics
-                    if self.progress_callback:
-                        elapsed = time.time() - start_time
-                        if elapsed < 0.001: elapsed = 0.001
-                        
-                        current_processed_size = self.stats['processed_size'] # Approximate (thread-safeish read)
-                        speed = current_processed_size / elapsed # bytes/sec
-                        
-                        remaining_bytes = max(0, total_size - current_processed_size)
-                        eta = remaining_bytes / speed if speed > 0 else 0
-                        
-                        progress_data = {
-                            'current': completed_count,
-                            'total': total_count,
-                            'filename': os.path.basename(file_path),
-                            'processed_size': current_processed_size,
-                            'total_size': total_size,
-                            'speed': speed,
-                            'eta': eta
-                        }
-                        
-                        if completed_count % 5 == 0 or completed_count == total_count:
-                             self.progress_callback(progress_data)
-                    
-                    try:
-                        future.result()
-                    except Exception as e:
-                        with self.stats_lock:
-                            self.stats['errors'] += 1
-                            err_msg = f"{file_path} (例外錯誤: {str(e)})"
-                            self.stats['failed_files'].append(err_msg)
-                        self.logger.error(f"處理失敗: {os.path.basename(file_path)} - {e}")
+
+            if external_dedup:
+                self._resolve_duplicates_external(all_files, dst_root, max_workers)
+
+            if self.config.get('dry_run', False):
+                self._open_preview_report()
+                if self.config.get('plan_path'):
+                    self.plan_writer = self._open_writer(self.config['plan_path'], self.PLAN_FIELDS, 'jsonl', "計畫檔")
+
+            self.logger.info(f"共發現 {total_count} 個檔案 ({self._format_bytes(total_size)})。開始並行處理...")
+            processes = self.config.get('processes', 1)
+            if processes > 1:
+                ShardedRunner(self, processes).run(all_files, dst_root, total_size)
+                self._report_stop()
+            else:
+                self.run_files(all_files, dst_root, total_size)
 
             # Notify 100%
             if self.progress_callback: 
@@ -168,6 +305,12 @@ class Processor:
 
             if not self.config.get('dry_run', False):
                 self._save_history()
+            CacheDB.flush_instance()
+            if self.stats['link_copied']:
+                self.logger.warn(f"{self.stats['link_copied']} 個檔案無法建立連結 (跨磁碟或檔案系統不支援)，已改為複製")
+
+            if watcher is not None:
+                self._watch_loop(watcher, dst_root, ingested)
 
             # 3. Clean Empty Folders
             if self.config['mode'] == 'move' and self.config['clean_empty'] and not self.stop_event.is_set():
@@ -175,16 +318,156 @@ class Processor:
                     self.logger.info("[預覽] 模擬清理空資料夾 (不實際執行)")
                 else:
                     self.logger.info("正在清理空資料夾...")
-                    FSUtils.remove_empty_folders(src_root)
-            
-            if self.config.get('dry_run', False):
-                self._export_preview_report()
+                    FSUtils.remove_empty_folders(src_root, workers=self.config.get('walk_workers', 8))
 
             return self.stats
-            
+
+        except TransferCancelled: # Stopped inside a pre-transfer stage (e.g. external dedup hashing)
+            self._report_stop()
+            return self.stats
         except Exception as e:
             self.logger.error(f"嚴重錯誤: {e}")
             raise e
+        finally:
+            self._close_thumbnails()
+            self.storage.flush()
+            self._close_preview_report()
+            if self.plan_writer is not None:
+                self.plan_writer.close()
+                self.logger.info(f"計畫檔已儲存 ({self.plan_writer.rows} 筆): {self.plan_writer.path}")
+                self.plan_writer = None
+
+    def _file_signatures(self, files):
+        sigs = {}
+        for f in files:
+            try:
+                st = os.stat(f)
+                sigs[f] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        return sigs
+
+    def _watch_loop(self, watcher, dst_root, ingested):
+        """
+        Watch mode: destination index, dedup and naming state stay warm in memory;
+        files that settled are pushed through run_files() in small batches until stop().
+        `ingested` maps already organised paths to their (size, mtime_ns).
+        """
+        tracker = StabilityTracker(self.config.get('watch_settle', 2.0))
+        batch_size = self.config.get('watch_batch', 200)
+        self.logger.info(f"監看模式 ({watcher.name})：等待新檔案...")
+        if self.status_callback: self.status_callback("監看中，等待新檔案...")
+        try:
+            while not self.stop_event.is_set():
+                self.pause_event.wait()
+                changed = watcher.poll(tracker.next_timeout(1.0, watcher.writing))
+                if changed: tracker.touch(changed)
+
+                batch, batch_size_bytes = [], 0
+                for path, sig in tracker.pop_stable(batch_size, watcher.writing):
+                    if ingested.get(path) == sig: continue # Unchanged since it was organised
+                    ingested[path] = sig
+                    batch.append(path)
+                    batch_size_bytes += sig[0]
+                if not batch or self.stop_event.is_set(): continue
+
+                with self.stats_lock:
+                    self.stats['total_size'] += batch_size_bytes
+                self.logger.info(f"監看：偵測到 {len(batch)} 個新檔案，開始整理...")
+                self.run_files(batch, dst_root, batch_size_bytes)
+                if self.config['resume_enabled'] and not self.config.get('dry_run', False):
+                    self._save_history()
+                CacheDB.flush_instance()
+                if self.status_callback: self.status_callback(f"監看中... 已整理 {self.stats['processed']} 個檔案")
+        finally:
+            watcher.close()
+
+    def run_files(self, all_files, dst_root, total_size):
+        """GPS stage + threaded pipeline over `all_files` (file ids = list positions)."""
+        total_count = len(all_files)
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+
+        io_order = self.config.get('io_order', 'walk')
+        if io_order != 'walk' and self.status_callback:
+            self.status_callback("正在依磁碟實體位置排序讀取順序...")
+        order = DiskLocality.order(all_files, io_order, self.stop_event)
+
+        if self.config['gps_enabled']:
+            self._resolve_locations([all_files[i] for i in order], max_workers)
+
+        # Each task prefetches the file one pool-width ahead of it, so its read overlaps current work
+        ahead = max_workers if PageCache.enabled else len(order)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The executor starts tasks in submission order, so reads follow `order`
+            futures = {executor.submit(self._process_task, all_files[i], dst_root, i,
+                                       all_files[order[pos + ahead]] if pos + ahead < len(order) else None): all_files[i]
+                       for pos, i in enumerate(order)}
+            
+            completed_count = 0
+            for future in concurrent.futures.as_completed(futures):
+                if self.stop_event.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+                    
+                self.pause_event.wait()
+                completed_count += 1
+                file_path = futures[future]
+                
+                self._emit_progress(completed_count, total_count, file_path, total_size, start_time)
+                
+                try:
+                    future.result()
+                except TransferCancelled:
+                    pass # Stopped mid-file: partial output removed, the file is redone next run
+                except Exception as e:
+                    with self.stats_lock:
+                        self.stats['errors'] += 1
+                        err_msg = f"{file_path} (例外錯誤: {str(e)})"
+                        self.stats['failed_files'].append(err_msg)
+                    self.logger.error(f"處理失敗: {os.path.basename(file_path)} - {e}")
+        self.storage.flush()
+        self._report_stop()
+
+    def _process_task(self, file_path, dst_root, file_id, prefetch_path=None):
+        """Pipeline task: read-ahead hint, per-device slot, then page cache release of the source."""
+        if prefetch_path is not None:
+            PageCache.prefetch(prefetch_path)
+        slot = self.device_limiter.slot(file_path) if self.device_limiter is not None else contextlib.nullcontext()
+        try:
+            with slot:
+                self.cancel.check() # Paused / stopped before this file started: nothing to undo
+                self._process_single_file(file_path, dst_root, file_id)
+        finally:
+            PageCache.drop(file_path) # Hashed and transferred: not read again (no-op once moved)
+
+    def _report_stop(self):
+        """Once per run: how long the in-flight hashes / copies took to abort after stop()."""
+        latency = self.cancel.stop_latency()
+        if latency is None or self._stop_reported: return
+        self._stop_reported = True
+        self.logger.warn(f"已停止: 進行中的檔案在 {latency:.2f} 秒內中止 (每個讀寫區塊上限約 {self.cancel.latency:g} 秒)，"
+                         f"未完成的暫存檔已清除，下次執行會重新處理這些檔案")
+
+    def _emit_progress(self, completed_count, total_count, file_path, total_size, start_time):
+        if not self.progress_callback: return
+        if completed_count % 5 != 0 and completed_count != total_count: return
+        elapsed = max(time.time() - start_time, 0.001)
+        current_processed_size = self.stats['processed_size'] # Approximate (thread-safeish read)
+        # Effective speed over the last seconds (follows throttling / schedule changes), run average until then
+        speed = self._rate_meter.update(current_processed_size) or current_processed_size / elapsed # bytes/sec
+        remaining_bytes = max(0, total_size - current_processed_size)
+        eta = remaining_bytes / speed if speed > 0 else 0
+        self.progress_callback({
+            'current': completed_count,
+            'total': total_count,
+            'filename': os.path.basename(file_path),
+            'processed_size': current_processed_size,
+            'total_size': total_size,
+            'speed': speed,
+            'eta': eta,
+            'limit': self.throttle.describe() # Current bandwidth limit, "" if none
+        })
 
     def _format_bytes(self, size):
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -193,55 +476,246 @@ class Processor:
             size /= 1024.0
         return f"{size:.2f} PB"
 
-    def _export_preview_report(self):
+    def _open_writer(self, path, fields, fmt, label, headers=None):
         try:
-            report_path = os.path.join(os.getcwd(), "preview_report.csv")
-            with open(report_path, 'w', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Source File", "Action", "Destination File", "Note"])
-                writer.writerows(self.preview_log)
-            self.logger.info(f"預覽報告已產生: {report_path}")
-            if self.status_callback: self.status_callback(f"預覽完成，請查看 {report_path}")
+            return ReportWriter(path, fields, fmt=fmt, headers=headers)
         except Exception as e:
-            self.logger.error(f"無法寫入預覽報告: {e}")
+            self.logger.error(f"無法寫入{label}: {e}")
+            return None
+
+    def _open_preview_report(self):
+        """Rows are streamed as they are produced, so a stopped run still leaves a partial report."""
+        report_path = self.config.get('report_path') or os.path.join(os.getcwd(), ConfigConstants.PREVIEW_REPORT)
+        self.preview_report = self._open_writer(report_path, ['src', 'action', 'dst', 'note'],
+                                                self.config.get('report_format'), "預覽報告",
+                                                headers=["Source File", "Action", "Destination File", "Note"])
+
+    def _close_preview_report(self):
+        report, self.preview_report = self.preview_report, None
+        if report is None: return
+        report.close()
+        if self.stop_event.is_set():
+            self.logger.info(f"預覽已中斷，部分報告 ({report.rows} 筆): {report.path}")
+        else:
+            self.logger.info(f"預覽報告已產生: {report.path}")
+            if self.status_callback: self.status_callback(f"預覽完成，請查看 {report.path}")
 
-    def _index_destination(self, dst_root):
-        if not os.path.exists(dst_root): return
-        
-        count = 0
-        for r, d, f in os.walk(dst_root):
-            if self.stop_event.is_set(): break
-            for file in f:
-                fp = os.path.join(r, file)
-                try:
-                    sz = os.path.getsize(fp)
-                    if sz not in self.dst_index:
-                         self.dst_index[sz] = []
-                    self.dst_index[sz].append(fp)
-                    
-                    count += 1
-                    if count % 1000 == 0 and self.status_callback:
-                        self.status_callback(f"正在索引目標檔案... ({count})")
-                except: pass
+    def _record_preview(self, row):
+        if self.preview_report is not None:
+            self.preview_report.write(row)
+
+    def _record_plan(self, src, mode, dst, tag):
+        try:
+            st = os.stat(src)
+        except OSError:
+            return
+        digest = getattr(self._local, 'digest', "")
+        self.plan_writer.write([src, mode, dst, st.st_size, st.st_mtime, digest, tag])
 
-    def _scan_files(self, root):
+    # --- Plan Execution ---
+    def _execute_plan(self, plan_path):
+        """
+        Apply a plan saved by a dry run: no scanning, hashing, EXIF or GPS work, only
+        a size / mtime check per source before the transfer. Rows are streamed from
+        the file with a bounded number of transfers in flight.
+        """
+        import json
+        self.logger.info(f"=== 執行計畫檔 ===\n計畫: {plan_path}")
+        if self.status_callback: self.status_callback("正在讀取計畫檔...")
+
+        def rows():
+            with open(plan_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+        total_count, total_size = 0, 0
+        for row in rows():
+            total_count += 1
+            total_size += row.get('size', 0)
+        with self.stats_lock:
+            self.stats['total_size'] = total_size
+        if total_count == 0:
+            self.logger.warn("計畫檔中沒有任何項目。")
+            return self.stats
+
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+        self.logger.info(f"計畫共 {total_count} 個項目 ({self._format_bytes(total_size)})。開始傳輸...")
+        start_time = time.time()
+        completed_count = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+            plan_iter = rows()
+            while True:
+                while len(pending) < max_workers * 4 and not self.stop_event.is_set():
+                    row = next(plan_iter, None)
+                    if row is None: break
+                    pending[executor.submit(self._apply_plan_row, row)] = row['src']
+                if not pending or self.stop_event.is_set(): break
+
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    self.pause_event.wait()
+                    file_path = pending.pop(future)
+                    completed_count += 1
+                    self._emit_progress(completed_count, total_count, file_path, total_size, start_time)
+                    try:
+                        future.result()
+                    except TransferCancelled:
+                        pass
+                    except Exception as e:
+                        with self.stats_lock:
+                            self.stats['errors'] += 1
+                            self.stats['failed_files'].append(f"{file_path} (例外錯誤: {str(e)})")
+                        self.logger.error(f"處理失敗: {os.path.basename(file_path)} - {e}")
+            if self.stop_event.is_set():
+                for future in pending: future.cancel()
+        self.storage.flush()
+        self._report_stop()
+
+        if self.progress_callback:
+            self.progress_callback({
+                'current': total_count, 'total': total_count,
+                'filename': "Finished",
+                'processed_size': total_size, 'total_size': total_size,
+                'speed': 0, 'eta': 0
+            })
+        if not self.config.get('dry_run', False):
+            self._save_history()
+        return self.stats
+
+    def _apply_plan_row(self, row):
+        src, dst, mode = row['src'], row['dst'], row['action']
+        try:
+            st = os.stat(src)
+        except OSError:
+            st = None
+        if st is None and mode == 'move' and self._plan_row_done(dst, row['size'], row['mtime']):
+            return # Moved by an earlier, interrupted execution of the same plan
+        if st is None or st.st_size != row['size'] or abs(st.st_mtime - row['mtime']) > 0.001:
+            self.logger.warn(f"[略過] 來源已變更或不存在，未執行: {os.path.basename(src)}")
+            with self.stats_lock:
+                self.stats['skipped'] += 1
+            return
+
+        if self.storage.exists(dst):
+            if self._plan_row_done(dst, st.st_size, st.st_mtime):
+                return # Copied by an earlier, interrupted execution of the same plan
+            dst = self.naming.unique_path(dst)
+            self.logger.warn(f"目標已被佔用，改為: {os.path.basename(dst)}")
+
+        self._execute_transfer(src, dst, row.get('tag', "計畫"), mode=mode)
+
+    def _plan_row_done(self, dst, size, mtime):
+        """True if dst already holds this row's file (copy2 / move keep size and mtime)."""
+        d_st = self.storage.stat(dst) # (size, mtime)
+        if d_st is None or d_st[0] != size or abs(d_st[1] - mtime) > 2.0:
+            return False
+        with self.stats_lock:
+            self.stats['skipped'] += 1
+            self.stats['processed_size'] += size
+        return True
+
+    def _scan_files(self, root, sizes=None):
+        """sizes: optional list receiving each file's size (None if unknown), parallel to the result."""
         files_list = []
         total_size = 0
         scan_count = 0
-        for r, d, f in os.walk(root):
-            if self.stop_event.is_set(): break
-            for file in f:
-                fp = os.path.join(r, file)
-                files_list.append(fp)
-                try: total_size += os.path.getsize(fp)
-                except: pass
-                
-                scan_count += 1
-                if scan_count % 1000 == 0 and self.status_callback:
-                    self.status_callback(f"正在掃描... 已發現 {scan_count} 個檔案")
+        for fp, size in self._walker().files(root):
+            files_list.append(fp)
+            if sizes is not None: sizes.append(size)
+            if size is not None: total_size += size
+
+            scan_count += 1
+            if scan_count % 1000 == 0 and self.status_callback:
+                self.status_callback(f"正在掃描... 已發現 {scan_count} 個檔案")
         return files_list, total_size
 
-    def _process_single_file(self, file_path, dst_root):
+    def _estimate(self, files, sizes, dst_root, scan_seconds):
+        """Estimate mode: sample, measure and extrapolate (see SampleEstimate); nothing is organised."""
+        import json
+        estimator = SampleEstimate(self, self.config.get('estimate_sample', 400), self.config.get('estimate_seed'),
+                                   self.config.get('estimate_transfer_mb', 256))
+        report = estimator.run(files, sizes, dst_root, scan_seconds)
+        for line in report['summary']:
+            self.logger.info(line)
+        if self.config.get('estimate_path'):
+            try:
+                with open(self.config['estimate_path'], 'w', encoding='utf-8') as f:
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+                self.logger.info(f"估算報告已儲存: {self.config['estimate_path']}")
+            except OSError as e:
+                self.logger.error(f"無法寫入估算報告: {e}")
+        CacheDB.flush_instance()
+        if self.status_callback: self.status_callback("快速估算完成")
+        self.stats['estimate'] = report
+        return self.stats
+
+    def _walker(self, skip=None):
+        return ParallelWalker(self.config.get('walk_workers', 8), self.stop_event, skip=skip)
+
+    def _resolve_locations(self, files, max_workers):
+        """
+        Batched GPS stage: read EXIF coordinates in parallel, then resolve all offline
+        names with a single KD-tree query instead of one lookup per photo.
+        """
+        if self.status_callback: self.status_callback("正在讀取 GPS 座標...")
+        photos = [f for f in files if os.path.splitext(f)[1].lower() in ConfigConstants.EXT_PHOTOS]
+        coords = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, lat_lon in zip(photos, executor.map(ImageOps.get_lat_lon, photos)):
+                if self.stop_event.is_set(): break
+                if lat_lon: coords[path] = lat_lon
+
+        if self.status_callback: self.status_callback(f"正在解析 {len(coords)} 個 GPS 座標...")
+        self.gps_coords = coords
+        self.offline_locations = OfflineGeocoder.get_instance().resolve_paths(coords)
+        self.logger.info(f"GPS 座標解析完成: {len(coords)} 張照片含座標")
+
+    def _resolve_duplicates_external(self, files, dst_root, max_workers):
+        """
+        Out-of-core dedup stage: spill source / destination candidates to sorted runs on
+        disk and decide every duplicate before transfers start, within 'dedup_memory_mb'.
+        """
+        if self.status_callback: self.status_callback("正在建立外部去重索引...")
+        dedup = ExternalDedup(len(files), memory_mb=self.config.get('dedup_memory_mb', 256),
+                              temp_dir=self.config.get('dedup_temp_dir'),
+                              max_workers=max_workers, stop_event=self.stop_event, storage=self.storage)
+
+        if self.config.get('skip_existing', False):
+            for fp, size in self.storage.files(dst_root, self.config.get('walk_workers', 8), self.stop_event):
+                if size is not None:
+                    dedup.add_destination(fp, size)
+
+        for file_id, fp in enumerate(files):
+            if self.stop_event.is_set(): break
+            f_size = self._dedup_candidate_size(fp)
+            if f_size is not None:
+                dedup.add_source(file_id, fp, f_size)
+
+        if self.status_callback: self.status_callback("正在比對重複檔案...")
+        dedup.resolve()
+        self.external_dedup = dedup
+        st = dedup.stats
+        self.logger.info(f"外部去重完成: 來源 {st['sources']} / 目標 {st['destinations']} 個檔案，"
+                         f"來源重複 {st['src_dupes']}，目標已存在 {st['dest_dupes']}")
+
+    def _dedup_candidate_size(self, file_path):
+        """Size of a file that would reach the dedup step of _process_single_file, else None."""
+        try:
+            f_size = os.path.getsize(file_path)
+        except:
+            f_size = 0
+        rule = self.rules.match(file_path, f_size, lambda: ImageOps.get_camera_model(file_path))
+        if rule is None or rule.action != 'organize':
+            return None
+        if self.config['resume_enabled'] and self._is_already_processed(file_path, f_size):
+            return None
+        return f_size
+
+    def _process_single_file(self, file_path, dst_root, file_id=None):
+        self._local.digest = ""
+        self._local.partial = ""
         filename = os.path.basename(file_path)
         ext = os.path.splitext(filename)[1].lower()
         
@@ -257,23 +731,28 @@ class Processor:
                 self.stats['processed_size'] += f_size
             return
 
-        if ext in ConfigConstants.EXT_JUNK:
+        # Routing rules (junk / screenshots / photos / videos + user rules)
+        camera_model = []
+        def camera():
+            if not camera_model: camera_model.append(ImageOps.get_camera_model(file_path))
+            return camera_model[0]
+
+        rule = self.rules.match(file_path, f_size, camera)
+        if rule is None or rule.action == 'skip':
             return
 
-        # Screenshot
-        SCREENSHOT_KEYWORDS = ['screenshot', 'screen shot', 'captura', '螢幕擷取', '截圖', 'snapshot']
-        if any(kw in filename.lower() for kw in SCREENSHOT_KEYWORDS):
-            self._move_or_copy(file_path, dst_root, "_Screenshots", filename, "截圖")
+        if rule.action == 'route':
+            self._move_or_copy(file_path, dst_root, rule.target, filename, rule.tag)
             return
 
-        is_photo = ext in ConfigConstants.EXT_PHOTOS
         is_video = ext in ConfigConstants.EXT_VIDEOS
-        
-        if not (is_photo or is_video):
-            return
+        is_photo = not is_video # Anything else an 'organize' rule accepts is treated as a photo
 
         # Deduplication
-        dupe_status = self._check_duplicate(file_path, f_size)
+        if self.external_dedup is not None:
+            dupe_status = self.external_dedup.status(file_id)
+        else:
+            dupe_status = self._check_duplicate(file_path, f_size)
         
         if dupe_status == "DEST_DUPE":
             self.logger.warn(f"[略過] 目標已存在: {filename}")
@@ -283,12 +762,11 @@ class Processor:
                 self._update_history(file_path, "SKIPPED_DEST_DUPE")
                 
             if self.config.get('dry_run', False):
-                with self.preview_lock:
-                    self.preview_log.append([file_path, "SKIP (Dest Dupe)", "-", "Target exists"])
+                self._record_preview([file_path, "SKIP (Dest Dupe)", "-", "Target exists"])
             return
             
         elif dupe_status == "SRC_DUPE":
-            if self.config['mode'] == 'copy':
+            if self.config['mode'] != 'move': # Copy / link keep the source: nothing to file away
                 self.logger.warn(f"[略過] 來源重複檔案: {filename}")
                 with self.stats_lock:
                     self.stats['skipped'] += 1
@@ -296,19 +774,30 @@ class Processor:
                     self._update_history(file_path, "SKIPPED_SRC_DUPE")
                     
                 if self.config.get('dry_run', False):
-                    with self.preview_lock:
-                        self.preview_log.append([file_path, "SKIP (Source Dupe)", "-", "Source duplicate"])
+                    self._record_preview([file_path, "SKIP (Source Dupe)", "-", "Source duplicate"])
             else:
                 self._move_or_copy(file_path, dst_root, "_Duplicates", filename, "重複")
             return
 
         # Blur Check
         if self.config['blur_check_enabled'] and is_photo:
-            is_blur, score = ImageOps.is_blurry(file_path)
+            is_blur, score = self.blur_detector.is_blurry(file_path, self.config.get('blur_threshold', 100.0))
             if is_blur:
                 self._move_or_copy(file_path, dst_root, "_Blurry", filename, f"模糊({int(score)})")
                 return
 
+        # Near-Duplicate Check (re-encoded / edited copies)
+        if self.near_dup_index is not None and is_photo:
+            match = self._check_near_duplicate(file_path)
+            if match:
+                similar_to, dist = match
+                self.logger.warn(f"[近似重複] {filename} ≈ {os.path.basename(similar_to)} (距離 {dist})")
+                with self.stats_lock:
+                    self.stats['near_duplicates'].append((file_path, similar_to, dist))
+                if self.config.get('near_dup_action', 'move') == 'move':
+                    self._move_or_copy(file_path, dst_root, "_NearDuplicates", filename, f"近似重複({dist})")
+                    return
+
         # Date & Main Sort
         date_obj = self.date_parser.get_date(file_path, is_photo)
         
@@ -323,7 +812,6 @@ class Processor:
                     break
 
         if date_obj:
-            folder_name = date_obj.strftime("%Y-%m")
             date_prefix = date_obj.strftime("%Y_%m_%d")
             
             if is_live_photo:
@@ -331,11 +819,19 @@ class Processor:
             else:
                 type_folder = "Photos" if is_photo else "Videos"
             
-            final_sub_dir = os.path.join(type_folder, folder_name)
+            final_sub_dir = rule.folder({
+                'type': type_folder,
+                'yyyy': date_obj.strftime("%Y"), 'mm': date_obj.strftime("%m"), 'dd': date_obj.strftime("%d"),
+                'camera': Rule.safe_component(camera()) if rule.needs_camera else "",
+                'ext': ext.lstrip('.'),
+            })
             
             # GPS
-            if self.config['gps_enabled']:
-                loc = ImageOps.get_location_folder(file_path)
+            lat_lon = self.gps_coords.get(file_path) if self.config['gps_enabled'] else None
+            if lat_lon:
+                loc = ImageOps.get_location_folder(file_path, lat_lon=lat_lon,
+                                                   offline_name=self.offline_locations.get(file_path),
+                                                   online=self.config.get('gps_online', True))
                 if loc: final_sub_dir = os.path.join(final_sub_dir, loc)
             
             # Rename logic
@@ -343,48 +839,37 @@ class Processor:
             
             if self.config['rename_enabled'] and not is_live_photo:
                 # Use cached sequence name (Thread Safe)
-                with self.naming_lock:
-                    reserved = self.dry_run_paths if self.config.get('dry_run') else None
-                    target_path = FSUtils.get_sequence_name(target_dir, date_prefix, ext, self.dir_counters, reserved_paths=reserved)
+                target_path = self.naming.sequence_name(target_dir, date_prefix, ext)
             else:
                 if not self.config.get('dry_run'):
-                    os.makedirs(target_dir, exist_ok=True)
-                
-                with self.naming_lock:
-                    combined_path = os.path.join(target_dir, filename)
-                    reserved = self.dry_run_paths if self.config.get('dry_run') else None
-                    target_path = FSUtils.get_unique_path(combined_path, reserved_paths=reserved)
+                    self.storage.makedirs(target_dir)
+                target_path = self.naming.unique_path(os.path.join(target_dir, filename))
                 
-            self._execute_transfer(file_path, target_path, "整理")
+            self._execute_transfer(file_path, target_path, rule.tag)
             
         else:
             # No Date
-            self._move_or_copy(file_path, dst_root, "No_Date", filename, "整理")
+            self._move_or_copy(file_path, dst_root, rule.undated, filename, rule.tag)
 
     def _move_or_copy(self, src, root, sub, name, tag):
         """Helper to move/copy to root/sub/name"""
         d = os.path.join(root, sub)
         if not self.config.get('dry_run'):
-            os.makedirs(d, exist_ok=True)
+            self.storage.makedirs(d)
         
-        with self.naming_lock:
-            combined_path = os.path.join(d, name)
-            reserved = self.dry_run_paths if self.config.get('dry_run') else None
-            t = FSUtils.get_unique_path(combined_path, reserved_paths=reserved)
-            
+        t = self.naming.unique_path(os.path.join(d, name))
         self._execute_transfer(src, t, tag)
 
-    def _execute_transfer(self, src, dst, tag):
+    def _execute_transfer(self, src, dst, tag, mode=None):
         parent = os.path.basename(os.path.dirname(dst))
+        mode = mode or self.config['mode']
         
         if self.config.get('dry_run', False):
             # Dry Run: Record Log, Don't Move
-            with self.preview_lock:
-                self.preview_log.append([src, f"{self.config['mode']} ({tag})", dst, "Success"])
+            self._record_preview([src, f"{mode} ({tag})", dst, "Success"])
+            if self.plan_writer is not None:
+                self._record_plan(src, mode, dst, tag)
             
-            with self.naming_lock:
-                self.dry_run_paths.add(dst)
-                
             self.logger.info(f"[預覽-{tag}] {os.path.basename(src)} -> {parent} -> {os.path.basename(dst)}")
             
             with self.stats_lock:
@@ -394,80 +879,106 @@ class Processor:
                 except: pass
             return
 
-        os.makedirs(os.path.dirname(dst), exist_ok=True)
-
-        if self.config['mode'] == 'move':
-            shutil.move(src, dst)
+        self.storage.makedirs(os.path.dirname(dst))
+        # Digests already computed for dedup: object storage keeps them for later runs
+        digests = (getattr(self._local, 'partial', ""), getattr(self._local, 'digest', ""))
+        # Thumbnails render while the file is transferred; a local move renders from where
+        # the file landed instead (a rename is instant, so nothing waits on the decoder)
+        thumb_key = self._thumbnail_key(src)
+        early = thumb_key is not None and not (mode == 'move' and self.storage.local)
+        thumb = self.thumbnailer.submit(src, dst, thumb_key) if early else None
+        if thumb is not None and mode == 'move':
+            thumb.wait() # Object storage: read the local source before the move deletes it
+
+        if mode == 'move':
+            self.storage.move(src, dst, digests)
             self.logger.info(f"[{tag}] 移動: {os.path.basename(src)} -> {parent} -> {os.path.basename(dst)}")
+        elif mode == 'link':
+            how = self.storage.link(src, dst, self.config.get('link_method', 'auto'), digests)
+            if how == 'copy':
+                with self.stats_lock:
+                    self.stats['link_copied'] += 1
+            label = {'reflink': "連結(reflink)", 'hardlink': "硬連結"}.get(how, "複製(無法連結)")
+            self.logger.info(f"[{tag}] {label}: {os.path.basename(src)} -> {parent} -> {os.path.basename(dst)}")
         else:
-            shutil.copy2(src, dst)
+            self.storage.copy(src, dst, digests)
             self.logger.info(f"[{tag}] 複製: {os.path.basename(src)} -> {parent} -> {os.path.basename(dst)}")
             
+        if thumb_key is not None and not early:
+            thumb = self.thumbnailer.submit(dst, dst, thumb_key)
+        if thumb is not None:
+            self.thumbnailer.finish(thumb)
+
         with self.stats_lock:
             self.stats['processed'] += 1
             try:
-                self.stats['processed_size'] += os.path.getsize(dst)
+                self.stats['processed_size'] += self.storage.size(dst)
             except: pass
         
         if self.config['resume_enabled']:
             self._update_history(src, dst)
 
+    def _thumbnail_key(self, src):
+        """Content key for Thumbnailer.submit, None when no thumbnail is due."""
+        if self.thumbnailer is None or os.path.splitext(src)[1].lower() not in ConfigConstants.EXT_PHOTOS:
+            return None
+        digest = getattr(self._local, 'digest', "")
+        if digest: return digest
+        try: # Routed / external dedup: not hashed, and not worth reading the file again for
+            return self.thumbnailer.identity(src)
+        except OSError:
+            return None
+
+    def _close_thumbnails(self):
+        """Finish the thumbnail stage (shard counts were merged already) and report it once."""
+        if self.thumbnailer is None: return
+        counts = self.thumbnailer.close(cancel=self.stop_event.is_set())
+        self.thumbnailer = None
+        with self.stats_lock:
+            totals = self.stats['thumbnails']
+            for key, n in counts.items(): totals[key] += n
+        if any(totals.values()):
+            failed = f"，無法解碼 {totals['failed']} 張" if totals['failed'] else ""
+            self.logger.info(f"縮圖: 新產生 {totals['rendered']} 張，沿用既有 {totals['reused']} 張{failed}")
+
     def _check_duplicate(self, path, f_size):
         """
         Return: None (Not dupe), "SRC_DUPE", "DEST_DUPE"
         Implements Tiered Hashing: Size -> Partial Hash -> Full Hash
         """
-        f_partial = None
-        f_full = None
-        
-        # 1. Check Destination Index (Global Skip)
-        if self.config.get('skip_existing', False) and f_size in self.dst_index:
-            candidates = self.dst_index[f_size]
-            for dest_path in candidates: 
-                if os.path.abspath(path) == os.path.abspath(dest_path): continue
-                
-                if not f_partial: f_partial = Dedup.get_partial_hash(path)
-                d_partial = Dedup.get_partial_hash(dest_path)
-                
-                if f_partial == d_partial:
-                    if not f_full: f_full = Dedup.get_hash(path)
-                    d_full = Dedup.get_hash(dest_path)
+        # Digests are computed OUTSIDE any lock (we need the full hash anyway, to store
+        # or to compare); the registry only compares them.
+        self._local.partial = Dedup.get_partial_hash(path)
+        f_partial = partial_to_int(self._local.partial)
+        f_full = self._full_digest(path) if f_partial is not None else None
+        if f_partial is None or f_full is None:
+            return None # Unreadable: leave it to the transfer step to report
+        return self.dedup.check(path, f_size, f_partial, f_full)
                     
-                    if f_full == d_full:
-                        return "DEST_DUPE"
+    def _full_digest(self, path):
+        """Full content digest as int; the hex form is kept for the dry-run plan."""
+        digest = Dedup.get_hash(path)
+        self._local.digest = digest
+        return digest_to_int(digest)
+
+    def _check_near_duplicate(self, path):
+        """Return (similar_path, distance) if a perceptually similar photo was already seen."""
+        key = None
+        h = None
+        try:
+            key = FSUtils.file_identity(path)
+            h = self.phash_cache.get(key)
+        except OSError:
+            pass
+        if h is None:
+            h = PerceptualHash.dhash(path)
+            if h is None: return None
+            if key: self.phash_cache.set(key, h)
+        h = int(h)
+        if h == 0 or h == (1 << PerceptualHash.HASH_BITS) - 1:
+            return None # Flat image: the hash carries no structure to compare
+        return self.near_dup_index.find_or_add(h, path)
 
-        # 2. Check Source Locally
-        # Pre-compute Partial Hash (Fast, small read)
-        if not f_partial: f_partial = Dedup.get_partial_hash(path)
-        
-        # Optimization: To maximize parallelism, we compute Full Hash OUTSIDE the lock
-        # because we will likely need it anyway (to store or to compare).
-        # Computing it inside the lock would serialize the process for all unique files.
-        if not f_full: f_full = Dedup.get_hash(path)
-        
-        with self.dedup_lock:
-            # Check Size
-            if f_size not in self.seen_files:
-                # First time seeing this size -> Unique
-                self.seen_files[f_size] = {f_partial: {f_full: path}}
-                return None
-            
-            # Check Partial
-            partials = self.seen_files[f_size]
-            if f_partial not in partials:
-                # First time seeing this partial -> Unique
-                partials[f_partial] = {f_full: path}
-                return None
-            
-            # Partial Match -> Check Full
-            fulls = partials[f_partial]
-            if f_full in fulls:
-                return "SRC_DUPE"
-            else:
-                # Full hash diff -> Collision -> Unique
-                fulls[f_full] = path
-                return None
-                    
     # --- History Logic ---
     def _load_history(self):
         import json
@@ -506,6 +1017,6 @@ class Processor:
             
         try:
             if abs(os.path.getmtime(src) - rec['mtime']) > 2.0 or size != rec['size']: return False
-            if rec['dest'] != "SKIPPED_DUPLICATE" and not os.path.exists(rec['dest']): return False
+            if rec['dest'] != "SKIPPED_DUPLICATE" and not self.storage.exists(rec['dest']): return False
             return True
         except: return False
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from typing import Optional
+
+from src.core.dedup_index import SourceDedupIndex, DestinationIndex
+from src.core.storage import LocalStorage
+from src.utils.fs_utils import FSUtils, ReservedPaths
+
+
+class DedupRegistry:
+    """
+    Run-wide dedup state: the destination index (skip_existing) and the source index.
+    Callers hash the source file themselves; check() only compares digests, so in
+    multi-process mode the coordinator owns one registry and workers send it digests.
+    """
+
+    def __init__(self, skip_existing: bool = False, storage=None):
+        """storage: destination backend (see src.core.storage), default the local filesystem."""
+        self.skip_existing = skip_existing
+        self.storage = storage or LocalStorage()
+        self.seen_files = SourceDedupIndex() # (size, partial, full) -> first path (Source local)
+        self.dst_index = DestinationIndex() # size-sorted paths + memoised digests (Destination global)
+
+    def index_destination(self, dst_root, stop_event=None, status_callback=None, workers: int = 8):
+        count = 0
+        for fp, sz in self.storage.files(dst_root, workers, stop_event):
+            if sz is None: continue
+            self.dst_index.add(fp, sz)
+
+            count += 1
+            if count % 1000 == 0 and status_callback:
+                status_callback(f"正在索引目標檔案... ({count})")
+        self.dst_index.freeze()
+
+    def check(self, path: str, size: int, partial: int, full: int) -> Optional[str]:
+        """
+        Return: None (Not dupe), "SRC_DUPE", "DEST_DUPE".
+        Destination digests are computed lazily, size -> partial -> full.
+        """
+        # 1. Check Destination Index (Global Skip)
+        if self.in_destination(path, size, partial, full):
+            return "DEST_DUPE"
+
+        # 2. Check Source: (size, partial, full) match -> duplicate, else first occurrence
+        if self.seen_files.check_and_add(size, partial, full, path) is not None:
+            return "SRC_DUPE"
+        return None
+
+    def in_destination(self, path: str, size: int, partial: int, full: int) -> bool:
+        """True if skip_existing is on and the destination already holds this content."""
+        if not (self.skip_existing and self.dst_index.has_size(size)):
+            return False
+        abs_path = os.path.abspath(path)
+        for row, dest_path in self.dst_index.candidates(size):
+            if abs_path == os.path.abspath(dest_path): continue
+            d_partial = self.dst_index.partial(row, lambda: self.storage.partial_hash(dest_path))
+            if partial == d_partial:
+                d_full = self.dst_index.full(row, lambda: self.storage.full_hash(dest_path, release=True))
+                if full == d_full:
+                    return True
+        return False
+
+
+class NamingRegistry:
+    """
+    Destination names handed out during a run. Every returned path is reserved at
+    once, so concurrent workers (threads or processes) never get the same name even
+    before the file exists on disk (and dry runs see their own virtual files).
+    """
+
+    def __init__(self, storage=None):
+        self.dir_counters = {} # {(dir, prefix): seq}
+        self.reserved = ReservedPaths()
+        self.storage = storage or LocalStorage() # Existing names are looked up in the destination backend
+        self._lock = threading.Lock()
+
+    def sequence_name(self, target_dir: str, prefix: str, ext: str) -> str:
+        with self._lock:
+            path = FSUtils.get_sequence_name(target_dir, prefix, ext, self.dir_counters, reserved_paths=self.reserved,
+                                             exists=self.storage.exists, listdir=self.storage.listdir)
+            self.reserved.add(path)
+            return path
+
+    def unique_path(self, path: str) -> str:
+        with self._lock:
+            path = FSUtils.get_unique_path(path, reserved_paths=self.reserved, exists=self.storage.exists)
+            self.reserved.add(path)
+            return path
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import ntpath
+import bisect
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence
+
+from src.utils.config import ConfigConstants
+
+SCREENSHOT_KEYWORDS = ['screenshot', 'screen shot', 'captura', '螢幕擷取', '截圖', 'snapshot']
+
+# Built-in behaviour, always appended after the user's rules (first match wins)
+DEFAULT_RULES = [
+    {'name': "junk", 'ext': sorted(ConfigConstants.EXT_JUNK), 'action': 'skip'},
+    {'name': "screenshots", 'name_contains': SCREENSHOT_KEYWORDS, 'action': 'route',
+     'target': "_Screenshots", 'tag': "截圖"},
+    {'name': "photos", 'ext': sorted(ConfigConstants.EXT_PHOTOS)},
+    {'name': "videos", 'ext': sorted(ConfigConstants.EXT_VIDEOS)},
+]
+
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+_UNSAFE_CHARS = re.compile(r'[<>:"/\\|?*\x00-\x1f]+')
+_SEPARATORS = re.compile(r'[/\\]')
+
+
+class Rule:
+    """
+    One routing rule. Actions:
+      - 'organize' (default): dedup / blur / date sort into `target`, a folder template
+        with {type} (Photos, Videos or _LivePhotos), {yyyy} {mm} {dd}, {camera}, {ext};
+        files without a date go to `undated`.
+      - 'route': copied / moved as-is into the `target` folder (no dedup, no date).
+      - 'skip': left untouched.
+    """
+    ACTIONS = ('organize', 'route', 'skip')
+    FIELDS = {'name', 'ext', 'name_contains', 'path_contains', 'camera', 'min_size_mb', 'max_size_mb',
+              'action', 'target', 'undated', 'tag'}
+    TEMPLATE_KEYS = {'type', 'yyyy', 'mm', 'dd', 'camera', 'ext'}
+
+    def __init__(self, spec: dict, index: int):
+        unknown = set(spec) - self.FIELDS
+        if unknown:
+            raise ValueError(f"rule {index}: unknown field(s) {', '.join(sorted(unknown))}")
+        self.index = index
+        self.name = spec.get('name') or f"rule {index}"
+        self.action = spec.get('action', 'organize')
+        if self.action not in self.ACTIONS:
+            raise ValueError(f"{self.name}: unknown action '{self.action}'")
+        self.exts = [e.lower() if e.startswith('.') else '.' + e.lower() for e in self._list(spec, 'ext')]
+        self.name_contains = [k.lower() for k in self._list(spec, 'name_contains')]
+        self.path_contains = [k.lower().replace('\\', '/') for k in self._list(spec, 'path_contains')]
+        self.camera = [k.lower() for k in self._list(spec, 'camera')]
+        self.min_size = int(spec['min_size_mb'] * 1024 * 1024) if spec.get('min_size_mb') is not None else None
+        self.max_size = int(spec['max_size_mb'] * 1024 * 1024) if spec.get('max_size_mb') is not None else None
+        default_target = "{type}/{yyyy}-{mm}" if self.action == 'organize' else None
+        self.target = spec.get('target', default_target)
+        if self.action == 'route' and not self.target:
+            raise ValueError(f"{self.name}: 'route' needs a target folder")
+        self.undated = spec.get('undated', "No_Date")
+        self.tag = spec.get('tag', "整理")
+        if self.target:
+            bad = set(_PLACEHOLDER.findall(self.target)) - self.TEMPLATE_KEYS
+            if bad:
+                raise ValueError(f"{self.name}: unknown placeholder(s) {', '.join(sorted(bad))}")
+        for key in ('target', 'undated'):
+            value = getattr(self, key)
+            if value and not self.is_relative(value):
+                raise ValueError(f"{self.name}: '{key}' must be a folder inside the destination: {value}")
+        self.needs_camera = '{camera}' in (self.target or "")
+
+    @staticmethod
+    def _list(spec, key) -> List[str]:
+        value = spec.get(key) or []
+        return [value] if isinstance(value, str) else list(value)
+
+    def folder(self, values: Dict[str, str]) -> str:
+        """Render the target template; values must cover every placeholder used."""
+        rendered = _PLACEHOLDER.sub(lambda m: values[m.group(1)], self.target)
+        if not self.is_relative(rendered): # e.g. an empty {ext} at the start: never leave dst_root
+            raise ValueError(f"{self.name}: target renders outside the destination: {rendered}")
+        return os.path.normpath(rendered)
+
+    @staticmethod
+    def is_relative(path: str) -> bool:
+        """True if joining `path` to a root stays below it (no absolute path, drive or '..', on any OS)."""
+        if not path or ntpath.splitdrive(path)[0] or path[0] in '/\\':
+            return False
+        return '..' not in _SEPARATORS.split(path)
+
+    @staticmethod
+    def safe_component(text: str) -> str:
+        return _UNSAFE_CHARS.sub('_', text).strip(' ._') or "Unknown"
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton compiled to a DFA: scan() returns the OR of the masks of
+    every keyword occurring in the text, in one pass over its characters, however
+    many keywords there are.
+    """
+
+    def __init__(self, keywords: Dict[str, int]):
+        goto = [{}]
+        out = [0]
+        for word, mask in keywords.items():
+            state = 0
+            for ch in word:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append(0)
+                state = nxt
+            out[state] |= mask
+
+        # Breadth-first: failure links, inherited outputs and full DFA transitions
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            out[state] |= out[fail[state]]
+            delta[state] = dict(delta[fail[state]])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[fail[state]].get(ch, 0) if state else 0
+                delta[state][ch] = nxt
+                queue.append(nxt)
+        self._delta = delta
+        self._out = out
+
+    def scan(self, text: str) -> int:
+        delta, out = self._delta, self._out
+        state, mask = 0, 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]: mask |= out[state]
+        return mask
+
+
+class RuleSet:
+    """
+    Ordered rules compiled into one matcher. Each rule is a bit; every condition type
+    (extension, size range, name / path keywords, camera) is evaluated once for all
+    rules at the same time and yields the mask of rules it allows. The winner is the
+    lowest bit left, so the cost per file does not grow with the number of rules.
+    EXIF (camera) is only read when the best remaining candidate depends on it.
+    """
+
+    def __init__(self, specs: Sequence[dict]):
+        self.rules = [Rule(spec, i) for i, spec in enumerate(specs)]
+        everything = (1 << len(self.rules)) - 1
+
+        # Extension: dict lookup; rules without an extension list allow any
+        any_ext = 0
+        self._ext = {}
+        for r in self.rules:
+            if not r.exts: any_ext |= 1 << r.index
+            for e in r.exts: self._ext[e] = self._ext.get(e, 0) | (1 << r.index)
+        self._ext = {e: m | any_ext for e, m in self._ext.items()}
+        self._any_ext = any_ext
+
+        # Size: rule masks per interval between the sorted range boundaries
+        bounds = sorted({b for r in self.rules for b in (r.min_size, None if r.max_size is None else r.max_size + 1)
+                         if b is not None})
+        self._bounds = bounds
+        self._size = []
+        for lo in [0] + bounds:
+            mask = 0
+            for r in self.rules:
+                if (r.min_size is None or lo >= r.min_size) and (r.max_size is None or lo <= r.max_size):
+                    mask |= 1 << r.index
+            self._size.append(mask)
+
+        self._name, self._name_free = self._keywords(lambda r: r.name_contains, everything)
+        self._path, self._path_free = self._keywords(lambda r: r.path_contains, everything)
+        self._camera, self._camera_free = self._keywords(lambda r: r.camera, everything)
+
+    def _keywords(self, field, everything):
+        words = {}
+        for r in self.rules:
+            for w in field(r):
+                words[w] = words.get(w, 0) | (1 << r.index)
+        constrained = sum(1 << r.index for r in self.rules if field(r))
+        return (KeywordAutomaton(words) if words else None), everything & ~constrained
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'RuleSet':
+        """User rules from a JSON file ({"rules": [...]} or a list) ahead of DEFAULT_RULES."""
+        specs = []
+        if path:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            specs = data.get('rules', []) if isinstance(data, dict) else data
+            if not isinstance(specs, list) or not all(isinstance(s, dict) for s in specs):
+                raise ValueError("rules must be a list of objects")
+        return cls(list(specs) + DEFAULT_RULES)
+
+    def match(self, file_path: str, size: int, camera: Optional[Callable[[], str]] = None) -> Optional[Rule]:
+        """
+        First rule matching the file, or None (not handled: left untouched).
+        camera: returns 'Make Model' from EXIF; only called when a camera rule is in front.
+        """
+        head, filename = os.path.split(file_path)
+        name = filename.lower()
+        m = self._ext.get(os.path.splitext(name)[1], self._any_ext)
+        if m: m &= self._size[bisect.bisect_right(self._bounds, size)]
+        if m and self._name is not None and m & ~self._name_free:
+            m &= self._name_free | self._name.scan(name)
+        if m and self._path is not None and m & ~self._path_free:
+            m &= self._path_free | self._path.scan(head.lower().replace('\\', '/') + '/')
+        if m and self._camera is not None and (m & -m) & ~self._camera_free:
+            model = (camera() if camera is not None else "") or ""
+            m &= self._camera_free | self._camera.scan(model.lower())
+        if not m: return None
+        return self.rules[(m & -m).bit_length() - 1]
+
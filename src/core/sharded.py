@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import heapq
+import queue
+import threading
+import multiprocessing
+from typing import List
+
+from src.utils.logger import Logger
+from src.utils.cache_db import CacheDB
+
+
+class _Link:
+    """
+    Worker side of the coordinator pipe.
+
+    Pipeline threads call call()/notify(); a sender thread drains everything queued
+    at that moment into ONE message (no added latency, natural batching under load)
+    and a receiver thread hands replies back by request id. Non-reply messages from
+    the coordinator are control commands (stop / pause / resume).
+    """
+    MAX_BATCH = 512
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.on_control = {}
+        self._queue = queue.Queue()
+        self._waiting = {} # rid -> [Event, result]
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._sender = threading.Thread(target=self._send_loop, name="shard-send", daemon=True)
+        self._receiver = threading.Thread(target=self._recv_loop, name="shard-recv", daemon=True)
+        self._sender.start()
+        self._receiver.start()
+
+    def call(self, kind, payload):
+        with self._lock:
+            rid = self._next_id
+            self._next_id += 1
+            slot = self._waiting[rid] = [threading.Event(), None]
+        self._queue.put((kind, rid, payload))
+        slot[0].wait()
+        return slot[1]
+
+    def notify(self, kind, payload):
+        self._queue.put((kind, None, payload))
+
+    def close(self):
+        """Flush everything queued so far and stop the sender."""
+        self._queue.put(None)
+        self._sender.join()
+
+    def _send_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            batch = [item]
+            closing = False
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            try:
+                self.conn.send(batch)
+            except (OSError, ValueError):
+                return
+            if closing: return
+
+    def _recv_loop(self):
+        while True:
+            try:
+                kind, body = self.conn.recv()
+            except (EOFError, OSError):
+                # Coordinator gone: stop the pipeline and release every waiter
+                handler = self.on_control.get('stop')
+                if handler: handler()
+                with self._lock:
+                    slots, self._waiting = list(self._waiting.values()), {}
+                for slot in slots: slot[0].set()
+                return
+            if kind == 'reply':
+                for rid, result in body:
+                    with self._lock:
+                        slot = self._waiting.pop(rid, None)
+                    if slot:
+                        slot[1] = result
+                        slot[0].set()
+            else:
+                handler = self.on_control.get(kind)
+                if handler: handler()
+
+
+class _RemoteDedup:
+    def __init__(self, link): self.link = link
+    def check(self, path, size, partial, full): return self.link.call('dedup', (path, size, partial, full))
+
+
+class _RemoteNearDup:
+    def __init__(self, link): self.link = link
+    def find_or_add(self, h, payload): return self.link.call('near', (h, payload))
+
+
+class _RemoteNaming:
+    def __init__(self, link): self.link = link
+    def sequence_name(self, target_dir, prefix, ext): return self.link.call('seq', (target_dir, prefix, ext))
+    def unique_path(self, path): return self.link.call('unique', path)
+
+
+class _RemoteWriter:
+    """ReportWriter stand-in: rows are written by the coordinator's writer."""
+    def __init__(self, link, kind):
+        self.link = link
+        self.kind = kind
+        self.rows = 0
+    def write(self, row):
+        self.rows += 1
+        self.link.notify(self.kind, row)
+    def close(self): pass
+
+
+class _ShardDecisions:
+    """External-dedup decisions for this shard's files (codes from ExternalDedup)."""
+    def __init__(self, codes: bytes): self.codes = codes
+    def status(self, file_id):
+        from src.core.extdedup import ExternalDedup
+        return ExternalDedup._STATUS[self.codes[file_id]]
+
+
+def _worker_main(conn, config, files, decisions, total_size):
+    """Entry point of a shard process: runs the normal pipeline over its files."""
+    from src.core.processor import Processor
+
+    link = _Link(conn)
+    Logger.get_instance().set_callback(lambda msg, level: link.notify('log', (level, msg)))
+    proc = Processor(dict(config, processes=1),
+                     progress_callback=lambda d: link.notify('progress', (d['current'], d['processed_size'], d['filename'])))
+    proc.dedup = _RemoteDedup(link)
+    proc.naming = _RemoteNaming(link)
+    if proc.near_dup_index is not None: # One index for the run: near-duplicates across shards are found too
+        proc.near_dup_index = _RemoteNearDup(link)
+    if decisions is not None:
+        proc.external_dedup = _ShardDecisions(decisions)
+    if config.get('dry_run', False):
+        proc.preview_report = _RemoteWriter(link, 'report')
+        if config.get('plan_path'):
+            proc.plan_writer = _RemoteWriter(link, 'plan')
+    link.on_control = {'stop': proc.stop, 'pause': proc.pause, 'resume': proc.resume}
+    proc._stop_reported = True # The coordinator reports the stop latency once for all shards
+    proc.throttle.split(config.get('processes', 1)) # Limits are for the whole run
+    if proc.thumbnailer is not None:
+        proc.thumbnailer.split(config.get('processes', 1))
+    proc.apply_priority()
+
+    try:
+        proc._load_history()
+        proc.run_files(files, config['dst_root'], total_size)
+    except Exception as e:
+        proc.logger.error(f"工作程序錯誤: {e}")
+        proc.stats['errors'] += 1
+    finally:
+        if proc.thumbnailer is not None: # Counts travel with the stats, the coordinator reports them
+            proc.stats['thumbnails'] = proc.thumbnailer.close(cancel=proc.stop_event.is_set())
+            proc.thumbnailer = None
+        CacheDB.flush_instance()
+        history = {}
+        if config.get('resume_enabled') and not config.get('dry_run', False):
+            history = {f: proc.history_db[f] for f in files if f in proc.history_db}
+        link.notify('done', (proc.stats, history))
+        link.close()
+
+
+class ShardedRunner:
+    """
+    Multi-process execution (config 'processes' > 1).
+
+    The scanned files are sharded by source directory (Live Photo pairs and sidecars
+    stay together) across N spawned worker processes, each running the usual threaded
+    pipeline. The coordinator (this process) owns the run-wide state - dedup and
+    near-duplicate indexes, naming registry, report / plan writers, history - and
+    serves batched requests from the workers. Worker progress is summed into the usual progress_callback.
+    """
+
+    def __init__(self, processor, processes: int):
+        self.proc = processor
+        self.processes = processes
+        self.logger = Logger.get_instance()
+        self._progress = {} # shard -> (completed, processed_size)
+        self._progress_lock = threading.Lock()
+        self._send_locks = []
+        self._last_emit = 0.0
+
+    @staticmethod
+    def shard(files: List[str], n: int) -> List[List[int]]:
+        """Greedy largest-directory-first assignment of file ids to n shards."""
+        by_dir = {}
+        for i, f in enumerate(files):
+            by_dir.setdefault(os.path.dirname(f), []).append(i)
+        heap = [(0, k) for k in range(n)]
+        shards = [[] for _ in range(n)]
+        for ids in sorted(by_dir.values(), key=len, reverse=True):
+            load, k = heapq.heappop(heap)
+            shards[k].extend(ids)
+            heapq.heappush(heap, (load + len(ids), k))
+        return [sorted(s) for s in shards if s]
+
+    def run(self, all_files, dst_root, total_size):
+        p = self.proc
+        self.total_count = len(all_files)
+        self.total_size = total_size
+        self.start_time = time.time()
+
+        ctx = multiprocessing.get_context('spawn')
+        decisions = p.external_dedup.decisions if p.external_dedup is not None else None
+        workers = []
+        for idx, ids in enumerate(self.shard(all_files, self.processes)):
+            files = [all_files[i] for i in ids]
+            codes = bytes(decisions[i] for i in ids) if decisions is not None else None
+            parent, child = ctx.Pipe()
+            worker = ctx.Process(target=_worker_main, args=(child, dict(p.config), files, codes, total_size),
+                                 name=f"organizer-shard-{idx}", daemon=True)
+            worker.start()
+            child.close()
+            self._send_locks.append(threading.Lock())
+            server = threading.Thread(target=self._serve, args=(idx, parent, len(files)), daemon=True)
+            server.start()
+            workers.append((worker, parent, server))
+        self.logger.info(f"已啟動 {len(workers)} 個工作程序 (依資料夾分片)")
+
+        # Forward stop / pause to the workers until every shard reported back
+        stopped, paused = False, False
+        while any(server.is_alive() for _, _, server in workers):
+            if p.stop_event.is_set() and not stopped:
+                stopped = True
+                self._broadcast(workers, 'stop')
+            elif not stopped and paused == p.pause_event.is_set():
+                paused = not paused
+                self._broadcast(workers, 'pause' if paused else 'resume')
+            time.sleep(0.1)
+
+        for worker, conn, _ in workers:
+            worker.join(timeout=10)
+            conn.close()
+
+    def _broadcast(self, workers, command):
+        for idx, (_, conn, _) in enumerate(workers):
+            try:
+                with self._send_locks[idx]:
+                    conn.send((command, None))
+            except (OSError, ValueError):
+                pass
+
+    def _serve(self, idx, conn, shard_size):
+        p = self.proc
+        while True:
+            try:
+                batch = conn.recv()
+            except (EOFError, OSError):
+                self.logger.error(f"工作程序 {idx} 異常結束 ({shard_size} 個檔案未完成回報)")
+                with p.stats_lock:
+                    p.stats['errors'] += 1
+                    p.stats['failed_files'].append(f"shard {idx} (工作程序異常結束)")
+                return
+
+            replies = []
+            done = False
+            for kind, rid, payload in batch:
+                if kind == 'dedup':
+                    replies.append((rid, p.dedup.check(*payload)))
+                elif kind == 'near':
+                    replies.append((rid, p.near_dup_index.find_or_add(*payload)))
+                elif kind == 'seq':
+                    replies.append((rid, p.naming.sequence_name(*payload)))
+                elif kind == 'unique':
+                    replies.append((rid, p.naming.unique_path(payload)))
+                elif kind == 'report':
+                    p._record_preview(payload)
+                elif kind == 'plan':
+                    if p.plan_writer is not None: p.plan_writer.write(payload)
+                elif kind == 'log':
+                    level, msg = payload
+                    self.logger.log(msg, level)
+                elif kind == 'progress':
+                    self._on_progress(idx, *payload)
+                elif kind == 'done':
+                    self._merge(*payload)
+                    done = True
+            if replies:
+                try:
+                    with self._send_locks[idx]:
+                        conn.send(('reply', replies))
+                except (OSError, ValueError):
+                    return
+            if done: return
+
+    def _on_progress(self, idx, completed, processed_size, filename):
+        with self._progress_lock:
+            self._progress[idx] = (completed, processed_size)
+            now = time.time()
+            if now - self._last_emit < 0.1: return
+            self._last_emit = now
+            current = sum(c for c, _ in self._progress.values())
+            size = sum(s for _, s in self._progress.values())
+            recent = self.proc._rate_meter.update(size)
+        if not self.proc.progress_callback: return
+        elapsed = max(now - self.start_time, 0.001)
+        speed = recent or size / elapsed
+        eta = max(0, self.total_size - size) / speed if speed > 0 else 0
+        self.proc.progress_callback({
+            'current': current,
+            'total': self.total_count,
+            'filename': filename,
+            'processed_size': size,
+            'total_size': self.total_size,
+            'speed': speed,
+            'eta': eta,
+            'limit': self.proc.throttle.describe()
+        })
+
+    def _merge(self, stats, history):
+        p = self.proc
+        with p.stats_lock:
+            for key in ('processed', 'processed_size', 'skipped', 'errors', 'link_copied'):
+                p.stats[key] += stats.get(key, 0)
+            p.stats['failed_files'].extend(stats.get('failed_files', []))
+            p.stats['near_duplicates'].extend(stats.get('near_duplicates', []))
+            for key, n in stats.get('thumbnails', {}).items():
+                p.stats['thumbnails'][key] += n
+        if history:
+            with p.history_lock:
+                p.history_db.update(history)
@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+import os
+import posixpath
+import mimetypes
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.lazy_import import LazyModule
+from src.utils.cancel import TransferCancelled
+from src.utils.walker import ParallelWalker
+from src.core.dedup import Dedup
+from src.core.transfer import FileTransfer, is_temp_name
+
+# Optional: S3-compatible destinations
+boto3 = LazyModule('boto3')
+botocore_config = LazyModule('botocore.config')
+s3_transfer = LazyModule('boto3.s3.transfer')
+
+
+class LocalStorage:
+    """
+    The local filesystem as destination (the default). Transfers go through
+    FileTransfer: temp file + rename, durability policy, link mode.
+    """
+    local = True
+
+    def __init__(self, transfer: Optional[FileTransfer] = None):
+        self.transfer = transfer or FileTransfer()
+        self.hidden: List[str] = [] # Service folders inside the destination (thumbnails)
+
+    def hide(self, path: str):
+        """Keep a folder out of destination listings (dedup index)."""
+        self.hidden.append(path)
+
+    exists = staticmethod(os.path.exists)
+    listdir = staticmethod(os.listdir)
+
+    def makedirs(self, path: str):
+        os.makedirs(path, exist_ok=True)
+
+    def size(self, path: str) -> int:
+        return os.path.getsize(path)
+
+    def stat(self, path: str) -> Optional[Tuple[int, float]]:
+        """(size, mtime) or None if missing."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
+
+    def files(self, root: str, workers: int = 8, stop_event=None) -> Iterable[Tuple[str, Optional[int]]]:
+        # Skips interrupted transfers
+        return ParallelWalker(workers, stop_event, exclude=self.hidden, skip=is_temp_name).files(root)
+
+    def partial_hash(self, path: str) -> str:
+        return Dedup.get_partial_hash(path)
+
+    def full_hash(self, path: str, release: bool = False) -> str:
+        return Dedup.get_hash(path, release=release)
+
+    def copy(self, src: str, dst: str, digests=None):
+        self.transfer.copy(src, dst)
+
+    def move(self, src: str, dst: str, digests=None):
+        self.transfer.move(src, dst)
+
+    def link(self, src: str, dst: str, method: str = 'auto', digests=None) -> str:
+        return self.transfer.link(src, dst, method)
+
+    def delete(self, path: str):
+        os.remove(path)
+
+    def flush(self):
+        self.transfer.flush()
+
+
+class S3Storage:
+    """
+    S3-compatible object storage (AWS S3, MinIO, Ceph RGW, ...): dst_root = "s3://bucket/prefix".
+    Destination paths keep the os.path.join form and are mapped to keys.
+
+    - One boto3 client and one s3transfer manager serve every worker thread (both are
+      thread-safe), over a shared connection pool.
+    - Files of at least `part_mb` go up as multipart uploads. Parts of all files share
+      `concurrency` request slots, so one large file uses them all while many small
+      files are sent side by side. An object only appears once complete; a stop
+      cancels the transfer (parts in flight finish, the multipart upload is aborted),
+      so nothing partial is left behind. Uploaded bytes are charged to the write throttle.
+    - Every object stores the source mtime and its partial / full digests as user
+      metadata. Dedup against the bucket then needs one HEAD per same-size candidate
+      instead of a download; objects uploaded by other tools are hashed from ranged
+      GETs (partial) or a temporary download (full).
+    - Listings are bulk: the destination index lists every top-level folder in
+      parallel (1000 keys per request); naming lists each target folder once with a
+      delimiter listing and keeps it up to date with its own uploads.
+    """
+    local = False
+    SCHEME = "s3://"
+    META_MTIME, META_PARTIAL, META_DIGEST = 'spo-mtime', 'spo-partial', 'spo-digest'
+
+    def __init__(self, root: str, config: Optional[dict] = None, cancel=None, throttle=None):
+        config = config or {}
+        self.bucket, self.prefix = self.split(root)
+        if not self.bucket:
+            raise ValueError(f"Invalid S3 destination: {root}")
+        self.endpoint_url = config.get('s3_endpoint_url')
+        self.region = config.get('s3_region')
+        self.profile = config.get('s3_profile')
+        self.storage_class = config.get('s3_storage_class')
+        self.part_size = int(max(5, config.get('s3_part_mb', 16)) * (1 << 20)) # S3 minimum part: 5 MiB
+        self.concurrency = max(1, config.get('s3_concurrency', 32))
+        self.connections = max(self.concurrency + 8, config.get('s3_connections', 64)) # Parts + HEAD / LIST from workers
+        self.cancel = cancel
+        self.throttle = throttle if throttle is not None and throttle.enabled else None
+        self._client = None
+        self._manager = None # s3transfer TransferManager
+        self._lock = threading.Lock()
+        self._folders: Dict[str, Dict[str, Optional[int]]] = {} # folder key -> {name: size, None for sub-folders}
+
+    @classmethod
+    def is_url(cls, path) -> bool:
+        return isinstance(path, str) and path[:len(cls.SCHEME)].lower() == cls.SCHEME
+
+    @classmethod
+    def split(cls, path: str) -> Tuple[str, str]:
+        """'s3://bucket/a/b' -> ('bucket', 'a/b')"""
+        bucket, _, key = path[len(cls.SCHEME):].replace('\\', '/').partition('/')
+        key = key.strip('/')
+        return bucket, posixpath.normpath(key) if key else ""
+
+    def _key(self, path: str) -> str:
+        bucket, key = self.split(path)
+        if bucket != self.bucket:
+            raise ValueError(f"{path} is outside s3://{self.bucket}")
+        return key
+
+    def _url(self, key: str) -> str:
+        return f"{self.SCHEME}{self.bucket}/{key}"
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not boto3:
+                        raise ImportError("S3 目標需要安裝 boto3 (pip install boto3)")
+                    session = boto3.session.Session(profile_name=self.profile)
+                    config = botocore_config.Config(max_pool_connections=self.connections,
+                                                    retries={'max_attempts': 10, 'mode': 'adaptive'})
+                    client = session.client('s3', endpoint_url=self.endpoint_url, region_name=self.region, config=config)
+                    self._manager = s3_transfer.create_transfer_manager(client, s3_transfer.TransferConfig(
+                        multipart_threshold=self.part_size, multipart_chunksize=self.part_size,
+                        max_concurrency=self.concurrency, use_threads=True))
+                    self._client = client
+        return self._client
+
+    @property
+    def manager(self):
+        return self.client and self._manager
+
+    # --- Listing ---
+    def _pages(self, prefix: str, delimiter: Optional[str] = None):
+        kwargs = {'Bucket': self.bucket, 'Prefix': prefix}
+        if delimiter: kwargs['Delimiter'] = delimiter
+        return self.client.get_paginator('list_objects_v2').paginate(**kwargs)
+
+    def _folder(self, path: str) -> Dict[str, Optional[int]]:
+        key = self._key(path)
+        with self._lock:
+            entries = self._folders.get(key)
+            if entries is not None: return entries
+        entries = {}
+        prefix = key + '/' if key else ""
+        for page in self._pages(prefix, '/'):
+            for obj in page.get('Contents', ()):
+                entries[obj['Key'][len(prefix):]] = obj['Size']
+            for sub in page.get('CommonPrefixes', ()):
+                entries[sub['Prefix'][len(prefix):].rstrip('/')] = None
+        with self._lock:
+            return self._folders.setdefault(key, entries)
+
+    def exists(self, path: str) -> bool:
+        folder, name = posixpath.split(self._key(path))
+        if not name: return True # The bucket root
+        return name in self._folder(self._url(folder))
+
+    def listdir(self, path: str) -> List[str]:
+        return list(self._folder(path))
+
+    def makedirs(self, path: str):
+        pass # Folders are only key prefixes
+
+    def files(self, root: str, workers: int = 8, stop_event=None) -> Iterable[Tuple[str, Optional[int]]]:
+        """(url, size) of every object under root; each top-level folder is listed by its own thread."""
+        key = self._key(root)
+        prefix = key + '/' if key else ""
+        folders = []
+        for page in self._pages(prefix, '/'):
+            for obj in page.get('Contents', ()):
+                yield self._url(obj['Key']), obj['Size']
+            folders.extend(sub['Prefix'] for sub in page.get('CommonPrefixes', ()))
+
+        def listing(folder):
+            found = []
+            for page in self._pages(folder):
+                if stop_event is not None and stop_event.is_set(): break
+                found.extend((obj['Key'], obj['Size']) for obj in page.get('Contents', ()))
+            return found
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for found in executor.map(listing, folders):
+                for obj_key, size in found:
+                    yield self._url(obj_key), size
+
+    # --- Metadata / digests ---
+    def _head(self, path: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(path))
+        except self.client.exceptions.ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def size(self, path: str) -> int:
+        folder, name = posixpath.split(self._key(path))
+        with self._lock:
+            size = self._folders.get(folder, {}).get(name)
+        if size is not None: return size
+        head = self._head(path)
+        if head is None: raise FileNotFoundError(path)
+        return head['ContentLength']
+
+    def stat(self, path: str) -> Optional[Tuple[int, float]]:
+        """(size, source mtime - the upload time for foreign objects) or None if missing."""
+        head = self._head(path)
+        if head is None: return None
+        mtime = head.get('Metadata', {}).get(self.META_MTIME)
+        return head['ContentLength'], float(mtime) if mtime else head['LastModified'].timestamp()
+
+    def _stored(self, head: dict, field: str) -> Optional[str]:
+        """A digest stored at upload, if it was computed the way Dedup computes it now."""
+        meta = head.get('Metadata', {})
+        if not meta.get(self.META_DIGEST, "").startswith(Dedup.digest_tag(head['ContentLength']) + ':'):
+            return None
+        return meta.get(field) or None
+
+    def _range(self, key: str, offset: int, length: int) -> bytes:
+        if length <= 0: return b""
+        body = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={offset}-{offset + length - 1}")['Body']
+        data = body.read()
+        if self.throttle is not None: self.throttle.read(len(data), self.cancel)
+        return data
+
+    def partial_hash(self, path: str) -> str:
+        try:
+            head = self._head(path)
+            if head is None: return ""
+            stored = self._stored(head, self.META_PARTIAL)
+            if stored: return stored
+            key = self._key(path)
+            return Dedup.partial_from_reads(head['ContentLength'], lambda offset, length: self._range(key, offset, length))
+        except (OSError, ValueError, self.client.exceptions.ClientError):
+            return ""
+
+    def full_hash(self, path: str, release: bool = False) -> str:
+        try:
+            head = self._head(path)
+            if head is None: return ""
+            stored = self._stored(head, self.META_DIGEST)
+            if stored: return stored
+            fd, temp = tempfile.mkstemp(prefix="spo-s3-")
+            os.close(fd)
+            try:
+                charge = self.throttle.read if self.throttle is not None else None
+                self._wait(self.manager.download(self.bucket, self._key(path), temp,
+                                                 subscribers=[_Progress(self.cancel, charge)]))
+                return Dedup.get_hash(temp, release=True)
+            finally:
+                os.remove(temp)
+        except (OSError, ValueError, self.client.exceptions.ClientError):
+            return ""
+
+    # --- Transfers ---
+    def _wait(self, future):
+        try:
+            return future.result()
+        except Exception:
+            if self.cancel is not None and self.cancel.stop_event.is_set():
+                raise TransferCancelled()
+            raise
+
+    def _upload(self, src: str, dst: str, digests=None):
+        key = self._key(dst)
+        st = os.stat(src)
+        partial, full = digests or ("", "")
+        if not (partial and full): # Routed files, external dedup: hash now, while the source is at hand
+            partial, full = Dedup.get_partial_hash(src), Dedup.get_hash(src)
+        meta = {self.META_MTIME: repr(st.st_mtime)}
+        if partial and full:
+            meta[self.META_PARTIAL], meta[self.META_DIGEST] = partial, full
+        extra = {'Metadata': meta}
+        content_type = mimetypes.guess_type(src)[0]
+        if content_type: extra['ContentType'] = content_type
+        if self.storage_class: extra['StorageClass'] = self.storage_class
+        charge = self.throttle.write if self.throttle is not None else None
+        self._wait(self.manager.upload(src, self.bucket, key, extra_args=extra,
+                                       subscribers=[_Progress(self.cancel, charge)]))
+        folder, name = posixpath.split(key)
+        with self._lock:
+            entries = self._folders.get(folder)
+            if entries is not None: entries[name] = st.st_size
+
+    def copy(self, src: str, dst: str, digests=None):
+        self._upload(src, dst, digests)
+
+    def move(self, src: str, dst: str, digests=None):
+        self._upload(src, dst, digests) # Complete (and durable) before the source goes
+        os.remove(src)
+
+    def link(self, src: str, dst: str, method: str = 'auto', digests=None) -> str:
+        self._upload(src, dst, digests) # Objects cannot share local data
+        return 'copy'
+
+    def delete(self, path: str):
+        key = self._key(path)
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        folder, name = posixpath.split(key)
+        with self._lock:
+            self._folders.get(folder, {}).pop(name, None)
+
+    def flush(self):
+        pass # Every completed upload is already durable
+
+
+class _Progress:
+    """
+    s3transfer subscriber: pause / stop checkpoint and bandwidth charge per chunk.
+    It must not raise (botocore would retry the request), so a stop cancels the transfer.
+    """
+
+    def __init__(self, cancel=None, charge=None):
+        self.cancel = cancel
+        self.charge = charge # Throttle.read / Throttle.write, or None
+
+    def on_progress(self, future, bytes_transferred, **kwargs):
+        if self.cancel is not None and self.cancel.wait():
+            future.cancel()
+            return
+        if self.charge is not None and bytes_transferred > 0: # Negative on retries
+            self.charge(bytes_transferred)
+
+
+def create_storage(dst_root: str, config: dict, transfer: FileTransfer):
+    """S3Storage for s3:// destinations, otherwise LocalStorage around `transfer`."""
+    if S3Storage.is_url(dst_root):
+        return S3Storage(dst_root, config, cancel=transfer.cancel, throttle=transfer.throttle)
+    return LocalStorage(transfer)
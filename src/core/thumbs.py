@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import sqlite3
+import itertools
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from src.utils.cache_db import CacheDB
+from src.utils.lazy_import import LazyModule, register_heif_opener
+from src.core.blur import BlurDetector
+from src.core.storage import S3Storage
+from src.core.transfer import TEMP_SUFFIX
+
+# Imported on first use, in the rendering processes (thumbnails are optional)
+Image = LazyModule('PIL.Image', on_load=register_heif_opener)
+pillow_heif = LazyModule('pillow_heif')
+
+THUMBS_DIR = ".thumbs"
+# EXIF orientation -> Image.Transpose member (the mapping of PIL.ImageOps.exif_transpose)
+_TRANSPOSE = {2: 'FLIP_LEFT_RIGHT', 3: 'ROTATE_180', 4: 'FLIP_TOP_BOTTOM', 5: 'TRANSPOSE',
+              6: 'ROTATE_270', 7: 'TRANSVERSE', 8: 'ROTATE_90'}
+
+
+def render_thumbnail(path: str, size: int, quality: int) -> Optional[Tuple[bytes, int, int, str]]:
+    """
+    Process-pool entry point: (JPEG bytes, width, height, decode path) of `path` fitted
+    into size x size and upright, or None if it cannot be decoded. Cheapest path first:
+      'exif'  EXIF IFD1 preview, if it covers `size` and has the photo's aspect ratio
+      'heif'  smallest embedded HEIF thumbnail covering `size`
+      'draft' JPEG DCT-domain downscaling to the smallest 1/2, 1/4, 1/8 scale covering `size`
+      'full'  full decode (other formats)
+    """
+    if not Image: return None
+    try:
+        if os.path.splitext(path)[1].lower() in BlurDetector.HEIF_EXTS:
+            img, orientation, how = _decode_heif(path, size)
+        else:
+            img, orientation, how = _decode(path, size)
+        if img is None: return None
+        img.thumbnail((size, size), Image.LANCZOS) # Integer reduce() first, then filtered resize
+        if orientation in _TRANSPOSE:
+            img = img.transpose(getattr(Image.Transpose, _TRANSPOSE[orientation]))
+        out = io.BytesIO()
+        img.save(out, 'JPEG', quality=quality)
+        return out.getvalue(), img.width, img.height, how
+    except Exception:
+        return None
+
+
+def _decode(path: str, size: int):
+    with Image.open(path) as img:
+        orientation = img.getexif().get(0x0112, 1)
+        if img.format != 'JPEG':
+            return img.convert('RGB'), orientation, 'full'
+        blob = BlurDetector.exif_jpeg(img)
+        if blob is not None:
+            thumb = _exif_thumbnail(blob, img.size, size)
+            if thumb is not None:
+                return thumb, orientation, 'exif'
+        full = img.size
+        img.draft('RGB', (size, size))
+        return img.convert('RGB'), orientation, 'draft' if img.size != full else 'full'
+
+
+def _exif_thumbnail(blob: bytes, photo_size: Tuple[int, int], size: int):
+    thumb = Image.open(io.BytesIO(blob))
+    (w, h), (tw, th) = photo_size, thumb.size
+    if max(tw, th) < size:
+        return None
+    if abs(tw * h - th * w) > 0.02 * w * th:
+        return None # Letterboxed preview (e.g. 160x120 for a 16:9 photo)
+    return thumb.convert('RGB')
+
+
+def _decode_heif(path: str, size: int):
+    if not pillow_heif:
+        return None, 1, None
+    # libheif applies the container's rotation / mirroring while decoding: no EXIF step
+    heif = pillow_heif.open_heif(path, convert_hdr_to_8bit=True)
+    thumb = BlurDetector.heif_thumbnail(heif, size)
+    source = thumb if thumb is not None else heif
+    img = Image.frombytes(source.mode, source.size, bytes(source.data), "raw", source.mode, source.stride)
+    return img.convert('RGB'), 1, 'heif' if thumb is not None else 'full'
+
+
+class MirrorThumbStore:
+    """
+    Thumbnails as JPEG files mirroring the library, browsable by any viewer:
+    Photos/2023-10/IMG_1.heic -> <root>/Photos/2023-10/IMG_1.heic.jpg.
+    `index` (a CacheTable) maps content keys to a thumbnail already on disk, so
+    content that lands again under another name is copied instead of decoded.
+    """
+
+    def __init__(self, root: str, library_root: str, index):
+        self.root = root
+        self.library_root = library_root
+        self.index = index
+        self._seq = itertools.count()
+
+    def path_for(self, dst: str) -> str:
+        return os.path.join(self.root, os.path.relpath(dst, self.library_root) + '.jpg')
+
+    def has(self, key: str) -> bool:
+        known = self.index.get(key)
+        return bool(known) and os.path.exists(known)
+
+    def link(self, dst: str, key: str):
+        known, target = self.index.get(key), self.path_for(dst)
+        if known == target: return # Rerun: already in place
+        with open(known, 'rb') as f:
+            self._write(target, f.read())
+
+    def put(self, dst: str, key: str, data: bytes, width: int, height: int):
+        target = self.path_for(dst)
+        self._write(target, data)
+        self.index.set(key, target)
+
+    def _write(self, target: str, data: bytes):
+        """Temp file + rename: a viewer never sees half a thumbnail."""
+        head, name = os.path.split(target)
+        os.makedirs(head, exist_ok=True)
+        tmp = os.path.join(head, f".{name}.{os.getpid()}-{next(self._seq)}{TEMP_SUFFIX}")
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, target)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+
+    def close(self):
+        self.index.db.flush() # The index lives in the shared CacheDB
+
+
+class PackedThumbStore:
+    """
+    Thumbnails packed into one SQLite file (<root>/thumbs.db) instead of a file each:
+        thumbs(key PRIMARY KEY, width, height, data)  one row per distinct content
+        files(path PRIMARY KEY, key)                  library path ('/'-separated, relative) -> thumbnail
+    Copies of the same photo share a row. Writes are committed in batches; shard
+    processes write to the same file (WAL, busy timeout). The file is only created
+    on first use, so a run that organises no photo leaves nothing behind.
+    """
+    FILE = "thumbs.db"
+    COMMIT_EVERY = 200
+
+    def __init__(self, root: str, library_root: str):
+        self.root = root
+        self.library_root = library_root
+        self.path = os.path.join(root, self.FILE)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """The open database (under _lock), created on first use."""
+        if self._conn is None:
+            os.makedirs(self.root, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS thumbs (key TEXT PRIMARY KEY, width INTEGER, height INTEGER, data BLOB)")
+            conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, key TEXT)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _rel(self, dst: str) -> str:
+        return os.path.relpath(dst, self.library_root).replace(os.sep, '/')
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM thumbs WHERE key=?", (key,)).fetchone() is not None
+
+    def link(self, dst: str, key: str):
+        self._write([("INSERT OR REPLACE INTO files (path, key) VALUES (?, ?)", (self._rel(dst), key))])
+
+    def put(self, dst: str, key: str, data: bytes, width: int, height: int):
+        self._write([("INSERT OR IGNORE INTO thumbs (key, width, height, data) VALUES (?, ?, ?, ?)",
+                      (key, width, height, sqlite3.Binary(data))),
+                     ("INSERT OR REPLACE INTO files (path, key) VALUES (?, ?)", (self._rel(dst), key))])
+
+    def _write(self, statements):
+        with self._lock:
+            conn = self._connect()
+            for sql, args in statements:
+                conn.execute(sql, args)
+            self._pending += 1
+            if self._pending >= self.COMMIT_EVERY:
+                conn.commit()
+                self._pending = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is None: return
+            self._conn.commit()
+            self._conn.close()
+            self._conn = None
+
+
+class ThumbJob:
+    """One photo's thumbnail: rendering in the pool (future) or reused (future is None)."""
+    __slots__ = ('dst', 'key', 'future')
+
+    def __init__(self, dst: str, key: str, future=None):
+        self.dst = dst
+        self.key = key
+        self.future = future
+
+    def wait(self):
+        """Render result (see render_thumbnail); None if reused, undecodable or the pool failed."""
+        if self.future is None: return None
+        try:
+            return self.future.result()
+        except Exception: # BrokenProcessPool, cancelled on stop
+            return None
+
+
+class Thumbnailer:
+    """
+    Thumbnail stage. submit() starts rendering a photo in a process pool as its
+    transfer begins, finish() stores the result once the file has landed: every
+    organised photo has its thumbnail by the time it is counted. The key is the
+    full content digest when dedup computed one, else the file's identity (device,
+    inode, size, mtime), plus the size: content that already has a thumbnail - reruns,
+    copies under other names - is never decoded again, and never hashed just for this.
+    """
+
+    def __init__(self, store, size: int = 256, quality: int = 85, workers: int = 0):
+        self.store = store
+        self.size = max(16, int(size))
+        self.quality = quality
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.threads = False # Render on threads instead of processes
+        self.counts = {'rendered': 0, 'reused': 0, 'failed': 0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def split(self, processes: int):
+        """
+        Inside one of `processes` shard processes: those are daemonic and cannot have
+        children, and already spread the work across CPUs, so render on a share of threads
+        (Pillow releases the GIL while decoding and resizing).
+        """
+        self.workers = max(1, self.workers // max(1, processes))
+        self.threads = True
+
+    def _executor(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.threads:
+                        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="thumbs")
+                    else: # Spawned (as shards are): safe next to the pipeline threads
+                        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    @staticmethod
+    def identity(path: str) -> str:
+        """Content key of a file dedup did not hash (routed, unique size under external dedup)."""
+        st = os.stat(path)
+        return f"id:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+    def submit(self, src: str, dst: str, content: str) -> Optional[ThumbJob]:
+        """
+        Render `src` for the library file `dst`; content: digest or identity() of the file.
+        None if rendering could not be started (counted as failed, the file itself is unaffected).
+        """
+        key = f"{content}|{self.size}"
+        if self.store.has(key):
+            return ThumbJob(dst, key)
+        try:
+            return ThumbJob(dst, key, self._executor().submit(render_thumbnail, src, self.size, self.quality))
+        except (OSError, RuntimeError): # Pool broken or shut down
+            with self._lock:
+                self.counts['failed'] += 1
+            return None
+
+    def finish(self, job: ThumbJob):
+        result = job.wait()
+        outcome = 'failed'
+        try:
+            if job.future is None:
+                self.store.link(job.dst, job.key)
+                outcome = 'reused'
+            elif result is not None:
+                self.store.put(job.dst, job.key, *result[:3])
+                outcome = 'rendered'
+        except (OSError, sqlite3.Error):
+            pass
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def close(self, cancel: bool = False) -> dict:
+        """Wait for (or on stop, drop) queued renders and close the store; returns the counts."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=cancel)
+            self._pool = None
+        self.store.close()
+        return dict(self.counts)
+
+
+def create_thumbnailer(config: dict, local: bool = True) -> Optional[Thumbnailer]:
+    """Thumbnail stage from the 'thumbs_*' options, None when disabled; local: destination is a folder."""
+    if not config.get('thumbs_enabled', False):
+        return None
+    if not Image.installed():
+        raise ImportError("產生縮圖需要安裝 Pillow (pip install Pillow)")
+    dst_root = config.get('dst_root', "")
+    # Object storage: thumbnails are kept locally, so browsing the archive needs no downloads
+    root = config.get('thumbs_dir') or (os.path.join(dst_root, THUMBS_DIR) if local else os.path.abspath(THUMBS_DIR))
+    if S3Storage.is_url(root):
+        raise ValueError(f"thumbs_dir 必須是本機資料夾: {root}")
+    layout = config.get('thumbs_layout', 'mirror')
+    if layout == 'mirror':
+        store = MirrorThumbStore(root, dst_root, CacheDB.get_instance().table("thumbs"))
+    elif layout == 'packed':
+        store = PackedThumbStore(root, dst_root)
+    else:
+        raise ValueError(f"Unknown thumbs_layout: {layout}")
+    return Thumbnailer(store, config.get('thumbs_size', 256), config.get('thumbs_quality', 85),
+                       config.get('thumbs_workers', 0))
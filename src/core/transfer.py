@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import errno
+import shutil
+import threading
+from typing import List
+
+from src.utils.page_cache import PageCache
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+# Temporary names never collide with organised files, are skipped by the destination
+# index and ignored by the watcher (dotfile + partial suffix)
+TEMP_SUFFIX = '.spo-part'
+_COPY_BUFFER = 1 << 20 # Read / write fallback (no sendfile), reused per thread
+_local = threading.local()
+
+FICLONE = 0x40049409 # Linux ioctl: share the source extents copy-on-write (Btrfs, XFS, bcachefs)
+# Errors meaning "this filesystem pair cannot share data": fall through to the next method
+_LINK_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EMLINK,
+                     getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)}
+
+
+def is_temp_name(name: str) -> bool:
+    return name.startswith('.') and name.endswith(TEMP_SUFFIX)
+
+
+class FileTransfer:
+    """
+    Crash-safe copy / move into the destination tree.
+
+    Data is written to a temporary name in the target directory and renamed into place,
+    so a crash never leaves a truncated file under a real name. `durability` decides
+    when data reaches stable storage:
+
+    - 'none'  : rename only, the OS flushes whenever it likes (fastest).
+    - 'batch' : every `batch_size` transfers the new files and their directories are
+                fsynced together; move sources are unlinked after that flush.
+    - 'file'  : fsync file + directory before each transfer returns (safest, slowest).
+
+    In move mode the source is only removed once the destination is durable under the
+    chosen policy. Same-device moves are a single atomic rename. Placed files are
+    dropped from the page cache (after their fsync when batched): nothing reads them
+    again during the run.
+
+    Link mode shares the source data instead of copying it: a reflink (independent
+    copy-on-write file) where the filesystem supports it, otherwise a hardlink (same
+    inode: editing one path edits both). Across devices it falls back to a copy.
+
+    Data is copied in chunks paced by `cancel` (CancelToken): stop aborts between two
+    chunks and removes the partial temp file, so the source is simply redone by the
+    next run (it is only recorded in the resume history once transferred). Copied
+    bytes are charged to `throttle` (read and write budgets); links and renames move
+    no data and are never throttled.
+    """
+    POLICIES = ('none', 'batch', 'file')
+    LINK_METHODS = ('auto', 'reflink', 'hardlink')
+
+    def __init__(self, durability: str = 'batch', batch_size: int = 200, cancel=None, throttle=None):
+        if durability not in self.POLICIES:
+            raise ValueError(f"Unknown durability policy: {durability}")
+        self.durability = durability
+        self.batch_size = max(1, batch_size)
+        self.cancel = cancel
+        self.throttle = throttle if throttle is not None and throttle.enabled else None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._files: List[str] = [] # Renamed into place, not yet fsynced
+        self._dirs = set()
+        self._unlink: List[str] = [] # Move sources waiting for their destination flush
+
+    def copy(self, src: str, dst: str):
+        self._place(src, dst)
+        self._commit(dst, [os.path.dirname(dst)], None)
+
+    def move(self, src: str, dst: str):
+        try:
+            os.replace(src, dst)
+        except OSError as e:
+            if e.errno != errno.EXDEV: raise
+            # Cross-device: copy, make it durable, then drop the source
+            self._place(src, dst)
+            self._commit(dst, [os.path.dirname(dst)], src)
+            return
+        self._commit(dst, [os.path.dirname(dst), os.path.dirname(src)], None)
+
+    def link(self, src: str, dst: str, method: str = 'auto') -> str:
+        """
+        method: 'auto' (reflink, then hardlink), 'reflink' or 'hardlink'.
+        Returns how dst was created: 'reflink', 'hardlink' or 'copy' (fallback).
+        """
+        if method not in self.LINK_METHODS:
+            raise ValueError(f"Unknown link method: {method}")
+        tmp = self._temp_path(dst)
+        try:
+            how = None
+            if method in ('auto', 'reflink') and self._reflink(src, tmp):
+                how = 'reflink'
+            elif method in ('auto', 'hardlink') and self._hardlink(src, tmp):
+                how = 'hardlink'
+            else:
+                self._copy_data(src, tmp)
+                how = 'copy'
+            if how != 'hardlink' and self.durability == 'file':
+                self._fsync_file(tmp) # A hardlink adds no data, only a directory entry
+            os.replace(tmp, dst)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+        self._commit(dst, [os.path.dirname(dst)], None)
+        return how
+
+    def flush(self):
+        """fsync everything pending and unlink the move sources that were waiting on it."""
+        with self._lock:
+            files, self._files = self._files, []
+            dirs, self._dirs = self._dirs, set()
+            unlink, self._unlink = self._unlink, []
+        self._sync(files, dirs, unlink)
+
+    # --- Internal ---
+    def _temp_path(self, dst: str) -> str:
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        head, name = os.path.split(dst)
+        return os.path.join(head, f".{name}.{os.getpid()}-{seq}{TEMP_SUFFIX}")
+
+    def _place(self, src: str, dst: str):
+        tmp = self._temp_path(dst)
+        try:
+            self._copy_data(src, tmp)
+            if self.durability == 'file':
+                self._fsync_file(tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            try: os.remove(tmp)
+            except OSError: pass
+            raise
+
+    def _copy_data(self, src: str, tmp: str):
+        """shutil.copy2 equivalent in bounded chunks (sendfile where available), cancellable in between."""
+        cancel, throttle = self.cancel, self.throttle
+        if cancel is None and throttle is None:
+            shutil.copy2(src, tmp)
+            return
+        with open(src, 'rb', buffering=0) as fs, open(tmp, 'wb', buffering=0) as fd:
+            PageCache.sequential(fs.fileno())
+            offset, use_sendfile = 0, hasattr(os, 'sendfile')
+            while True:
+                chunk = 8 << 20
+                if cancel is not None:
+                    cancel.check()
+                    chunk = cancel.chunk
+                if throttle is not None:
+                    chunk = min(chunk, throttle.chunk_limit())
+                t0 = time.monotonic()
+                n = None
+                if use_sendfile:
+                    try:
+                        n = os.sendfile(fd.fileno(), fs.fileno(), offset, chunk)
+                    except OSError as e:
+                        if offset or e.errno not in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                            raise
+                        use_sendfile = False # Not file-to-file capable here: plain reads
+                if n is None:
+                    n = self._copy_buffered(fs, fd, offset, chunk)
+                if not n: break
+                offset += n
+                if cancel is not None:
+                    cancel.observe(n, time.monotonic() - t0)
+                if throttle is not None:
+                    throttle.read(n, cancel)
+                    throttle.write(n, cancel)
+        shutil.copystat(src, tmp)
+
+    @staticmethod
+    def _copy_buffered(fs, fd, offset: int, length: int) -> int:
+        buf = getattr(_local, 'buf', None)
+        if buf is None:
+            buf = _local.buf = memoryview(bytearray(_COPY_BUFFER))
+        fs.seek(offset)
+        copied = 0
+        while copied < length:
+            n = fs.readinto(buf[:min(length - copied, len(buf))])
+            if not n: break
+            view = buf[:n]
+            while view: # Unbuffered writes may be short
+                view = view[fd.write(view):]
+            copied += n
+        return copied
+
+    @staticmethod
+    def _reflink(src: str, tmp: str) -> bool:
+        if fcntl is None: return False
+        with open(src, 'rb') as fs, open(tmp, 'wb') as fd:
+            try:
+                fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+            except OSError as e:
+                if e.errno not in _LINK_UNSUPPORTED: raise
+                ok = False
+            else:
+                ok = True
+        if not ok:
+            os.remove(tmp)
+            return False
+        shutil.copystat(src, tmp) # Same metadata as the copy2 path (resume checks size + mtime)
+        return True
+
+    @staticmethod
+    def _hardlink(src: str, tmp: str) -> bool:
+        try:
+            os.link(src, tmp)
+        except OSError as e:
+            if e.errno not in _LINK_UNSUPPORTED: raise
+            return False
+        return True
+
+    def _commit(self, dst: str, dirs: List[str], unlink_src):
+        if self.durability == 'none':
+            if unlink_src: os.remove(unlink_src)
+            PageCache.drop(dst) # Also starts write-back of the dirty pages
+            return
+        if self.durability == 'file':
+            for d in set(dirs): self._fsync_dir(d)
+            if unlink_src: os.remove(unlink_src)
+            PageCache.drop(dst)
+            return
+
+        with self._lock:
+            self._files.append(dst)
+            self._dirs.update(dirs)
+            if unlink_src: self._unlink.append(unlink_src)
+            if len(self._files) < self.batch_size: return
+            files, self._files = self._files, []
+            dirs_now, self._dirs = self._dirs, set()
+            unlink, self._unlink = self._unlink, []
+        self._sync(files, dirs_now, unlink)
+
+    def _sync(self, files: List[str], dirs, unlink: List[str]):
+        for f in files:
+            try: self._fsync_file(f, release=True)
+            except FileNotFoundError: pass # Moved away already, nothing to persist
+        for d in dirs: self._fsync_dir(d)
+        for src in unlink:
+            try: os.remove(src)
+            except FileNotFoundError: pass
+
+    @staticmethod
+    def _fsync_file(path: str, release: bool = False):
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except PermissionError: # Read-only copies (copy2 keeps the source mode)
+            fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            if release: PageCache.release(fd) # Clean now, so DONTNEED really drops it
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _fsync_dir(path: str):
+        """Persist renames / new entries. Directories cannot be opened on Windows."""
+        if os.name == 'nt': return
+        try:
+            fd = os.open(path or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
@@ -7,8 +7,10 @@ import os
 
 from src.utils.config import ConfigConstants, AppConfig
 from src.utils.logger import Logger
+from src.utils.lazy_import import accelerator_status
 from src.ui.styles import Styles
 from src.core.processor import Processor
+from src.core.storage import S3Storage
 
 class MainWindow:
     def __init__(self, root):
@@ -26,8 +28,12 @@ class MainWindow:
         self.clean_empty = tk.BooleanVar(value=False)
         self.rename_enabled = tk.BooleanVar(value=False)
         self.gps_enabled = tk.BooleanVar(value=False)
+        self.gps_offline_only = tk.BooleanVar(value=False)
         self.resume_enabled = tk.BooleanVar(value=True)
         self.blur_check_enabled = tk.BooleanVar(value=False)
+        self.near_dup_enabled = tk.BooleanVar(value=False)
+        self.watch_enabled = tk.BooleanVar(value=False)
+        self.thumbs_enabled = tk.BooleanVar(value=False)
         
         self.skip_existing = tk.BooleanVar(value=self.app_config.skip_existing)
         self.processor = None
@@ -53,6 +59,10 @@ class MainWindow:
         header.pack(fill="x", pady=(0, 15))
         ttk.Label(header, text="✨ " + ConfigConstants.APP_NAME, font=("Microsoft JhengHei UI", 16, "bold"), foreground="#2C3E50").pack(side="left")
         ttk.Label(header, text=f"v{ConfigConstants.VERSION}", font=("Segoe UI", 10), foreground="#7F8C8D").pack(side="left", padx=10, pady=(8,0))
+        # Optional accelerators: looked up without importing them (they load on first use)
+        accel = "  ".join(f"{name} {'✓' if ok else '✗'}" for name, ok in accelerator_status().items()
+                          if name in ('xxhash', 'OpenCV', 'HEIF'))
+        ttk.Label(header, text=f"加速元件: {accel}", font=("Segoe UI", 9), foreground="#7F8C8D").pack(side="right", pady=(8,0))
 
         # Path Section
         self._create_path_section(container)
@@ -88,9 +98,10 @@ class MainWindow:
         ttk.Label(mode_frame, text="運作模式:", font=("Microsoft JhengHei UI", 10, "bold")).pack(side="left", padx=(5, 15))
         ttk.Radiobutton(mode_frame, text="複製 (Copy) - 保留原始檔案", variable=self.mode, value="copy").pack(side="left", padx=10)
         ttk.Radiobutton(mode_frame, text="移動 (Move) - 原始檔案將被移動", variable=self.mode, value="move", command=self._toggle_clean_option).pack(side="left", padx=10)
+        ttk.Radiobutton(mode_frame, text="連結 (Link) - 同磁碟不佔額外空間", variable=self.mode, value="link", command=self._toggle_clean_option).pack(side="left", padx=10)
         
         # Performance Tip
-        tip_text = "💡 效能提示：\n   • 移動 (Move)：同磁碟極快 (僅修改路徑)，跨磁碟較慢 (讀+寫+刪)\n   • 複製 (Copy)：跨實體磁碟最快 (平行讀寫)，同磁碟較慢 (磁頭來回)"
+        tip_text = "💡 效能提示：\n   • 移動 (Move)：同磁碟極快 (僅修改路徑)，跨磁碟較慢 (讀+寫+刪)\n   • 複製 (Copy)：跨實體磁碟最快 (平行讀寫)，同磁碟較慢 (磁頭來回)\n   • 連結 (Link)：同磁碟秒建 reflink / 硬連結，保留原始結構；跨磁碟自動改為複製"
         ttk.Label(frame, text=tip_text, foreground="#7F8C8D", font=("Segoe UI", 9)).grid(row=1, column=0, columnspan=3, sticky="w", padx=20, pady=(0, 10))
 
         ttk.Separator(frame, orient='horizontal').grid(row=2, column=0, columnspan=3, sticky="ew", pady=5)
@@ -114,9 +125,21 @@ class MainWindow:
         ttk.Checkbutton(frame, text="啟用斷點續傳", variable=self.resume_enabled).grid(row=4, column=1, sticky="w", padx=10, pady=5)
         ttk.Checkbutton(frame, text="啟用模糊偵測 (實驗性)", variable=self.blur_check_enabled).grid(row=4, column=2, sticky="w", padx=10, pady=5)
 
-        ttk.Separator(frame, orient='horizontal').grid(row=5, column=0, columnspan=3, sticky="ew", pady=10)
+        # Row 5
+        ttk.Checkbutton(frame, text="近似重複偵測 (重新壓縮/編輯版 → _NearDuplicates)", variable=self.near_dup_enabled).grid(row=5, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        ttk.Checkbutton(frame, text="GPS 僅離線查詢 (不連網)", variable=self.gps_offline_only).grid(row=5, column=2, sticky="w", padx=10, pady=5)
+
+        # Row 6
+        ttk.Checkbutton(frame, text="監看模式 (完成後持續整理來源資料夾新加入的檔案，按停止結束)", variable=self.watch_enabled).grid(row=6, column=0, columnspan=2, sticky="w", padx=10, pady=5)
+        ttk.Checkbutton(frame, text="預先產生縮圖 (.thumbs)", variable=self.thumbs_enabled).grid(row=6, column=2, sticky="w", padx=10, pady=5)
+
+        # Row 7
+        self.low_priority = tk.BooleanVar(value=bool(getattr(self.app_config, 'low_priority', False)))
+        ttk.Checkbutton(frame, text="背景低優先權 (I/O idle + 降低 CPU 優先權，不影響同一台 NAS 的其他使用者；限速請在 config.json 的 throttle 設定)", variable=self.low_priority).grid(row=7, column=0, columnspan=3, sticky="w", padx=10, pady=5)
+
+        ttk.Separator(frame, orient='horizontal').grid(row=8, column=0, columnspan=3, sticky="ew", pady=10)
         
-        # 3. Simulation / Action (Row 6)
+        # 3. Simulation / Action (Row 9)
         self.dry_run = tk.BooleanVar(value=False)
         chk_dry = tk.Checkbutton(frame, text="✨ 模擬執行 (預覽模式) - 僅產出報表，不寫入硬碟", 
                        variable=self.dry_run, 
@@ -124,7 +147,7 @@ class MainWindow:
                        bg='#e8f5e9', fg='#2e7d32', selectcolor='#e8f5e9',
                        activebackground='#c8e6c9', activeforeground='#2e7d32',
                        padx=10, pady=5, relief="flat", bd=0)
-        chk_dry.grid(row=6, column=0, columnspan=3, sticky="w", padx=5)
+        chk_dry.grid(row=9, column=0, columnspan=3, sticky="w", padx=5)
         
         # Configure Grid Weights
         frame.columnconfigure(0, weight=1)
@@ -146,6 +169,10 @@ class MainWindow:
         self.btn_pause.pack(side="left", padx=10)
         self.btn_stop = ttk.Button(btn_frame, text="⏹ 停止", command=self._stop_process, state="disabled", style="Danger.TButton", width=10)
         self.btn_stop.pack(side="left", padx=10)
+        self.btn_plan = ttk.Button(btn_frame, text="📄 執行計畫檔", command=self._start_plan_thread, width=14)
+        self.btn_plan.pack(side="left", padx=10)
+        self.btn_estimate = ttk.Button(btn_frame, text="📊 快速估算", command=lambda: self._start_thread(estimate=True), width=12)
+        self.btn_estimate.pack(side="left", padx=10)
         
         self.lbl_stats = ttk.Label(frame, text="準備就緒", font=("Microsoft JhengHei UI", 11), foreground="#4A90E2")
         self.lbl_stats.pack(side="right", padx=10, fill="y")
@@ -191,7 +218,7 @@ class MainWindow:
         self.root.after(0, lambda: self.lbl_stats.configure(text=msg))
 
     def _update_progress_ui(self, data):
-        # data = {current, total, filename, processed_size, total_size, speed, eta}
+        # data = {current, total, filename, processed_size, total_size, speed, eta, limit}
         current = data['current']
         total = data['total']
         filename = data['filename']
@@ -206,7 +233,8 @@ class MainWindow:
         # Update Dashboard
         try:
             speed_mb = data['speed'] / (1024*1024)
-            self.lbl_speed.configure(text=f"{speed_mb:.1f} MB/s")
+            limit = data.get('limit')
+            self.lbl_speed.configure(text=f"{speed_mb:.1f} MB/s" + (f" (限速 {limit})" if limit else ""))
             
             eta = int(data['eta'])
             mins, secs = divmod(eta, 60)
@@ -258,14 +286,14 @@ class MainWindow:
             self.log_area.configure(state='disabled')
         self.root.after(0, _append)
 
-    def _start_thread(self):
+    def _start_thread(self, estimate=False):
         src = self.source_dir.get()
         dst = self.dest_dir.get()
         
         if not src or not os.path.exists(src):
             messagebox.showerror("錯誤", "來源資料夾無效！")
             return
-        if not dst or not os.path.exists(dst):
+        if not dst or not (S3Storage.is_url(dst) or os.path.exists(dst)): # s3://bucket/prefix: object storage
             messagebox.showerror("錯誤", "目標資料夾無效！")
             return
             
@@ -273,6 +301,7 @@ class MainWindow:
         self.app_config.source_dir = src
         self.app_config.dest_dir = dst
         self.app_config.skip_existing = self.skip_existing.get()
+        self.app_config.low_priority = self.low_priority.get()
         self.app_config.save()
         
         config_options = {
@@ -280,18 +309,58 @@ class MainWindow:
             'clean_empty': self.clean_empty.get(),
             'rename_enabled': self.rename_enabled.get(),
             'gps_enabled': self.gps_enabled.get(),
+            'gps_online': not self.gps_offline_only.get(),
             'resume_enabled': self.resume_enabled.get(),
             'blur_check_enabled': self.blur_check_enabled.get(),
+            'near_dup_enabled': self.near_dup_enabled.get(),
+            'thumbs_enabled': self.thumbs_enabled.get(),
             'skip_existing': self.skip_existing.get(),
-            'dry_run': self.dry_run.get(),
+            'dry_run': self.dry_run.get() and not estimate,
+            'estimate': estimate,
+            'watch': self.watch_enabled.get() and not estimate,
             'src_root': src,
             'dst_root': dst
         }
+        if self.dry_run.get() and not estimate:
+            # Save the analysed moves so they can be applied later without re-analysis
+            config_options['plan_path'] = os.path.join(os.getcwd(), ConfigConstants.PLAN_FILE)
         
+        self._launch(config_options)
+
+    def _start_plan_thread(self):
+        plan_path = filedialog.askopenfilename(title="選擇計畫檔",
+                                               initialfile=ConfigConstants.PLAN_FILE,
+                                               filetypes=[("計畫檔", "*.jsonl"), ("所有檔案", "*.*")])
+        if not plan_path: return
+        config_options = {
+            'mode': self.mode.get(),
+            'clean_empty': False,
+            'rename_enabled': False,
+            'gps_enabled': False,
+            'resume_enabled': self.resume_enabled.get(),
+            'blur_check_enabled': False,
+            'dry_run': False,
+            'execute_plan': plan_path,
+            'src_root': self.source_dir.get(),
+            'dst_root': self.dest_dir.get()
+        }
+        self._launch(config_options)
+
+    def _launch(self, config_options):
         self.log_area.configure(state='normal')
         self.log_area.delete('1.0', tk.END)
         self.log_area.configure(state='disabled')
         self._update_ui_state(True)
+
+        # Bandwidth limits / priority apply to every run, plans included
+        throttle = self.app_config.throttle
+        config_options.update({
+            'read_mbps': throttle.get('read_mbps', 0),
+            'write_mbps': throttle.get('write_mbps', 0),
+            'throttle_schedule': throttle.get('schedule'),
+            'io_priority': 'idle' if self.low_priority.get() else 'normal',
+            'cpu_nice': 10 if self.low_priority.get() else 0,
+        })
         
         self.processor = Processor(
             config_options, 
@@ -305,6 +374,10 @@ class MainWindow:
         try:
             results = self.processor.start()
             self._on_log(f"=== 任務完成 ===", "info")
+            if 'estimate' in results:
+                msg = "\n".join(results['estimate']['summary'][1:])
+                self.root.after(0, lambda: messagebox.showinfo("快速估算", msg))
+                return
             msg = f"整理完成！\n已處理: {results['processed']}\n跳過: {results['skipped']}\n錯誤: {results['errors']}"
             self.root.after(0, lambda: messagebox.showinfo("完成", msg))
         except Exception as e:
@@ -337,6 +410,8 @@ class MainWindow:
         state = 'disabled' if running else 'normal'
         inv_state = 'normal' if running else 'disabled'
         self.btn_start.configure(state=state)
+        self.btn_plan.configure(state=state)
+        self.btn_estimate.configure(state=state)
         self.btn_pause.configure(state=inv_state)
         self.btn_stop.configure(state=inv_state)
 
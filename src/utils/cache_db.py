@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from src.utils.config import ConfigConstants
+
+
+class CacheDB:
+    """
+    Small SQLite key/value store for results that should survive restarts
+    (blur scores, geocodes, ...). One table per cache, JSON-encoded values.
+    Writes are buffered and committed every `commit_every` sets or on flush().
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path: str = ConfigConstants.CACHE_DB, commit_every: int = 500):
+        self.path = path
+        self.commit_every = commit_every
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._tables = set()
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    @classmethod
+    def get_instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    @classmethod
+    def flush_instance(cls):
+        """Commit pending writes of the shared instance, if one was ever opened."""
+        if cls._instance is not None:
+            cls._instance.flush()
+
+    def table(self, name: str) -> "CacheTable":
+        with self._lock:
+            if name not in self._tables:
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{name}" (k TEXT PRIMARY KEY, v TEXT)')
+                self._tables.add(name)
+        return CacheTable(self, name)
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._conn.commit()
+                self._pending = 0
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+    # --- Internal (called by CacheTable) ---
+    def _get(self, table: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(f'SELECT v FROM "{table}" WHERE k=?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _get_many(self, table: str, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                for k, v in self._conn.execute(f'SELECT k, v FROM "{table}" WHERE k IN ({marks})', chunk):
+                    found[k] = json.loads(v)
+        return found
+
+    def _set(self, table: str, key: str, value: Any):
+        with self._lock:
+            self._conn.execute(f'INSERT OR REPLACE INTO "{table}" (k, v) VALUES (?, ?)',
+                               (key, json.dumps(value, ensure_ascii=False)))
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+
+class CacheTable:
+    def __init__(self, db: CacheDB, name: str):
+        self.db = db
+        self.name = name
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            return self.db._get(self.name, key)
+        except Exception:
+            return None
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        try:
+            return self.db._get_many(self.name, keys)
+        except Exception:
+            return {}
+
+    def set(self, key: str, value: Any):
+        try:
+            self.db._set(self.name, key, value)
+        except Exception:
+            pass
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+
+class TransferCancelled(Exception):
+    """Raised between chunks of a hash / copy once stop was requested."""
+
+
+class CancelToken:
+    """
+    Stop / pause checkpoint for long chunked loops (hashing, copying).
+
+    check() blocks while paused and raises TransferCancelled once stopped. Chunk sizes
+    are paced so one chunk of I/O takes about `latency` seconds at the throughput seen
+    so far: stopping or pausing never waits for a whole 8 GB video, only for the chunk
+    in flight, even on a slow network share.
+    """
+    MIN_CHUNK = 256 << 10
+    MAX_CHUNK = 64 << 20
+
+    def __init__(self, stop_event: threading.Event, pause_event: threading.Event, latency: float = 1.0):
+        """pause_event: set = running, cleared = paused (Processor convention)."""
+        self.stop_event = stop_event
+        self.pause_event = pause_event
+        self.latency = max(latency, 0.05)
+        self.chunk = 8 << 20 # Shared by every worker; races only make pacing approximate
+        self.stop_requested_at = None # time.monotonic() of stop(), for the latency report
+
+    def check(self):
+        if not self.pause_event.is_set():
+            self.pause_event.wait() # stop() sets it again, so a paused worker wakes up to exit
+        if self.stop_event.is_set():
+            raise TransferCancelled()
+
+    def wait(self) -> bool:
+        """check() for callbacks that must not raise: blocks while paused, True once stopped."""
+        if not self.pause_event.is_set():
+            self.pause_event.wait()
+        return self.stop_event.is_set()
+
+    def observe(self, nbytes: int, seconds: float):
+        """Adapt the chunk size after a chunk of `nbytes` took `seconds`."""
+        if seconds > self.latency:
+            self.chunk = max(self.MIN_CHUNK, self.chunk // 2)
+        elif seconds < self.latency / 4 and nbytes >= self.chunk:
+            self.chunk = min(self.MAX_CHUNK, self.chunk * 2)
+
+    def stop(self):
+        if self.stop_requested_at is None:
+            self.stop_requested_at = time.monotonic()
+        self.stop_event.set()
+        self.pause_event.set()
+
+    def stop_latency(self):
+        """Seconds since stop() (None if not stopped through this token)."""
+        if self.stop_requested_at is None: return None
+        return time.monotonic() - self.stop_requested_at
@@ -9,6 +9,11 @@ class ConfigConstants:
     VERSION = "2.2"
     CONFIG_FILE = "config.json"
     HISTORY_FILE = "history_log.json"
+    PREVIEW_REPORT = "preview_report.csv"
+    PLAN_FILE = "organize_plan.jsonl"
+    RULES_FILE = "routing_rules.json"
+    CACHE_DB = "organizer_cache.db"
+    GEO_NAMES_FILE = "geo_names_zh.json"
     BLOCK_SIZE = 65536
     
     EXT_PHOTOS: Set[str] = {'.jpg', '.jpeg', '.png', '.heic', '.bmp', '.tiff', '.raw', '.arw', '.webp'}
@@ -22,6 +27,8 @@ class AppConfig:
         self.source_dir = ""
         self.dest_dir = ""
         self.skip_existing = False
+        self.low_priority = False # Background I/O + CPU priority
+        self.throttle = {} # {'read_mbps', 'write_mbps', 'schedule': [...]} (edited in config.json)
         self.load()
 
     @classmethod
@@ -38,6 +45,8 @@ class AppConfig:
                     self.source_dir = data.get('source', '')
                     self.dest_dir = data.get('dest', '')
                     self.skip_existing = data.get('skip_existing', False)
+                    self.low_priority = data.get('low_priority', False)
+                    self.throttle = data.get('throttle', {}) or {}
             except Exception:
                 pass
 
@@ -45,7 +54,9 @@ class AppConfig:
         data = {
             'source': self.source_dir,
             'dest': self.dest_dir,
-            'skip_existing': self.skip_existing
+            'skip_existing': self.skip_existing,
+            'low_priority': self.low_priority,
+            'throttle': self.throttle
         }
         try:
             with open(ConfigConstants.CONFIG_FILE, 'w', encoding='utf-8') as f:
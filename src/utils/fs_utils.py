@@ -1,17 +1,77 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import bisect
+from array import array
+from itertools import chain
+
+from src.utils.walker import ParallelWalker
+
+class ReservedPaths:
+    """
+    Destination paths claimed during a dry run, grouped per directory.
+
+    Each directory string is stored once; file names are kept only as 64-bit hashes in
+    a sorted array (plus a small unsorted set of recent additions that is merged in
+    batches), so a reservation costs ~8 bytes instead of a full path string.
+    A hash collision can only make a free name look taken (a suffix is added).
+    """
+    MERGE_AT = 256
+
+    def __init__(self):
+        self._dirs = {} # dir -> (sorted array('q'), pending set)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @staticmethod
+    def _has(entry, h) -> bool:
+        names, pending = entry
+        if h in pending: return True
+        i = bisect.bisect_left(names, h)
+        return i < len(names) and names[i] == h
+
+    def add(self, path: str):
+        d, name = os.path.split(path)
+        h = hash(name)
+        entry = self._dirs.get(d)
+        if entry is None:
+            entry = self._dirs[d] = (array('q'), set())
+        if self._has(entry, h): return
+        names, pending = entry
+        pending.add(h)
+        self.count += 1
+        if len(pending) >= max(self.MERGE_AT, len(names) // 16):
+            self._dirs[d] = (array('q', sorted(chain(names, pending))), set())
+
+    def __contains__(self, path: str) -> bool:
+        d, name = os.path.split(path)
+        entry = self._dirs.get(d)
+        return entry is not None and self._has(entry, hash(name))
+
 
 class FSUtils:
+
+    @staticmethod
+    def file_identity(path: str, st: os.stat_result = None) -> str:
+        """
+        Stable identity of a file's content version: absolute path + size + mtime (ns).
+        Used as cache key so results are recomputed only when the file changes.
+        """
+        if st is None:
+            st = os.stat(path)
+        return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
     
     @staticmethod
-    def get_unique_path(path: str, reserved_paths: set = None) -> str:
+    def get_unique_path(path: str, reserved_paths: ReservedPaths = None, exists=os.path.exists) -> str:
         """
         Returns a unique file path.
         If path exists OR is in reserved_paths (for dry run), appends _1, _2, etc.
+        exists: existence check of the destination backend (default: local filesystem).
         """
         def is_taken(p):
-            if os.path.exists(p): return True
+            if exists(p): return True
             if reserved_paths is not None and p in reserved_paths: return True
             return False
 
@@ -27,42 +87,40 @@ class FSUtils:
         return new_path
 
     @staticmethod
-    def remove_empty_folders(path: str):
+    def remove_empty_folders(path: str, workers: int = 8):
         """
         Recursively remove empty folders.
+        Directories are listed in parallel, then removed deepest first: rmdir() itself
+        refuses non-empty folders, so no second listing is needed.
         """
-        if not os.path.exists(path):
-            return
-
-        for root, dirs, files in os.walk(path, topdown=False):
-            for name in dirs:
-                d = os.path.join(root, name)
-                try:
-                    if not os.listdir(d):
-                        os.rmdir(d)
-                except Exception:
-                    pass
+        for d in ParallelWalker(workers).dirs(path):
+            try:
+                os.rmdir(d)
+            except OSError:
+                pass
 
     @staticmethod
-    def get_sequence_name(target_dir: str, prefix: str, ext: str, dir_counters: dict, reserved_paths: set = None) -> str:
+    def get_sequence_name(target_dir: str, prefix: str, ext: str, dir_counters: dict, reserved_paths: ReservedPaths = None,
+                          exists=os.path.exists, listdir=os.listdir) -> str:
         """
         Generates YYYY_MM_DD_001.ext, utilizing a cache `dir_counters`
         to avoid repeatedly scanning the directory.
         Checks both file system and reserved_paths for collisions.
         dir_counters key format: (target_dir, prefix)
+        exists / listdir: the destination backend's (default: local filesystem).
         """
         key = (target_dir, prefix)
         
         # 1. Initialize counter if not present
         if key not in dir_counters:
             max_seq = 0
-            if os.path.exists(target_dir):
+            if exists(target_dir):
                 # Scan explicitly for this pattern
                 try:
                     # Pattern: prefix_(\d+).ext
                     pattern = re.compile(re.escape(prefix) + r'_(\d+)')
                     
-                    for fname in os.listdir(target_dir):
+                    for fname in listdir(target_dir):
                         if fname.startswith(prefix + "_"):
                             base_name = os.path.splitext(fname)[0]
                             match = pattern.fullmatch(base_name)
@@ -87,7 +145,7 @@ class FSUtils:
             new_path = os.path.join(target_dir, new_name)
             
             is_taken = False
-            if os.path.exists(new_path): is_taken = True
+            if exists(new_path): is_taken = True
             if reserved_paths is not None and new_path in reserved_paths: is_taken = True
             
             if not is_taken:
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import sys
+import importlib
+import importlib.util
+import threading
+from typing import Callable, Dict, Optional
+
+
+class LazyModule:
+    """
+    Stand-in for an optional dependency that is imported on first use.
+
+        cv2 = LazyModule('cv2')
+        if not cv2: return None        # Imports here, False if it is missing / broken
+        cv2.Laplacian(...)
+
+    Truth-testing or attribute access performs the real import once (thread-safe).
+    `on_load(module)` runs right after a successful import (e.g. registering the HEIF
+    opener with Pillow). installed() only checks that the package can be found.
+    """
+
+    def __init__(self, name: str, on_load: Optional[Callable] = None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is not None or self._failed:
+            return self._module
+        with self._lock:
+            if self._module is None and not self._failed:
+                try:
+                    module = importlib.import_module(self._name)
+                    if self._on_load is not None:
+                        self._on_load(module)
+                    self._module = module
+                except Exception: # ImportError, or a broken binary wheel
+                    self._failed = True
+        return self._module
+
+    def __bool__(self):
+        return self._load() is not None
+
+    def __getattr__(self, attr):
+        module = self._load()
+        if module is None:
+            raise ImportError(f"Optional dependency '{self._name}' is not available")
+        return getattr(module, attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def installed(self) -> bool:
+        if self._module is not None: return True
+        if self._failed: return False
+        try:
+            return importlib.util.find_spec(self._name) is not None
+        except (ImportError, ValueError):
+            return False
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else ("missing" if self._failed else "lazy")
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def register_heif_opener(_image_module=None):
+    """on_load hook for PIL.Image: lets Image.open() read HEIC when pillow_heif is installed."""
+    try:
+        import pillow_heif
+        pillow_heif.register_heif_opener()
+    except ImportError:
+        pass
+
+
+# Optional accelerators shown in the UI: label -> top-level package
+ACCELERATORS = {
+    'xxhash': 'xxhash',
+    'blake3': 'blake3',
+    'OpenCV': 'cv2',
+    'NumPy': 'numpy',
+    'Pillow': 'PIL',
+    'HEIF': 'pillow_heif',
+    'reverse_geocoder': 'reverse_geocoder',
+    'geopy': 'geopy',
+}
+
+
+def accelerator_status() -> Dict[str, bool]:
+    """label -> installed, found without importing anything (safe at startup)."""
+    status = {}
+    for label, name in ACCELERATORS.items():
+        if name in sys.modules:
+            status[label] = True
+            continue
+        try:
+            status[label] = importlib.util.find_spec(name) is not None
+        except (ImportError, ValueError):
+            status[label] = False
+    return status
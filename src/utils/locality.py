@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+import os
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+FS_IOC_FIEMAP = 0xC020660B # Linux: map logical file offsets to physical disk blocks
+_FIEMAP_HEADER = struct.Struct('=QQIIII') # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, reserved
+_FIEMAP_EXTENT = struct.Struct('=QQQQQIIII') # fe_logical, fe_physical, fe_length, reserved64[2], fe_flags, reserved[3]
+
+
+class DiskLocality:
+    """
+    Read ordering by physical position, so a rotational disk reads the source roughly
+    in one sweep instead of seeking between unrelated files.
+
+    - 'inode' : sort by (device, inode). Filesystems allocate inodes and data close
+                together for files written together, so this is cheap and decent.
+    - 'extent': sort by (device, first physical block) from FIEMAP (Linux). Files
+                without a mapping (empty, inline, unsupported filesystem) use the inode.
+    - 'walk'  : keep the scan order.
+    """
+    METHODS = ('walk', 'inode', 'extent')
+
+    @staticmethod
+    def order(paths: Sequence[str], method: str = 'inode', stop_event: Optional[threading.Event] = None) -> List[int]:
+        """Permutation of range(len(paths)) in read order (unreadable files go last)."""
+        if method not in DiskLocality.METHODS:
+            raise ValueError(f"Unknown locality method: {method}")
+        if method == 'walk':
+            return list(range(len(paths)))
+
+        no_fiemap = set() # Devices that answered FIEMAP with "not supported"
+        keys = []
+        for i, path in enumerate(paths):
+            if stop_event is not None and stop_event.is_set():
+                return list(range(len(paths)))
+            try:
+                st = os.stat(path)
+            except OSError:
+                keys.append((1, 0, 0, 0, i))
+                continue
+            physical = None
+            if method == 'extent' and st.st_dev not in no_fiemap:
+                physical = DiskLocality.first_block(path)
+                if physical is False:
+                    no_fiemap.add(st.st_dev)
+                    physical = None
+            if physical is None:
+                keys.append((0, st.st_dev, 1, st.st_ino, i))
+            else:
+                keys.append((0, st.st_dev, 0, physical, i))
+        keys.sort()
+        return [k[-1] for k in keys]
+
+    @staticmethod
+    def first_block(path: str):
+        """Physical byte offset of the file's first extent; None if unmapped, False if unsupported."""
+        if fcntl is None: return False
+        buf = bytearray(_FIEMAP_HEADER.size + _FIEMAP_EXTENT.size)
+        _FIEMAP_HEADER.pack_into(buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            fcntl.ioctl(fd, FS_IOC_FIEMAP, buf, True)
+        except OSError:
+            return False # ENOTTY / EOPNOTSUPP (tmpfs, network filesystems, ...)
+        finally:
+            os.close(fd)
+        if _FIEMAP_HEADER.unpack_from(buf, 0)[3] == 0:
+            return None
+        return _FIEMAP_EXTENT.unpack_from(buf, _FIEMAP_HEADER.size)[1]
+
+    @staticmethod
+    def is_rotational(dev: int) -> Optional[bool]:
+        """True for spinning disks (Linux sysfs); None when it cannot be told."""
+        if os.name != 'posix': return None
+        base = f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}"
+        # Partitions have no queue/ of their own: the parent disk's applies
+        for candidate in (os.path.join(base, "queue", "rotational"),
+                          os.path.join(base, "..", "queue", "rotational")):
+            try:
+                with open(candidate, 'r') as f:
+                    return f.read().strip() == "1"
+            except OSError:
+                continue
+        return None
+
+
+class DeviceLimiter:
+    """
+    Caps how many files are read at once from each source device, so ordered reads
+    stay close to sequential instead of being interleaved by every worker thread.
+
+    limit: files in flight per device; None = automatic (ROTATIONAL_LIMIT on spinning
+    disks, unlimited elsewhere); 0 = unlimited everywhere.
+    """
+    ROTATIONAL_LIMIT = 2
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._slots: Dict[int, Optional[threading.Semaphore]] = {}
+
+    def _semaphore(self, dev: int) -> Optional[threading.Semaphore]:
+        with self._lock:
+            if dev in self._slots:
+                return self._slots[dev]
+        limit = self.limit
+        if limit is None:
+            limit = self.ROTATIONAL_LIMIT if DiskLocality.is_rotational(dev) else 0
+        sem = threading.Semaphore(limit) if limit > 0 else None
+        with self._lock:
+            return self._slots.setdefault(dev, sem)
+
+    @contextmanager
+    def slot(self, path: str):
+        try:
+            sem = self._semaphore(os.stat(path).st_dev)
+        except OSError:
+            sem = None # Let the caller hit (and report) the error itself
+        if sem is None:
+            yield
+            return
+        with sem:
+            yield
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import os
+
+
+class PageCache:
+    """
+    posix_fadvise hints for the bulk read / write paths (no-ops where unsupported,
+    e.g. Windows and macOS).
+
+    Streaming a large library through the page cache evicts what is actually reused
+    (destination index, SQLite cache, directory metadata) in favour of file data read
+    exactly once. So: files are read with SEQUENTIAL (larger kernel read-ahead),
+    upcoming files are prefetched with WILLNEED while the current ones are processed,
+    and pages are released with DONTNEED once a file is hashed and transferred.
+    Hints never change results; every error is ignored.
+    """
+    SUPPORTED = hasattr(os, 'posix_fadvise')
+    enabled = SUPPORTED
+    PREFETCH_BYTES = 16 << 20 # Head of each upcoming file; SEQUENTIAL read-ahead takes over from there
+
+    @classmethod
+    def configure(cls, enabled: bool = True):
+        cls.enabled = cls.SUPPORTED and enabled
+
+    @classmethod
+    def _advise(cls, fd: int, offset: int, length: int, advice_name: str):
+        if not cls.enabled: return
+        try:
+            os.posix_fadvise(fd, offset, length, getattr(os, advice_name))
+        except (OSError, AttributeError):
+            pass
+
+    @classmethod
+    def sequential(cls, fd: int):
+        cls._advise(fd, 0, 0, 'POSIX_FADV_SEQUENTIAL')
+
+    @classmethod
+    def random(cls, fd: int):
+        """Scattered small reads (partial hash): no read-ahead around each one."""
+        cls._advise(fd, 0, 0, 'POSIX_FADV_RANDOM')
+
+    @classmethod
+    def release(cls, fd: int):
+        """Drop the file's clean cached pages (dirty ones are queued for write-back first)."""
+        cls._advise(fd, 0, 0, 'POSIX_FADV_DONTNEED')
+
+    @classmethod
+    def prefetch(cls, path: str, length: int = 0):
+        """Start reading the head of `path` into the cache in the background."""
+        cls._on_path(path, 0, length or cls.PREFETCH_BYTES, 'POSIX_FADV_WILLNEED')
+
+    @classmethod
+    def drop(cls, path: str):
+        cls._on_path(path, 0, 0, 'POSIX_FADV_DONTNEED')
+
+    @classmethod
+    def _on_path(cls, path: str, offset: int, length: int, advice_name: str):
+        if not cls.enabled: return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return # Moved away / deleted: nothing cached under this name any more
+        try:
+            cls._advise(fd, offset, length, advice_name)
+        finally:
+            os.close(fd)
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import os
+import csv
+import json
+import threading
+from typing import Optional, Sequence
+
+
+class ReportWriter:
+    """
+    Thread-safe row writer that streams a report to disk while the run is going,
+    so memory stays flat and an interrupted run still leaves a usable file.
+
+    fmt: 'csv' (Excel-friendly utf-8-sig with a header row) or 'jsonl' (one object per
+    line keyed by `fields`). Defaults to the file extension.
+    """
+    FORMATS = ('csv', 'jsonl')
+
+    def __init__(self, path: str, fields: Sequence[str], fmt: Optional[str] = None,
+                 headers: Optional[Sequence[str]] = None, flush_every: int = 256):
+        if fmt is None:
+            fmt = 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.json') else 'csv'
+        if fmt not in self.FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        self.path = os.path.abspath(path)
+        self.fields = list(fields)
+        self.fmt = fmt
+        self.flush_every = flush_every
+        self.rows = 0
+        self._lock = threading.Lock()
+
+        parent = os.path.dirname(self.path)
+        if parent: os.makedirs(parent, exist_ok=True)
+        if fmt == 'csv':
+            self._file = open(self.path, 'w', newline='', encoding='utf-8-sig')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(list(headers or self.fields))
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._csv = None
+
+    def write(self, row: Sequence):
+        with self._lock:
+            if self._file is None: return
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(dict(zip(self.fields, row)), ensure_ascii=False) + "\n")
+            self.rows += 1
+            if self.rows % self.flush_every == 0:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import ctypes
+import platform
+import threading
+from collections import deque
+from typing import List, Optional, Sequence
+
+from src.utils.lazy_import import LazyModule
+
+psutil = LazyModule('psutil') # Optional: I/O priority / nice on Windows and macOS
+
+MB = 1024 * 1024
+
+
+class TokenBucket:
+    """
+    Bandwidth limiter shared by all worker threads. consume() takes the bytes up front
+    (running into debt if needed) and sleeps until the debt is paid off, so concurrent
+    callers are served in arrival order and the long-run rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        """rate: bytes per second, 0 = unlimited."""
+        self._lock = threading.Lock()
+        self._stamp = time.monotonic()
+        self.rate = 0.0
+        self._tokens = 0.0
+        self.set_rate(rate)
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            if rate == self.rate: return
+            self.rate = max(0.0, rate)
+            self._burst = max(64 << 10, self.rate / 4) # A quarter second of headroom
+            self._tokens = min(self._tokens, self._burst)
+
+    def consume(self, nbytes: int, cancel=None):
+        """Block until `nbytes` fit in the budget; cancel.check() runs while waiting."""
+        with self._lock:
+            if self.rate <= 0: return
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            self._tokens -= nbytes
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        deadline = time.monotonic() + wait
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0: return
+            time.sleep(min(left, 0.1))
+            if cancel is not None: cancel.check() # Stop stays prompt, pause holds here
+
+
+class Throttle:
+    """
+    Read / write bandwidth limits in MB/s (0 = unlimited), optionally by time of day:
+
+        schedule = [{'from': "08:00", 'to': "20:00", 'read_mbps': 20, 'write_mbps': 10}, ...]
+
+    Inside a window its limits apply (first match wins, windows may wrap midnight),
+    outside every window the base limits do. Limits are re-evaluated every few seconds.
+    """
+    REFRESH = 5.0
+
+    def __init__(self, read_mbps: float = 0.0, write_mbps: float = 0.0, schedule: Optional[Sequence[dict]] = None):
+        self.base = (float(read_mbps or 0), float(write_mbps or 0))
+        self.windows = [self._window(w) for w in (schedule or [])]
+        self.share = 1 # Processes splitting the limits
+        self.read_bucket = TokenBucket()
+        self.write_bucket = TokenBucket()
+        self.limits = (0.0, 0.0)
+        self._next_refresh = 0.0
+        self._refresh(force=True)
+
+    @staticmethod
+    def _minutes(text: str) -> int:
+        h, m = text.split(':')
+        h, m = int(h), int(m)
+        if not (0 <= m < 60 and (0 <= h < 24 or (h == 24 and m == 0))): # "24:00" = end of day
+            raise ValueError(f"invalid time '{text}'")
+        return h * 60 + m
+
+    @classmethod
+    def _window(cls, spec: dict):
+        try:
+            return (cls._minutes(spec['from']), cls._minutes(spec['to']),
+                    float(spec.get('read_mbps') or 0), float(spec.get('write_mbps') or 0))
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            raise ValueError(f"schedule entry {spec!r}: {e}")
+
+    @property
+    def enabled(self) -> bool:
+        return any(self.base) or any(w[2] or w[3] for w in self.windows)
+
+    def split(self, processes: int):
+        """Each of `processes` workers gets an equal share of the limits."""
+        self.share = max(1, processes)
+        self._refresh(force=True)
+
+    def limits_at(self, minute_of_day: int):
+        for start, end, read, write in self.windows:
+            inside = start <= minute_of_day < end if start <= end else (minute_of_day >= start or minute_of_day < end)
+            if inside: return read, write
+        return self.base
+
+    def _refresh(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now < self._next_refresh: return
+        self._next_refresh = now + self.REFRESH
+        t = time.localtime()
+        self.limits = self.limits_at(t.tm_hour * 60 + t.tm_min)
+        self.read_bucket.set_rate(self.limits[0] * MB / self.share)
+        self.write_bucket.set_rate(self.limits[1] * MB / self.share)
+
+    def read(self, nbytes: int, cancel=None):
+        self._refresh()
+        self.read_bucket.consume(nbytes, cancel)
+
+    def write(self, nbytes: int, cancel=None):
+        self._refresh()
+        self.write_bucket.consume(nbytes, cancel)
+
+    def chunk_limit(self) -> int:
+        """Largest single read / write (about 1/8 s at the lowest active limit) so traffic stays smooth."""
+        rates = [b.rate for b in (self.read_bucket, self.write_bucket) if b.rate > 0]
+        if not rates: return 1 << 62
+        return max(64 << 10, int(min(rates) / 8))
+
+    def describe(self) -> str:
+        """Current limits for the dashboard, "" when unlimited."""
+        read, write = self.limits
+        parts = []
+        if read: parts.append(f"讀 {read:g}")
+        if write: parts.append(f"寫 {write:g}")
+        return (" / ".join(parts) + " MB/s") if parts else ""
+
+
+class RateMeter:
+    """Throughput over the last `window` seconds (the effective speed, throttled or not)."""
+
+    def __init__(self, window: float = 5.0):
+        self.window = window
+        self._samples = deque() # (monotonic time, cumulative bytes)
+
+    def update(self, total_bytes: int) -> float:
+        now = time.monotonic()
+        self._samples.append((now, total_bytes))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+        t0, b0 = self._samples[0]
+        return (total_bytes - b0) / (now - t0) if now > t0 else 0.0
+
+
+class ProcessPriority:
+    """
+    Lower the I/O and CPU priority of the calling thread and every thread it starts
+    afterwards (on Linux both are per thread and inherited; elsewhere psutil, if
+    installed, sets them for the whole process). The UI thread keeps its priority.
+    """
+    # ioprio_set syscall numbers (no libc wrapper)
+    _IOPRIO_SET = {'x86_64': 251, 'amd64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'arm64': 30,
+                   'riscv64': 30, 'armv7l': 314, 'ppc64le': 273, 'ppc64': 273, 's390x': 282}
+    _IOPRIO_CLASS = {'idle': (3, 0), 'low': (2, 7)} # (class, level): idle / best-effort lowest
+    IO_CLASSES = ('normal', 'low', 'idle')
+
+    @classmethod
+    def apply(cls, io_class: str = 'normal', nice: int = 0) -> List[str]:
+        """Returns what could not be applied (for the log); empty when everything worked."""
+        if io_class not in cls.IO_CLASSES:
+            raise ValueError(f"Unknown io_priority: {io_class}")
+        problems = []
+        if io_class != 'normal' and not cls._set_io_class(io_class):
+            problems.append(f"I/O 優先權 ({io_class})")
+        if nice and not cls._set_nice(nice):
+            problems.append(f"CPU nice ({nice})")
+        return problems
+
+    @classmethod
+    def _set_io_class(cls, io_class: str) -> bool:
+        klass, level = cls._IOPRIO_CLASS[io_class]
+        if sys.platform.startswith('linux'):
+            nr = cls._IOPRIO_SET.get(platform.machine().lower())
+            if nr is None: return False
+            libc = ctypes.CDLL(None, use_errno=True)
+            # ioprio_set(IOPRIO_WHO_PROCESS, 0 = calling thread, class << 13 | level)
+            return libc.syscall(nr, 1, 0, (klass << 13) | level) == 0
+        if psutil:
+            try:
+                p = psutil.Process()
+                if hasattr(psutil, 'IOPRIO_VERYLOW'): # Windows
+                    p.ionice(psutil.IOPRIO_VERYLOW if io_class == 'idle' else psutil.IOPRIO_LOW)
+                else:
+                    p.ionice(klass, level if klass == 2 else None)
+                return True
+            except (psutil.Error, OSError, AttributeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    def _set_nice(nice: int) -> bool:
+        if hasattr(os, 'nice'):
+            try:
+                os.nice(nice)
+                return True
+            except OSError:
+                return False
+        if psutil and hasattr(psutil, 'BELOW_NORMAL_PRIORITY_CLASS'): # Windows
+            try:
+                psutil.Process().nice(psutil.IDLE_PRIORITY_CLASS if nice >= 15 else psutil.BELOW_NORMAL_PRIORITY_CLASS)
+                return True
+            except (psutil.Error, OSError):
+                return False
+        return False
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import threading
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+class ParallelWalker:
+    """
+    Directory tree walker that lists directories on several threads at once.
+
+    On network shares every readdir / stat is a round trip, so a single-threaded
+    os.walk spends most of its time waiting. Here each worker owns a deque of
+    directories: it pushes the sub-directories it finds and pops the newest one
+    (depth first, good locality); an idle worker steals the oldest directory of
+    another worker (large, shallow subtrees). os.scandir's DirEntry gives the file
+    type without a stat call, and on Windows the size as well.
+
+    Results are streamed per directory as they are listed, in no particular order.
+    Symlinked directories are listed as entries but not followed (like os.walk).
+    """
+
+    def __init__(self, workers: int = 8, stop_event: Optional[threading.Event] = None,
+                 exclude: Iterable[str] = (), skip: Optional[Callable[[str], bool]] = None):
+        """exclude: directory paths not to descend into; skip(name) hides matching files."""
+        self.workers = max(1, workers)
+        self.stop_event = stop_event or threading.Event()
+        self.exclude = {os.path.normcase(os.path.abspath(p)) for p in exclude}
+        self.skip = skip
+
+    def files(self, root: str) -> Iterator[Tuple[str, Optional[int]]]:
+        """(path, size) of every file below root; size is None if it could not be read."""
+        for files, _ in self._walk(root, want_sizes=True):
+            yield from files
+
+    def dirs(self, root: str) -> List[str]:
+        """Every directory below root (root itself excluded), deepest first."""
+        found = []
+        for _, subdirs in self._walk(root, want_sizes=False):
+            found.extend(subdirs)
+        found.sort(key=lambda p: p.count(os.sep), reverse=True)
+        return found
+
+    # --- Internal ---
+    def _list(self, path: str, want_sizes: bool):
+        files, subdirs = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir():
+                            if entry.is_symlink(): continue # Listed by os.walk, never descended
+                            if self.exclude and os.path.normcase(os.path.abspath(entry.path)) in self.exclude: continue
+                            subdirs.append(entry.path)
+                            continue
+                    except OSError:
+                        pass
+                    if self.skip is not None and self.skip(entry.name): continue
+                    size = None
+                    if want_sizes:
+                        try:
+                            size = entry.stat().st_size # Cached by scandir on Windows
+                        except OSError:
+                            pass
+                    files.append((entry.path, size))
+        except OSError:
+            pass # Unreadable directory: skipped, as os.walk does
+        return files, subdirs
+
+    def _walk(self, root: str, want_sizes: bool):
+        if not os.path.isdir(root):
+            return
+        n = self.workers
+        stacks = [deque() for _ in range(n)]
+        stacks[0].append(root)
+        state = {'pending': 1, 'alive': n} # Directories queued or being listed / running workers
+        cond = threading.Condition()
+        results = queue.Queue(maxsize=256) # Bounded: the consumer paces the walk
+        done = threading.Event() # Consumer went away
+
+        def take(k):
+            try:
+                return stacks[k].pop()
+            except IndexError:
+                pass
+            for i in range(1, n):
+                try:
+                    return stacks[(k + i) % n].popleft()
+                except IndexError:
+                    continue
+            return None
+
+        def put(item):
+            while not done.is_set():
+                try:
+                    results.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def worker(k):
+            try:
+                while not done.is_set() and not self.stop_event.is_set():
+                    path = take(k)
+                    if path is None:
+                        with cond:
+                            if state['pending'] == 0: return
+                            cond.wait(0.05)
+                        continue
+                    files, subdirs = self._list(path, want_sizes)
+                    if subdirs:
+                        with cond: # Counted before they can be stolen and finished
+                            state['pending'] += len(subdirs)
+                        stacks[k].extend(subdirs)
+                        with cond:
+                            cond.notify(len(subdirs))
+                    put((files, subdirs))
+                    with cond:
+                        state['pending'] -= 1
+                        if state['pending'] == 0: cond.notify_all()
+            finally:
+                with cond:
+                    state['alive'] -= 1
+                    last = state['alive'] == 0
+                if last: put(None)
+
+        threads = [threading.Thread(target=worker, args=(k,), name=f"walker-{k}", daemon=True) for k in range(n)]
+        for t in threads: t.start()
+        try:
+            while True:
+                item = results.get()
+                if item is None: return
+                yield item
+        finally:
+            done.set()
+            with cond: cond.notify_all()
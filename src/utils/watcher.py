@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Files that are still being written by sync / download tools
+_PARTIAL_SUFFIXES = ('.part', '.partial', '.crdownload', '.download', '.tmp', '~')
+
+
+def is_ignored_name(name: str) -> bool:
+    return name.startswith('.') or name.lower().endswith(_PARTIAL_SUFFIXES)
+
+
+def _walk_files(root: str, exclude: Tuple[str, ...]) -> Iterable[str]:
+    for r, d, f in os.walk(root):
+        d[:] = [x for x in d if not os.path.join(r, x).startswith(exclude)]
+        for name in f:
+            if not is_ignored_name(name):
+                yield os.path.join(r, name)
+
+
+class PollingWatcher:
+    """Portable fallback: re-walks the tree every `interval` seconds and diffs (size, mtime)."""
+    name = "polling"
+
+    def __init__(self, root: str, interval: float = 2.0, exclude: Tuple[str, ...] = ()):
+        self.root = root
+        self.interval = interval
+        self.exclude = exclude
+        self._snapshot = self._scan()
+        self._next = time.monotonic() + interval
+        self.writing: Set[str] = set() # Open writers are not visible when polling
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snap = {}
+        for p in _walk_files(self.root, self.exclude):
+            try:
+                st = os.stat(p)
+                snap[p] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                pass
+        return snap
+
+    def poll(self, timeout: float) -> Set[str]:
+        wait = self._next - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait > 0: time.sleep(wait)
+        self._next = time.monotonic() + self.interval
+        snap = self._scan()
+        changed = {p for p, sig in snap.items() if self._snapshot.get(p) != sig}
+        self._snapshot = snap
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify through ctypes (no extra dependency). One watch per directory;
+    new sub-directories are watched as they appear. Blocks in select() while idle.
+    `writing` holds files modified but not yet closed by their writer; files deleted
+    or renamed away leave it with their last event.
+    """
+    name = "inotify"
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            | IN_DELETE_SELF)
+    _EVENT = struct.Struct('iIII')
+
+    _libc = None
+
+    @classmethod
+    def is_available(cls) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1, libc.inotify_add_watch # Resolve symbols
+                cls._libc = libc
+            except (OSError, AttributeError):
+                return False
+        return True
+
+    def __init__(self, root: str, exclude: Tuple[str, ...] = ()):
+        if not self.is_available():
+            raise OSError("inotify unavailable")
+        self.root = root
+        self.exclude = exclude
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: Dict[int, str] = {}
+        self.writing: Set[str] = set()
+        self._add_tree(root)
+
+    def _add_dir(self, path: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            return
+        self._dirs[wd] = path
+
+    def _add_tree(self, root: str) -> List[str]:
+        """Watch `root` and its sub-directories; returns files already inside."""
+        found = []
+        for r, d, f in os.walk(root):
+            d[:] = [x for x in d if not os.path.join(r, x).startswith(self.exclude)]
+            self._add_dir(r)
+            found.extend(os.path.join(r, name) for name in f if not is_ignored_name(name))
+        return found
+
+    def poll(self, timeout: float) -> Set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                break
+            if not data: break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+                offset += self._EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & self.IN_Q_OVERFLOW:
+                    # Events were lost: report everything, stability checks sort it out
+                    changed.update(_walk_files(self.root, self.exclude))
+                    self.writing = {p for p in self.writing if os.path.exists(p)}
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                parent = self._dirs.get(wd)
+                if parent is None or not name: continue
+                path = os.path.join(parent, name)
+                if mask & self.IN_ISDIR:
+                    if mask & (self.IN_CREATE | self.IN_MOVED_TO) and not path.startswith(self.exclude):
+                        changed.update(self._add_tree(path))
+                elif not is_ignored_name(name):
+                    changed.add(path) # Gone (delete / move away): the stability tracker drops it
+                    if mask & (self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_DELETE | self.IN_MOVED_FROM):
+                        self.writing.discard(path)
+                    elif mask & (self.IN_CREATE | self.IN_MODIFY):
+                        self.writing.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(root: str, poll_interval: float = 2.0, exclude: Iterable[str] = ()):
+    """inotify where available, polling otherwise (or when the watch limit is hit)."""
+    exclude = tuple(os.path.join(os.path.abspath(p), '') for p in exclude)
+    root = os.path.abspath(root)
+    if InotifyWatcher.is_available():
+        try:
+            return InotifyWatcher(root, exclude)
+        except OSError:
+            pass
+    return PollingWatcher(root, poll_interval, exclude)
+
+
+class StabilityTracker:
+    """
+    A changed file becomes "stable" once its size and mtime have not changed for
+    `settle` seconds (sync clients write in several sessions and rename at the end).
+    Files the watcher still sees open for writing are held for up to `max_hold`
+    seconds (a writer that never closes its handle must not block them forever).
+    """
+
+    def __init__(self, settle: float = 2.0, max_hold: float = 300.0):
+        self.settle = settle
+        self.max_hold = max(max_hold, settle)
+        self._pending: Dict[str, Tuple[Tuple[int, int], float]] = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, paths: Iterable[str]):
+        now = time.monotonic()
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except OSError:
+                self._pending.pop(p, None)
+                continue
+            self._pending[p] = ((st.st_size, st.st_mtime_ns), now)
+
+    def pop_stable(self, limit: Optional[int] = None,
+                   busy: Iterable[str] = ()) -> List[Tuple[str, Tuple[int, int]]]:
+        """(path, (size, mtime_ns)) of files that settled, oldest first."""
+        now = time.monotonic()
+        stable = []
+        for p, (sig, since) in list(self._pending.items()):
+            if now - since < (self.max_hold if p in busy else self.settle): continue
+            try:
+                st = os.stat(p)
+            except OSError:
+                del self._pending[p] # Deleted or moved away before it settled
+                continue
+            cur = (st.st_size, st.st_mtime_ns)
+            if cur != sig:
+                self._pending[p] = (cur, now)
+                continue
+            del self._pending[p]
+            stable.append((p, cur))
+            if limit and len(stable) >= limit: break
+        return stable
+
+    def next_timeout(self, idle: float, busy: Iterable[str] = ()) -> float:
+        """How long the watcher may block: `idle` with nothing pending."""
+        if not self._pending: return idle
+        now = time.monotonic()
+        due = min(since + (self.max_hold if p in busy else self.settle)
+                  for p, (_, since) in self._pending.items()) - now
+        return max(0.05, min(idle, due))